@@ -1,23 +1,20 @@
 import numpy as np 
-import pandas as pd 
 
 import dash  
 import dash_core_components as dcc   
 import dash_html_components as html 
 from dash.dependencies import Input, Output 
 
-from wordcloud import WordCloud, STOPWORDS 
-from io import BytesIO
-import base64 
-import re 
+from functools import lru_cache
 
 import plotly.graph_objs as go 
 import plotly.express as px
 
 import credentials
+from data_loader import load_labeled, LANG_NAMES
+from term_frequencies import TermFrequencies, WordCloudImages
 
 from termcolor import colored
-from datetime import datetime
 
 #______________________________________________________________________________________________________
 # Notes : DELETE ME
@@ -26,22 +23,41 @@ from datetime import datetime
 # Data
 # ______________________________________________________________________________________________________
 
-data = pd.read_csv("D:/Python/Disaster Sentiment Analysis/Data/Taal/Taal_200111_200119_en_PH_labeled.csv")
-
 selectedCols = ["id","created_at","tweet","lang","lat","lon","sentiment_labels","ash_labels","damage_labels","help_labels","prayer_labels"]
 
-df = data[selectedCols]
-
-# Drop rows with missing values. In this case these are the values without lat/lon values.
-df.dropna(inplace = True)
-
-# Dictionary to replace lang code with lang names
-lang_dict = {'en' : 'english','es' : 'spanish', 'tl' : 'taglog', 'nl' : 'dutch', 'und' : 'undefned', 'fr' : 'french', 'de' : 'german', 'hi' :  'hindi', 'it' : 'italian', 'in' : 'indonesian', 'ja' : 'japanese', 'et' : 'estonian', 'pt' : 'portuguese', 'ru' : 'russian', 'ar' : 'Arabic', 'ca' : 'catalan','zh' : 'chinese', 'lt' : 'lithuanian', 'ht' : 'hatian', 'cy' : 'welsh', 'pl' : 'polish' }
-
-df["lang"] = df["lang"].apply(lambda x : lang_dict[x])
+# Only the selected columns are read with compact dtypes (int8 labels, float32 lat/lon, categorical lang).
+# Rows with missing values are dropped, in this case these are the values without lat/lon values.
+# Lang codes are replaced with lang names once per category (LANG_NAMES)
+df = load_labeled(
+    "D:/Python/Disaster Sentiment Analysis/Data/Taal/Taal_200111_200119_en_PH_labeled.csv",
+    columns = selectedCols, lang_names = LANG_NAMES, dropna = True
+)
 
 # Calculate length of tweet
-df["length_of_tweet"] = df["tweet"].apply(lambda x : len(x))
+df["length_of_tweet"] = df["tweet"].str.len()
+
+# Map data : lat, lon and tweets of each (language, label, label value) group, gathered once into contiguous arrays
+# so the map callback only selects groups (no boolean masks over the whole frame)
+mapLabels = ["sentiment_labels","ash_labels","damage_labels","help_labels","prayer_labels"]
+
+def partition_map_data(df, labels):
+    """ Returns dict (language, label, value) -> (lat, lon, tweet) arrays """
+    lat = df["lat"].to_numpy()
+    lon = df["lon"].to_numpy()
+    tweet = df["tweet"].to_numpy(dtype = object)
+    partitions = {}
+    for label in labels:
+        for (lang, value), idx in df.groupby(["lang", label], observed = True, sort = False).indices.items():
+            partitions[(lang, label, value)] = (lat[idx], lon[idx], tweet[idx])
+    return partitions
+
+mapData = partition_map_data(df, mapLabels)
+noPoints = (np.empty(0, dtype = np.float32), np.empty(0, dtype = np.float32), np.empty(0, dtype = object))
+
+# Word cloud data : word counts per (sentiment, language), counted once (new tweets : termFreqs.update(...)),
+# word cloud images are rendered once per sentiment and cached until the counts change
+termFreqs = TermFrequencies.from_frame(df)
+wordClouds = WordCloudImages(termFreqs, background_color='white',contour_width=14, contour_color='steelblue', height = 350, width = 800)
 
 # Keys and Tokens
 # ______________________________________________________________________________________________________
@@ -79,7 +95,7 @@ fig_sent_hist.update_layout(
 )
 
 # Tweets per date ------------------------------------------------------------------------------------
-df_time = df["created_at"].apply(lambda x : datetime.strptime(x, "%Y-%m-%d %H:%M:%S").date()).value_counts().sort_index()
+df_time = df["created_at"].dt.date.value_counts().sort_index()
 
 fig_time = go.Figure()
 fig_time.add_trace(go.Scatter(
@@ -254,61 +270,29 @@ app.layout = html.Div([
 # Update Map
 # ----------------------------------------------------------------------------------------------------------------------------
 def update_map(lang_val,label_val):
+    return map_figure(lang_val, label_val)
 
+# Figures of the last selections, a repeated selection returns the cached figure
+@lru_cache(maxsize = 32)
+def map_figure(lang_val,label_val):
 
-    df_lang = df[df["lang"].isin([lang_val])]
+    fig_map = go.Figure()
 
     if label_val == "sentiment_labels":
-        df_pos = df_lang[df_lang[label_val] == 1]
-        df_neg = df_lang[df_lang[label_val] == -1]
-        df_neut = df_lang[df_lang[label_val] == 0]
-
-        fig_map = go.Figure()
-        fig_map.add_trace(
-            go.Scattermapbox(
-                lat = df_pos['lat'],
-                lon = df_pos['lon'],
-                mode = 'markers',
-                marker = go.scattermapbox.Marker(size =8, color = '#407BBF'),
-                name = "positive",
-                customdata = df_pos["tweet"]
-            )
-        )
-
-        fig_map.add_trace(
-            go.Scattermapbox(
-                lat = df_neg['lat'],
-                lon = df_neg['lon'],
-                mode = 'markers',
-                marker = go.scattermapbox.Marker(size =8, color = '#EE4D2E'),
-                name = "negative",
-                customdata = df_neg["tweet"]
-            )
-        )
-
-        fig_map.add_trace(
-            go.Scattermapbox(
-                lat = df_neut['lat'],
-                lon = df_neut['lon'],
-                mode = 'markers',
-                marker = go.scattermapbox.Marker(size =8, color = '#FFAC20'),
-                name = "neutral",
-                customdata = df_neut["tweet"]
-            )
-        )
-        
+        traces = [(1, "positive", '#407BBF'), (-1, "negative", '#EE4D2E'), (0, "neutral", '#FFAC20')]
     else:
+        traces = [(1, None, 'slategray')]
 
-        df_update = df_lang[df[label_val] == 1]
-
-        fig_map = go.Figure()
+    for value, name, color in traces:
+        lat, lon, tweet = mapData.get((lang_val, label_val, value), noPoints)
         fig_map.add_trace(
             go.Scattermapbox(
-                lat = df_update['lat'],
-                lon = df_update['lon'],
+                lat = lat,
+                lon = lon,
                 mode = 'markers',
-                marker = go.scattermapbox.Marker(size =8, color = 'slategray'),
-                customdata = df_update["tweet"]
+                marker = go.scattermapbox.Marker(size =8, color = color),
+                name = name,
+                customdata = tweet
             )
         )
 
@@ -348,26 +332,8 @@ def displayText(clickData):
     [Input("sentiment-selector", "value")]
 )
 def updateWC(sent_val):
-    if sent_val == "pos-val":
-        df_sent = df[df["sentiment_labels"] == 1]
-    elif sent_val == "neg-val":
-        df_sent = df[df["sentiment_labels"] == -1]
-    else:
-        df_sent = df[df["sentiment_labels"] == 0]
-
-    cleaned_tweets = []
-    for tweet in df_sent["tweet"]:
-        cleaned_tweets.append(re.sub(r"http\S+","",tweet))
-
-    img = BytesIO()
-
-    # Create word cloud
-    longstring = ','.join(cleaned_tweets)
-    wordcloud = WordCloud(stopwords = STOPWORDS,background_color='white',max_words=5000,contour_width=14, contour_color='steelblue', height = 350, width = 800)
-    wordcloud.generate(longstring)
-    wordcloud.to_image().save(img, format = 'PNG')
-    
-    return 'data:image/png;base64,{}'.format(base64.b64encode(img.getvalue()).decode())
+    sentiment = {"pos-val" : 1, "neg-val" : -1}.get(sent_val, 0)
+    return wordClouds.src(sentiment = sentiment)
 
 if __name__ == "__main__":
     app.run_server(debug = False)
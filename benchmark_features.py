@@ -0,0 +1,222 @@
+import argparse
+import json
+import string
+import sys
+import time
+
+import numpy as np
+import pandas as pd
+
+from benchmark_harness import run_isolated, peak_rss_mb
+
+# Feature benchmark : runs the feature_extraction functions on synthetic labeled tweets and reports throughput,
+# per batch latency percentiles and peak RSS. Results can be saved as a baseline and later runs compared against it.
+# No Twitter access needed.
+
+# Words per language of the synthetic tweets
+WORDS = {
+    'en' : ['ash', 'eruption', 'volcano', 'pray', 'evacuate', 'help', 'safe', 'the', 'is', 'and', 'we', 'are', 'lava', 'smoke', 'alert'],
+    'tl' : ['abo', 'bulkan', 'tulong', 'ligtas', 'ang', 'mga', 'sa', 'na', 'ng', 'dasal', 'lindol', 'usok'],
+    'es' : ['ceniza', 'volcán', 'erupción', 'ayuda', 'seguro', 'el', 'la', 'de', 'que', 'rezar'],
+    'ja' : ['火山', '噴火', '灰', '避難', '安全', 'です', 'ます', 'タール'],
+}
+
+# Single and multi codepoint emojis (skin tones, ZWJ sequences, flags)
+EMOJIS = ['😂', '😭', '🙏', '❤️', '🌋', '😱', '👍🏽', '🙏🏻', '👨‍👩‍👧', '🇵🇭', '💔', '😷']
+
+def synthetic_labeled(n_tweets, emoji_rate = 0.5, url_rate = 0.3, mention_rate = 0.5, hashtag_rate = 0.6, langs = {'en' : 0.6, 'tl' : 0.3, 'es' : 0.05, 'ja' : 0.05}, geo_rate = 0.5, seed = 0):
+    """
+    Generates a labeled dataset (id, tweet, lang, lat, lon, sentiment_labels)
+    Inputs : emoji_rate, url_rate, mention_rate, hashtag_rate - mean number of emojis / urls / mentions / hashtags per tweet (poisson)
+             langs - share of tweets per language (languages of WORDS)
+             geo_rate - share of tweets with lat / lon
+    Outputs : DataFrame
+    """
+    rng = np.random.default_rng(seed)
+    lang = rng.choice(list(langs.keys()), size = n_tweets, p = np.array(list(langs.values())) / sum(langs.values()))
+    n_words = rng.integers(5, 25, size = n_tweets)
+    extras = {
+        'emoji' : rng.poisson(emoji_rate, n_tweets),
+        'url' : rng.poisson(url_rate, n_tweets),
+        'mention' : rng.poisson(mention_rate, n_tweets),
+        'hashtag' : rng.poisson(hashtag_rate, n_tweets),
+    }
+
+    tweets = []
+    for i in range(n_tweets):
+        words = WORDS[lang[i]]
+        tokens = [words[j] for j in rng.integers(0, len(words), n_words[i])]
+        tokens += [EMOJIS[j] for j in rng.integers(0, len(EMOJIS), extras['emoji'][i])]
+        tokens += ['https://t.co/' + format(j, 'x') for j in rng.integers(0, 1 << 40, extras['url'][i])]
+        tokens += ['@user' + str(j) for j in rng.integers(0, 1000, extras['mention'][i])]
+        tokens += ['#Taal' + str(j) for j in rng.integers(0, 50, extras['hashtag'][i])]
+        rng.shuffle(tokens)
+        tweets.append(' '.join(tokens))
+
+    geotagged = rng.random(n_tweets) < geo_rate
+    return pd.DataFrame({
+        'id' : np.arange(n_tweets, dtype = np.int64) + 1220000000000000000,
+        'tweet' : tweets,
+        'lang' : lang,
+        'lat' : np.where(geotagged, 14.13 + rng.normal(0, 1, n_tweets), np.nan),
+        'lon' : np.where(geotagged, 120.99 + rng.normal(0, 1, n_tweets), np.nan),
+        'sentiment_labels' : rng.choice(np.array([-1, 0, 1], dtype = np.int8), size = n_tweets),
+    })
+
+def iter_batches(n_rows, batch_size, pool, seed = 0):
+    """ Yields batches of n_rows tweets in total, sampled from a pool of distinct synthetic tweets """
+    rng = np.random.default_rng(seed)
+    for start in range(0, n_rows, batch_size):
+        n = min(batch_size, n_rows - start)
+        yield pool.iloc[rng.integers(0, len(pool), n)].reset_index(drop = True)
+
+# Per row versions of the features, as feature_extraction computed them before the batch functions
+def _text_features_per_row(tweets, tokenizer, stop_words):
+    return pd.DataFrame({
+        "word_count" : tweets.apply(lambda x: len(tokenizer(x))),
+        "unique_word_count" : tweets.apply(lambda x: len(set([word.text.lower() for word in tokenizer(x)]))),
+        "char_count" : tweets.apply(lambda x: len(x)),
+        "stop_word_count" : tweets.apply(lambda x: len([word for word in map(lambda x: x.text.lower(), tokenizer(x)) if word in stop_words])),
+        "mean_word_length" : tweets.apply(lambda x: np.mean([len(w) for w in x.split()])),
+        "punctuation_count" : tweets.apply(lambda x: len([char for char in x if char in string.punctuation])),
+    })
+
+def _emoticons_per_row(tweets):
+    import emoji
+    from emosent import get_emoji_sentiment_rank
+    table = emoji.UNICODE_EMOJI["en"]
+
+    def score(emoticons):
+        scores = []
+        for emoticon in emoticons:
+            try:
+                scores.append(get_emoji_sentiment_rank(emoticon)["sentiment_score"])
+            except (KeyError, TypeError):
+                scores.append(0)
+        return sum(scores) / len(scores) if len(scores) > 0 else 0
+
+    emoticons = tweets.apply(lambda x: [c for c in x if c in table])
+    return emoticons.apply(len), emoticons.apply(score)
+
+# Benchmark cases : case name -> function of a batch, named after the function measured
+def _cases():
+    import feature_extraction as fe
+    from hazard_sites import HazardCatalog
+    fe._init_worker()
+    catalog = HazardCatalog()
+    return {
+        'count_entities' : lambda df: fe.count_entities(df.tweet),
+        'emoji_count_and_score' : lambda df: fe.emoji_matcher().count_and_score(df.tweet),
+        'havesine_distance' : lambda df: fe.havesine_distance(df.lat, df.lon),
+        'nearest_site' : lambda df: catalog.nearest(df.lat, df.lon),
+        'text_features' : lambda df: fe.text_features(df.tweet, nlp = fe._workerNlp),
+        'chunk_features' : lambda df: fe.chunk_features(df),
+        # Per row baselines of count_entities, emoji_count_and_score and text_features
+        'extract_tokens_per_row' : lambda df: {k : df.tweet.apply(lambda tw: fe.extract_tokens(tw, v)) for k, v in fe.regExpDict.items()},
+        'emoticons_per_row' : lambda df: _emoticons_per_row(df.tweet),
+        'text_features_per_row' : lambda df: _text_features_per_row(df.tweet, fe._workerNlp.tokenizer, fe.STOP_WORDS),
+    }
+
+CASES = ['count_entities', 'emoji_count_and_score', 'havesine_distance', 'nearest_site', 'text_features', 'chunk_features']
+BASELINE_CASES = ['extract_tokens_per_row', 'emoticons_per_row', 'text_features_per_row']
+
+# Batch case -> per row case it replaces, the speedup is reported when both run
+SPEEDUPS = {
+    'count_entities' : 'extract_tokens_per_row',
+    'emoji_count_and_score' : 'emoticons_per_row',
+    'text_features' : 'text_features_per_row',
+}
+
+def run_case(case, n_rows, args):
+    """ Runs a feature on n_rows tweets in batches, returns the result row """
+    pool = synthetic_labeled(
+        min(n_rows, args.pool), emoji_rate = args.emoji_rate, url_rate = args.url_rate, mention_rate = args.mention_rate,
+        hashtag_rate = args.hashtag_rate, langs = dict(zip(args.langs[::2], map(float, args.langs[1::2]))), seed = args.seed
+    )
+    func = _cases()[case]
+    base_rss = peak_rss_mb()
+
+    latencies = []
+    for df in iter_batches(n_rows, args.batch_size, pool, seed = args.seed):
+        start = time.perf_counter()
+        func(df)
+        latencies.append(time.perf_counter() - start)
+
+    seconds = sum(latencies)
+    ms = np.array(latencies) * 1000
+    return {
+        'case' : case,
+        'rows' : n_rows,
+        'seconds' : seconds,
+        'rows_per_sec' : n_rows / seconds if seconds > 0 else 0.0,
+        'p50_ms' : float(np.percentile(ms, 50)),
+        'p95_ms' : float(np.percentile(ms, 95)),
+        'p99_ms' : float(np.percentile(ms, 99)),
+        'peak_rss_mb' : peak_rss_mb(),
+        'base_rss_mb' : base_rss,
+    }
+
+if __name__ == "__main__":
+
+    parser = argparse.ArgumentParser(description = "Benchmarks the feature extraction functions on synthetic tweets")
+    parser.add_argument("--rows", type = int, nargs = "+", default = [10000, 1000000, 10000000], help = "dataset sizes")
+    parser.add_argument("--cases", nargs = "+", default = CASES + BASELINE_CASES, choices = CASES + BASELINE_CASES)
+    parser.add_argument("--baseline-max-rows", type = int, default = 1000000, help = "largest dataset size the per row cases run on (they take ~15 minutes per 10M rows)")
+    parser.add_argument("--batch-size", type = int, default = 10000, help = "rows per batch (latency percentiles are per batch)")
+    parser.add_argument("--pool", type = int, default = 100000, help = "distinct synthetic tweets the batches are sampled from")
+    parser.add_argument("--emoji-rate", type = float, default = 0.5, help = "mean emojis per tweet")
+    parser.add_argument("--url-rate", type = float, default = 0.3, help = "mean urls per tweet")
+    parser.add_argument("--mention-rate", type = float, default = 0.5, help = "mean mentions per tweet")
+    parser.add_argument("--hashtag-rate", type = float, default = 0.6, help = "mean hashtags per tweet")
+    parser.add_argument("--langs", nargs = "+", default = ['en', '0.6', 'tl', '0.3', 'es', '0.05', 'ja', '0.05'], help = "language share pairs, e.g. en 0.7 tl 0.3")
+    parser.add_argument("--seed", type = int, default = 0)
+    parser.add_argument("--save-baseline", default = None, help = "json file the results are saved to")
+    parser.add_argument("--baseline", default = None, help = "json file of a saved baseline to compare against")
+    parser.add_argument("--tolerance", type = float, default = 0.1, help = "slowdown (share of the baseline throughput) reported as a regression")
+    args = parser.parse_args()
+
+    baseline = {}
+    if args.baseline is not None:
+        with open(args.baseline) as f:
+            baseline = {(r['case'], r['rows']) : r for r in json.load(f)}
+
+    print("{:<26} {:>9} {:>9} {:>11} {:>9} {:>9} {:>9} {:>12} {:>11}".format("feature", "rows", "seconds", "rows/sec", "p50 ms", "p95 ms", "p99 ms", "peak RSS MB", "vs baseline"))
+    results, regressions = [], 0
+    for n_rows in args.rows:
+        for case in args.cases:
+            if (case in BASELINE_CASES) and (n_rows > args.baseline_max_rows):
+                print("{:<26} {:>9} skipped : above --baseline-max-rows".format(case, n_rows))
+                continue
+
+            # Each case runs in a fresh process so the peak RSS belongs to that case only
+            result, error = run_isolated(run_case, case, n_rows, args)
+            if error is not None:
+                print("{:<26} {:>9} failed : {}".format(case, n_rows, error))
+                continue
+            results.append(result)
+
+            compare = ''
+            if (case, n_rows) in baseline:
+                ratio = result['rows_per_sec'] / baseline[(case, n_rows)]['rows_per_sec']
+                compare = "{:.2f}x".format(ratio)
+                if ratio < 1 - args.tolerance:
+                    compare += " SLOWER"
+                    regressions += 1
+
+            print("{:<26} {:>9} {:>9.2f} {:>11.0f} {:>9.1f} {:>9.1f} {:>9.1f} {:>12.1f} {:>11}".format(
+                case, n_rows, result['seconds'], result['rows_per_sec'], result['p50_ms'], result['p95_ms'], result['p99_ms'], result['peak_rss_mb'], compare
+            ))
+
+    # Batch functions against the per row functions they replace
+    throughput = {(r['case'], r['rows']) : r['rows_per_sec'] for r in results}
+    for (case, n_rows), rows_per_sec in throughput.items():
+        per_row = throughput.get((SPEEDUPS.get(case), n_rows))
+        if per_row:
+            print("{} vs {} ({} rows) : {:.1f}x".format(case, SPEEDUPS[case], n_rows, rows_per_sec / per_row))
+
+    if args.save_baseline is not None:
+        with open(args.save_baseline, 'w') as f:
+            json.dump(results, f, indent = 1)
+
+    # Non zero exit code on a regression, so the benchmark can gate a change
+    sys.exit(1 if regressions > 0 else 0)
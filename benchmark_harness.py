@@ -0,0 +1,47 @@
+import multiprocessing
+import resource
+from queue import Empty
+
+# Harness of the benchmarks (benchmark_ingestion.py, benchmark_features.py) : every case runs in a fresh process
+# so the peak RSS belongs to that case only, and a case whose process dies is reported instead of hanging the run
+
+def peak_rss_mb():
+    """ Peak resident set size of the current process in MB """
+    # ru_maxrss is in kilobytes on linux
+    return resource.getrusage(resource.RUSAGE_SELF).ru_maxrss / 1024
+
+def _child(func, args, queue):
+    try:
+        queue.put((func(*args), None))
+    except Exception as e:
+        queue.put((None, repr(e)))
+
+def _wait_result(process, queue, poll = 1.0):
+    """ Result the child process put on the queue, None if it died without one (e.g. killed when out of memory) """
+    while True:
+        try:
+            return queue.get(timeout = poll)
+        except Empty:
+            if process.exitcode is not None:
+                # The result may have been put just before the process exited
+                try:
+                    return queue.get(timeout = poll)
+                except Empty:
+                    return None
+
+def run_isolated(func, *args, poll = 1.0):
+    """
+    Runs func(*args) in a fresh process
+    Inputs : func - module level function (pickled to the child process)
+             poll - seconds between checks that the process is still alive
+    Outputs : (result of func, None), or (None, error message) when func raised or the process died without a result
+    """
+    queue = multiprocessing.Queue()
+    process = multiprocessing.Process(target = _child, args = (func, args, queue))
+    process.start()
+    result = _wait_result(process, queue, poll)
+    process.join()
+
+    if result is None:
+        return None, "process exited with code {}".format(process.exitcode)
+    return result
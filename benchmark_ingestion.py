@@ -0,0 +1,64 @@
+import argparse
+import time
+
+from tweepy_streamer import GetTweets
+from twitter_replay import ReplayAPI
+from benchmark_harness import run_isolated, peak_rss_mb
+
+# Ingestion benchmark : runs every GetTweets stream method against a local ReplayAPI and reports
+# tweets/sec, peak RSS and API calls per harvested tweet. No credentials or network access needed.
+
+SEARCH_FROM = '202001100000'
+SEARCH_TO = '202001200000'
+
+def run_case(case, args):
+    """ Runs a single stream method, returns (tweets, seconds, api calls, rate limited calls, peak RSS MB) """
+    # The replay API enforces the same limits the GetTweets schedulers throttle to
+    endpoints = ['search', 'search_30_day', 'search_full_archive']
+    api = ReplayAPI.synthetic(args.tweets, SEARCH_FROM, SEARCH_TO, latency = args.latency, rate_limits = {endpoint : (args.rate_limit, 60) for endpoint in endpoints})
+    inst = GetTweets(api = api, rate_limits = {endpoint : (args.rate_limit, 60, args.min_interval) for endpoint in endpoints}, data_dir = '.')
+    pg = args.tweets // args.max_results + 1
+
+    start = time.perf_counter()
+    if case == 'stream_live_tweets':
+        n = len(inst.stream_live_tweets(keyword = 'Taal', num_tweets = args.tweets))
+    elif case == 'stream_past30_tweets':
+        n = len(inst.stream_past30_tweets(keyword = 'Taal', search_from = SEARCH_FROM, search_to = SEARCH_TO, max_results = args.max_results, pg = pg))
+    elif case == 'stream_past_tweets':
+        n = len(inst.stream_past_tweets(keyword = 'Taal', search_from = SEARCH_FROM, search_to = SEARCH_TO, max_results = args.max_results, pg = pg))
+    elif case == 'stream_single_over_dateRange':
+        n = len(inst.stream_single_over_dateRange(keyword = 'Taal', search_from = SEARCH_FROM, search_to = SEARCH_TO, max_results = args.max_results, pg = pg, max_workers = args.workers))
+    elif case == 'iter_past30_tweets':
+        n = sum(len(df) for df in inst.iter_past30_tweets(keyword = 'Taal', search_from = SEARCH_FROM, search_to = SEARCH_TO, max_results = args.max_results, pg = pg, batch_size = args.batch_size))
+    else:
+        raise ValueError('Unknown benchmark case : ' + case)
+    seconds = time.perf_counter() - start
+
+    calls = sum(v for k,v in api.calls.items() if k != '429')
+    return n, seconds, calls, api.calls['429'], peak_rss_mb()
+
+CASES = ['stream_live_tweets', 'stream_past30_tweets', 'stream_past_tweets', 'stream_single_over_dateRange', 'iter_past30_tweets']
+
+if __name__ == "__main__":
+
+    parser = argparse.ArgumentParser(description = "Benchmarks the GetTweets stream methods against a local replay of the Twitter API")
+    parser.add_argument("--tweets", type = int, default = 20000, help = "number of synthetic tweets served")
+    parser.add_argument("--latency", type = float, default = 0.0, help = "seconds of latency per request")
+    parser.add_argument("--rate-limit", type = int, default = 100000, help = "requests per minute per endpoint")
+    parser.add_argument("--min-interval", type = float, default = 0.0, help = "minimum seconds between requests of the GetTweets schedulers")
+    parser.add_argument("--max-results", type = int, default = 100, help = "tweets per premium search page")
+    parser.add_argument("--workers", type = int, default = 4, help = "max_workers of stream_single_over_dateRange")
+    parser.add_argument("--batch-size", type = int, default = 1000, help = "batch size of the iter_* methods")
+    parser.add_argument("--cases", nargs = "+", default = CASES, choices = CASES)
+    args = parser.parse_args()
+
+    print("{:<30} {:>8} {:>9} {:>11} {:>9} {:>12} {:>6} {:>12}".format("method", "tweets", "seconds", "tweets/sec", "calls", "calls/tweet", "429s", "peak RSS MB"))
+    for case in args.cases:
+        # Each case runs in a fresh process so the peak RSS belongs to that case only
+        result, error = run_isolated(run_case, case, args)
+        if error is not None:
+            print("{:<30} failed : {}".format(case, error))
+            continue
+
+        n, seconds, calls, rate_limited, rss = result
+        print("{:<30} {:>8} {:>9.2f} {:>11.0f} {:>9} {:>12.4f} {:>6} {:>12.1f}".format(case, n, seconds, n / seconds if seconds > 0 else 0, calls, calls / max(n, 1), rate_limited, rss))
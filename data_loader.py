@@ -0,0 +1,62 @@
+import numpy as np
+import pandas as pd
+
+# Declared schema of the labeled tweet datasets (Taal_..._labeled.csv) : column -> dtype
+# Labels are read as nullable Int8 and narrowed to int8 when no label is missing
+LABEL_COLUMNS = ["sentiment_labels", "ash_labels", "damage_labels", "help_labels", "prayer_labels"]
+
+LABELED_SCHEMA = {
+    "id" : "int64",
+    "created_at" : "datetime64[ns]",
+    "tweet" : "string[pyarrow]",
+    "lang" : "category",
+    "lat" : "float32",
+    "lon" : "float32",
+    **{label : "Int8" for label in LABEL_COLUMNS}
+}
+
+# Format of created_at in the labeled datasets
+DATE_FORMAT = "%Y-%m-%d %H:%M:%S"
+
+# Language codes of the tweets -> language names
+LANG_NAMES = {'en' : 'english','es' : 'spanish', 'tl' : 'taglog', 'nl' : 'dutch', 'und' : 'undefned', 'fr' : 'french', 'de' : 'german', 'hi' :  'hindi', 'it' : 'italian', 'in' : 'indonesian', 'ja' : 'japanese', 'et' : 'estonian', 'pt' : 'portuguese', 'ru' : 'russian', 'ar' : 'Arabic', 'ca' : 'catalan','zh' : 'chinese', 'lt' : 'lithuanian', 'ht' : 'hatian', 'cy' : 'welsh', 'pl' : 'polish' }
+
+# Sentiment label values -> names
+SENTIMENT_NAMES = {1 : "positive", 0 : "neutral", -1 : "negative"}
+
+def name_categories(values, names):
+    """
+    Replaces values with names once per distinct value (categorical), values missing from names are kept
+    Inputs : values - pandas Series
+             names - dict value -> name
+    Outputs : categorical Series
+    """
+    values = values.astype("category")
+    return values.cat.rename_categories(lambda c: names.get(c, c))
+
+def load_labeled(path, columns = None, lang_names = None, dropna = False):
+    """
+    Loads a labeled tweet dataset with the compact dtypes of LABELED_SCHEMA, reading only the requested columns
+    Inputs : path - CSV file
+             columns - columns to read (defaults to every column of the file)
+             lang_names - dict of language code -> name applied to the lang categories (e.g. LANG_NAMES)
+             dropna - drops the rows with a missing value (e.g. tweets without lat / lon)
+    Outputs : DataFrame
+    """
+    dtypes = {c : t for c, t in LABELED_SCHEMA.items() if not t.startswith("datetime")}
+    df = pd.read_csv(path, usecols = columns, dtype = dtypes)
+
+    if "created_at" in df.columns:
+        df["created_at"] = pd.to_datetime(df["created_at"], format = DATE_FORMAT)
+
+    if dropna:
+        df = df.dropna().reset_index(drop = True)
+
+    for label in LABEL_COLUMNS:
+        if (label in df.columns) and not df[label].hasnans:
+            df[label] = df[label].astype(np.int8)
+
+    if (lang_names is not None) and ("lang" in df.columns):
+        df["lang"] = name_categories(df["lang"], lang_names)
+
+    return df
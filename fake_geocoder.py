@@ -0,0 +1,55 @@
+import time
+import random
+import threading
+from collections import Counter
+from geopy.exc import GeocoderTimedOut
+from geopy.location import Location
+
+# ----------------------------------------- Fake Geocoder -------------------------------
+
+class FakeGeocoder():
+    """
+    A local stand-in for a geopy geocoder (e.g. geocoders.GeoNames) : answers geocode from a dict of known places,
+    with configurable latency per request and a share of requests that time out, to test concurrent geocoding offline
+    """
+    def __init__(self, places = None, latency = 0.0, jitter = 0.0, timeout_rate = 0.0, rate_limit = None, seed = 0):
+        """
+        Inputs : places - dict address -> (lat, lon), addresses not in places are not found (None)
+                 latency - seconds per request, plus a uniform random 0 ... jitter seconds
+                 timeout_rate - share of requests that raise GeocoderTimedOut (after waiting the timeout)
+                 rate_limit - requests per second of the simulated provider (lat_lon_extractor.default_limiter), None for no limit
+        """
+        self.places = places or {}
+        self.rate_limit = rate_limit
+        self.latency = latency
+        self.jitter = jitter
+        self.timeout_rate = timeout_rate
+        self.calls = Counter()
+        self.active = 0
+        self.max_active = 0
+        self._random = random.Random(seed)
+        self._lock = threading.Lock()
+
+    def geocode(self, query, timeout = None):
+        """ Location of query, None when not found. Raises GeocoderTimedOut when the request takes longer than timeout """
+        with self._lock:
+            self.calls["geocode"] += 1
+            self.active += 1
+            self.max_active = max(self.max_active, self.active)
+            delay = self.latency + self._random.uniform(0, self.jitter)
+            timed_out = self._random.random() < self.timeout_rate
+        try:
+            if timed_out or ((timeout is not None) and (delay > timeout)):
+                time.sleep(delay if timeout is None else min(delay, timeout))
+                with self._lock:
+                    self.calls["timeout"] += 1
+                raise GeocoderTimedOut("Service timed out")
+            time.sleep(delay)
+        finally:
+            with self._lock:
+                self.active -= 1
+
+        if query not in self.places:
+            return None
+        lat, lon = self.places[query]
+        return Location(query, (lat, lon), {})
@@ -0,0 +1,141 @@
+import os
+import time
+import shutil
+import numpy as np
+import pandas as pd
+import pyarrow as pa
+import pyarrow.compute as pc
+import pyarrow.dataset as ds
+import pyarrow.parquet as pq
+
+# ---------------------------------------- Feature Cache --------------------------------
+
+class FeatureCache():
+    """
+    A class to cache computed features on disk (parquet) per feature group and event.
+    Rows are keyed on tweet id, a hash of the tweet text and the version of the feature function, so only new tweets,
+    edited texts and feature functions whose version was bumped are recomputed.
+    Every store appends a part file : <root>/<group>/event=<event>/part-<time>-<pid>.parquet
+    """
+    def __init__(self, root, compression = 'zstd'):
+        self.root = root
+        self.compression = compression
+        os.makedirs(root, exist_ok = True)
+
+    def _path(self, group, event):
+        return os.path.join(self.root, group, 'event=' + str(event))
+
+    def _read(self, group, event, version = None, ids = None):
+        """
+        Cached rows of a group / event (latest row per tweet id), optionally only those of a version / of tweet ids
+        The filters are pushed down to the parquet scan : part files are sorted on id, so row groups without any of
+        the ids are skipped from their statistics and only the matching rows are converted to pandas
+        """
+        path = self._path(group, event)
+        if not os.path.isdir(path) or (len(os.listdir(path)) == 0):
+            return None
+
+        # Part files are named in write order, the last row of a tweet id wins
+        files = sorted(os.path.join(path, f) for f in os.listdir(path) if f.endswith('.parquet'))
+        dataset = ds.dataset(files, format = 'parquet')
+        expression = None
+        if version is not None:
+            expression = ds.field('version') == version
+        if ids is not None:
+            ids = np.asarray(ids, dtype = np.int64)
+            if len(ids) == 0:
+                return None
+            # The id range prunes row groups from their statistics (isin alone does not)
+            condition = (ds.field('id') >= int(ids.min())) & (ds.field('id') <= int(ids.max())) & ds.field('id').isin(pa.array(ids))
+            expression = condition if expression is None else expression & condition
+        table = dataset.to_table(filter = expression)
+        return table.to_pandas().drop_duplicates(subset = 'id', keep = 'last')
+
+    def lookup(self, group, version, ids, hashes, event):
+        """
+        Cached features of tweets
+        Inputs : group, version - feature group and the version of its function
+                 ids, hashes - arrays of tweet ids and text hashes
+                 event - event the tweets belong to
+        Outputs : (hit, features) - boolean array of the tweets found with the same text hash and version, and a DataFrame
+                  of their features in the order of the tweets
+        """
+        cached = self._read(group, event, version, ids = ids)
+        keys = pd.DataFrame({'id' : np.asarray(ids, dtype = np.int64), 'text_hash' : np.asarray(hashes, dtype = np.uint64)})
+        if cached is None:
+            return np.zeros(len(keys), dtype = bool), pd.DataFrame()
+
+        merged = keys.merge(cached.assign(_hit = True), on = ['id', 'text_hash'], how = 'left')
+        hit = merged['_hit'].notna().to_numpy()
+        features = cached.drop(columns = ['id', 'text_hash', 'version', 'cached_at']).columns
+        return hit, merged.loc[hit, features].astype(cached[features].dtypes.to_dict()).reset_index(drop = True)
+
+    def store(self, group, version, ids, hashes, features, event):
+        """ Appends the features of tweets (rows in the order of ids / hashes) to the cache """
+        if len(features) == 0:
+            return
+        table = pa.Table.from_pandas(
+            features.reset_index(drop = True).assign(
+                id = np.asarray(ids, dtype = np.int64),
+                text_hash = np.asarray(hashes, dtype = np.uint64),
+                version = version,
+                cached_at = pd.Timestamp.now('UTC').tz_localize(None)
+            ),
+            preserve_index = False
+        )
+        self._write_part(table.sort_by('id'), group, event)
+
+    def _write_part(self, table, group, event):
+        """ Writes a part file, renamed once complete so concurrent readers never see a partial file """
+        path = self._path(group, event)
+        os.makedirs(path, exist_ok = True)
+        name = os.path.join(path, 'part-{:020d}-{}.parquet'.format(time.time_ns(), os.getpid()))
+        pq.write_table(table, name + '.tmp', compression = self.compression, row_group_size = 64 * 1024)
+        os.replace(name + '.tmp', name)
+
+    # Maintenance -------------------------------------------------------------------------------------
+
+    def _events(self, event = None):
+        """ (group, event directory) pairs, only those of event when given """
+        for group in sorted(os.listdir(self.root)):
+            if not os.path.isdir(os.path.join(self.root, group)):
+                continue
+            for directory in sorted(os.listdir(os.path.join(self.root, group))):
+                if (event is None) or (directory == 'event=' + str(event)):
+                    yield group, directory[len('event='):]
+
+    def compact(self, event = None):
+        """ Rewrites the part files of each group / event into one file, keeping the latest row per tweet id """
+        for group, ev in list(self._events(event)):
+            df = self._read(group, ev)
+            path = self._path(group, ev)
+            old = [f for f in os.listdir(path) if f.endswith('.parquet')]
+            if df is not None:
+                self._write_part(pa.Table.from_pandas(df, preserve_index = False).sort_by('id'), group, ev)
+            for f in old:
+                os.remove(os.path.join(path, f))
+
+    def evict(self, event = None, older_than = None):
+        """
+        Evicts cached features
+        Inputs : event - evicts every feature of the event (of every event when only older_than is given)
+                 older_than - pd.Timedelta / timedelta, evicts the rows cached longer ago than that
+        """
+        if older_than is None:
+            if event is None:
+                raise ValueError('evict needs an event or older_than')
+            for group, ev in list(self._events(event)):
+                shutil.rmtree(self._path(group, ev))
+            return
+
+        cutoff = pd.Timestamp.now('UTC').tz_localize(None) - pd.Timedelta(older_than)
+        for group, ev in list(self._events(event)):
+            path = self._path(group, ev)
+            for f in [f for f in os.listdir(path) if f.endswith('.parquet')]:
+                table = pq.read_table(os.path.join(path, f))
+                kept = table.filter(pc.greater_equal(table['cached_at'], pa.scalar(cutoff, type = table['cached_at'].type)))
+                if kept.num_rows == 0:
+                    os.remove(os.path.join(path, f))
+                elif kept.num_rows < table.num_rows:
+                    pq.write_table(kept, os.path.join(path, f) + '.tmp', compression = self.compression)
+                    os.replace(os.path.join(path, f) + '.tmp', os.path.join(path, f))
@@ -1,5 +1,8 @@
 import os 
 import argparse
+from collections import deque
+from concurrent.futures import ProcessPoolExecutor
+from functools import lru_cache
 
 # Text based libaries
 import re
@@ -8,15 +11,23 @@ import string
 # Dataframe and linear algebra libraries
 import numpy as np 
 import pandas as pd 
+import pyarrow as pa
+import pyarrow.compute as pc
+import pyarrow.parquet as pq
 
 # NLP libraries
-import spacy
 from spacy.lang.en import English 
+from spacy.lang.en.stop_words import STOP_WORDS
 from spacy.tokenizer import Tokenizer
 import emoji
 
 # Unsupervised Sentiment Score libraries
-from emosent import get_emoji_sentiment_rank
+from emosent import EMOJI_SENTIMENT_DICT
+
+from hazard_sites import HazardCatalog
+from feature_cache import FeatureCache
+from data_loader import load_labeled, name_categories, SENTIMENT_NAMES, LABELED_SCHEMA
+from tweet_schema import TWEET_SCHEMA
 
 # Data Visulization libraries
 import plotly.express as px
@@ -31,12 +42,19 @@ def label_sentiment(df, replace_with):
 
     return DataFrame 
     """
-    for k,v in replace_with.items():
-        df.sentiment_labels = df.sentiment_labels.apply(lambda x: v if x == k else x)
+    df["sentiment_labels"] = name_categories(df["sentiment_labels"], replace_with)
     return df
 
 # Feature Extraction
 # ++++++++++++++++++++++++++++++++++++++++++++++++++++++++++++++++++++++++++
+
+# Regular expressions of the mention, hashtag and url counts
+regExpDict = {
+    "mentions" : r'@\w+',
+    "hashtags" : r'#\w+',
+    "urls" :  r'http[s]?://(?:[a-zA-Z]|[0-9]|[$-_@.&+]|[!*\(\),]|(?:%[0-9a-fA-F][0-9a-fA-F]))+'
+}
+
 def extract_tokens(tweet, regExp):
     """
     Extracts text based feature such as emotics, hashtags, etc.
@@ -49,6 +67,76 @@ def extract_tokens(tweet, regExp):
     tweetRegExp = re.compile(regExp)
     return len(tweetRegExp.findall(tweet))
 
+# regExpDict in RE2 syntax (Arrow compute kernels) : \w only matches ASCII in RE2, [\p{L}\p{N}_] matches what \w matches in python
+entityRegExpDict = {
+    "mentions" : r'@[\p{L}\p{N}_]+',
+    "hashtags" : r'#[\p{L}\p{N}_]+',
+    "urls" : regExpDict["urls"]
+}
+
+def count_entities(tweets, regExps = entityRegExpDict):
+    """
+    Counts mentions, hashtags and urls of a whole column of tweets with Arrow compute kernels (no python call per tweet)
+    Inputs :
+        tweets - pandas Series, list or Arrow string array of tweets (missing tweets count 0)
+        regExps - dict of entity name : RE2 regular expression
+    Outputs :
+        dict of entity name : numpy int64 array of counts
+    """
+    if not isinstance(tweets, (pa.Array, pa.ChunkedArray)):
+        tweets = pa.array(tweets, type = pa.large_string(), from_pandas = True)
+
+    return {
+        k : pc.count_substring_regex(tweets, pattern = v).fill_null(0).to_numpy().astype(np.int64)
+        for k,v in regExps.items()
+    }
+
+# Text Features
+# ---------------------------------------------------------------------------
+
+# Punctuation characters removed by str.translate (counted as the difference of lengths)
+punctuationTable = str.maketrans("", "", string.punctuation)
+
+def whitespace_nlp():
+    """ English pipeline with the whitespace tokenizer only """
+    nlp = English()
+    nlp.tokenizer = Tokenizer(nlp.vocab)
+    return nlp
+
+def text_features(tweets, nlp = None, batch_size = 1000, n_process = 1):
+    """
+    Computes word_count, unique_word_count, char_count, stop_word_count, mean_word_length and punctuation_count
+    from a single tokenization of each tweet, tweets are streamed through nlp.pipe in batches
+    Inputs :
+        tweets - pandas Series or list of tweets
+        nlp - spaCy pipeline (defaults to whitespace_nlp)
+        batch_size - tweets per nlp.pipe batch
+        n_process - number of processes of nlp.pipe (docs are serialized between processes, pays off with heavier pipelines)
+    Outputs :
+        DataFrame of text features (with the index of tweets)
+    """
+    nlp = whitespace_nlp() if nlp is None else nlp
+
+    # Stop words of en_core_web_sm compared by the hash of the lowercase token, no model or string lookups
+    stop_words = frozenset(nlp.vocab.strings.add(w) for w in STOP_WORDS)
+
+    rows = []
+    for doc in nlp.pipe(tweets, batch_size = batch_size, n_process = n_process):
+        lower = [token.lower for token in doc]
+        lengths = [len(token) for token in doc if not token.is_space]
+        text = doc.text
+        rows.append((
+            len(doc),
+            len(set(lower)),
+            len(text),
+            sum(1 for h in lower if h in stop_words),
+            sum(lengths) / len(lengths) if len(lengths) > 0 else np.nan,
+            len(text) - len(text.translate(punctuationTable))
+        ))
+
+    columns = ["word_count", "unique_word_count", "char_count", "stop_word_count", "mean_word_length", "punctuation_count"]
+    return pd.DataFrame(rows, columns = columns, index = tweets.index if isinstance(tweets, pd.Series) else None)
+
 def havesine_distance(tw_lat, tw_long, vol_lat = 14.13, vol_long = 120.99):
     """
     Caculates the havesine distance between 2 sets of GPS coordinates
@@ -103,13 +191,107 @@ def plot_dist(df, colname, color_col = "sentiment_labels"):
 # Extract Emoticons
 # ---------------------------------------------------------------------------
 
+# Variation selector and skin tone modifiers, dropped to find the emosent score of a modified emoji
+emojiModifiers = re.compile("[\ufe0f\U0001F3FB-\U0001F3FF]")
+
+def _char_ranges(chars, gap = 1):
+    """
+    Regular expression character class of chars written as codepoint ranges, ranges closer than gap codepoints are merged :
+    a class of a few wide ranges is much faster to search than one of many narrow ranges
+    """
+    ranges = []
+    for cp in sorted({ord(c) for c in chars}):
+        if (len(ranges) > 0) and (cp <= ranges[-1][1] + gap):
+            ranges[-1][1] = cp
+        else:
+            ranges.append([cp, cp])
+    return "[" + "".join(re.escape(chr(a)) + ("" if a == b else "-" + re.escape(chr(b))) for a, b in ranges) + "]"
+
+class EmojiMatcher():
+    """
+    A class to find emojis in tweets, multi codepoint emojis (skin tones, ZWJ sequences, flags) are matched as one emoji
+    The emosent sentiment score of every emoji is precomputed (0 for emojis emosent does not rank)
+    """
+    def __init__(self, emojis = None):
+        self.emojis = list(emoji.UNICODE_EMOJI["en"].keys()) if emojis is None else list(emojis)
+        self.index = {e : i for i, e in enumerate(self.emojis)}
+        self.scores = np.array([self._score(e) for e in self.emojis], dtype = np.float64)
+        # Character trie of the emojis, "" marks the end of an emoji and holds its index
+        self.trie = {}
+        for i, e in enumerate(self.emojis):
+            node = self.trie
+            for c in e:
+                node = node.setdefault(c, {})
+            node[""] = i
+
+        # Characters an emoji can start with (a superset, the trie rejects the other candidates)
+        self.starts = re.compile(_char_ranges((e[0] for e in self.emojis), gap = 64))
+
+    def _score(self, e):
+        rank = EMOJI_SENTIMENT_DICT.get(e, EMOJI_SENTIMENT_DICT.get(emojiModifiers.sub("", e)))
+        return 0.0 if rank is None else rank["sentiment_score"]
+
+    def finditer(self, text):
+        """ Yields (position, emoji index) of the emojis of a text, the longest emoji starting at a position is matched """
+        pos = 0
+        for m in self.starts.finditer(text):
+            start = m.start()
+            if start < pos:
+                # Inside the previous emoji
+                continue
+
+            node, end, match = self.trie, start, None
+            while (end < len(text)) and (text[end] in node):
+                node = node[text[end]]
+                end += 1
+                if "" in node:
+                    match = (end, node[""])
+
+            if match is not None:
+                yield start, match[1]
+                pos = match[0]
+
+    def findall(self, tweet):
+        """ List of the emojis of a tweet """
+        return [self.emojis[i] for _, i in self.finditer(tweet)]
+
+    def score(self, emoticon):
+        """ Sentiment score of an emoji """
+        i = self.index.get(emoticon)
+        return self._score(emoticon) if i is None else self.scores[i]
+
+    def count_and_score(self, tweets):
+        """
+        Emoji counts and mean emoji scores of a whole column of tweets from a single scan
+        Inputs : tweets - pandas Series or list of tweets (missing tweets have no emojis)
+        Outputs : (counts, scores) numpy arrays, the score of tweets without emojis is 0
+        """
+        tweets = ["" if not isinstance(t, str) else t for t in tweets]
+
+        # Emojis never contain a newline : tweets are joined and the match positions mapped back to tweets
+        starts = np.cumsum([0] + [len(t) + 1 for t in tweets])
+        matches = list(self.finditer("\n".join(tweets)))
+        positions = np.array([m[0] for m in matches], dtype = np.int64)
+        emojis = np.array([m[1] for m in matches], dtype = np.int64)
+
+        rows = np.searchsorted(starts, positions, side = "right") - 1
+        counts = np.bincount(rows, minlength = len(tweets))
+        totals = np.bincount(rows, weights = self.scores[emojis], minlength = len(tweets))
+        scores = np.divide(totals, counts, out = np.zeros(len(tweets)), where = counts > 0)
+        return counts, scores
+
+@lru_cache(maxsize = None)
+def emoji_matcher():
+    """ EmojiMatcher shared by the feature functions, built on first use """
+    return EmojiMatcher()
+
 def extract_emoticons(tweet):
     """
     Extracts emoticons from Tweet
     Inputs : Tweet
     Output : List of emoticons
     """
-    return [c for c in tweet if c in emoji.UNICODE_EMOJI["en"].keys()]
+    return emoji_matcher().findall(tweet)
 
 def compute_emoticon_score(emoticonList:list):
     """
@@ -117,32 +299,217 @@ def compute_emoticon_score(emoticonList:list):
     Inputs : List of emoticons
     Outputs : Mean emoticon score for multiple emoji's, Score of 0 for tweets without emojis 
     """
+    if len(emoticonList) > 0:
+        return sum(emoji_matcher().score(e) for e in emoticonList) / len(emoticonList)
+    else:
+        return 0
+
+# Batch Features
+# ---------------------------------------------------------------------------
+
+def extract_features(df, text_col = "tweet", catalog = None):
+    """
+    Computes the features of a batch of tweets : distance from volcano, mention / hashtag / url counts,
+    emoticon count and emoticon score
+    Inputs : df - DataFrame with a text column and lat / lon columns
+             text_col - name of the text column
+             catalog - hazard_sites.HazardCatalog, adds the nearest site, its distance and the sites within 50 km
+    Outputs : DataFrame of features with the index of df
+    """
+    features = pd.DataFrame(index = df.index)
+    features["distance_from_volcano"] = havesine_distance(df.lat, df.lon)
+    if catalog is not None:
+        features = features.join(catalog.nearest(df.lat, df.lon))
+
+    for k,v in count_entities(df[text_col]).items():
+        features[k] = v
+
+    features["emoticon_count"], features["emoticon_score"] = emoji_matcher().count_and_score(df[text_col])
+
+    return features
+
+# Chunked Feature Extraction
+# ---------------------------------------------------------------------------
+
+# Tokenizer of the worker process, emoji tables are held by emoji_matcher()
+_workerNlp = None
 
-    emoticon_score = [] 
-    for emoticon in emoticonList:
-        try:
-            emoticon_score.append(get_emoji_sentiment_rank(emoticon)["sentiment_score"])
-        except KeyError:
-            emoticon_score.append(0)
+def _init_worker():
+    """ Builds the tokenizer and emoji tables once per worker process """
+    global _workerNlp
+    _workerNlp = whitespace_nlp()
+    emoji_matcher()
 
-    if len(emoticon_score) > 0:
-        return sum(emoticon_score) / len(emoticon_score)
+def _distance_group(df, text_col):
+    return pd.DataFrame({"distance_from_volcano" : havesine_distance(df.lat, df.lon)}, index = df.index)
+
+def _entities_group(df, text_col):
+    return pd.DataFrame(count_entities(df[text_col]), index = df.index)
+
+def _emoticons_group(df, text_col):
+    counts, scores = emoji_matcher().count_and_score(df[text_col])
+    return pd.DataFrame({"emoticon_count" : counts, "emoticon_score" : scores}, index = df.index)
+
+def _text_group(df, text_col):
+    return text_features(df[text_col], nlp = _workerNlp)
+
+# Feature groups cached by FeatureCache : name -> (version, function of a chunk and its text column)
+# Bump the version of a group when its function changes, the cached features of the old version are recomputed
+FEATURE_GROUPS = {
+    "distance" : (1, _distance_group),
+    "entities" : (1, _entities_group),
+    "emoticons" : (1, _emoticons_group),
+    "text" : (1, _text_group),
+}
+
+def cached_features(df, cache, event, text_col = "tweet", id_col = "id", groups = FEATURE_GROUPS):
+    """
+    Features of the feature groups, joined from a feature_cache.FeatureCache when the tweet id, text hash and group version
+    match, computed (and cached) otherwise
+    Inputs : df - DataFrame with id, text and lat / lon columns
+             cache - FeatureCache
+             event - event the tweets are cached under
+    Outputs : DataFrame of features with the index of df
+    """
+    hashes = pd.util.hash_pandas_object(df[text_col], index = False).to_numpy()
+    ids = df[id_col].to_numpy()
+    positions = np.arange(len(df))
+
+    frames = []
+    for name, (version, func) in groups.items():
+        hit, features = cache.lookup(name, version, ids, hashes, event)
+        parts = []
+        if hit.any():
+            parts.append(features.set_axis(positions[hit]))
+        if not hit.all():
+            computed = func(df.iloc[~hit], text_col)
+            cache.store(name, version, ids[~hit], hashes[~hit], computed, event)
+            parts.append(computed.set_axis(positions[~hit]))
+        frames.append(pd.concat(parts).sort_index())
+
+    return pd.concat(frames, axis = 1).set_axis(df.index)
+
+def chunk_features(df, text_col = "tweet", catalog = None, cache = None, event = None):
+    """
+    Adds every feature (the feature groups and the nearest hazard sites of catalog) to a chunk of tweets
+    Inputs : df - DataFrame with a text column and lat / lon columns
+             cache, event - feature_cache.FeatureCache the features are read from / stored in under event (needs an id column)
+    Outputs : df with the feature columns
+    """
+    tweets = df[text_col].fillna("").astype(str)
+    df = df.assign(**{text_col : tweets})
+    if cache is not None:
+        features = cached_features(df, cache, event, text_col = text_col)
     else:
-        return 0
+        features = pd.concat([func(df, text_col) for _, func in FEATURE_GROUPS.values()], axis = 1)
+    if catalog is not None:
+        features = features.join(catalog.nearest(df.lat, df.lon))
+    return df.join(features)
+
+# Declared dtypes of the CSV columns (flat tweet schema of the harvested files, labeled datasets), other columns are
+# read as strings : every chunk then has the same types, even when a column is empty in a whole chunk
+CSV_DTYPES = {
+    **{name : "string" if dtype in ("string", "category", "datetime") else dtype for name, _, dtype in TWEET_SCHEMA},
+    **{name : "string" if dtype.startswith("datetime") or (dtype == "category") else dtype for name, dtype in LABELED_SCHEMA.items()}
+}
+
+def iter_chunks(path, chunksize = 50000, columns = None, dtypes = None):
+    """
+    Reads a CSV or Parquet file in chunks of chunksize rows
+    Inputs : dtypes - dict column -> dtype of CSV columns, on top of CSV_DTYPES (other CSV columns are read as strings)
+    """
+    if path.endswith(".parquet"):
+        for batch in pq.ParquetFile(path).iter_batches(batch_size = chunksize, columns = columns):
+            yield batch.to_pandas()
+    else:
+        header = pd.read_csv(path, nrows = 0, usecols = columns).columns
+        declared = {**CSV_DTYPES, **(dtypes or {})}
+        yield from pd.read_csv(path, chunksize = chunksize, usecols = columns, dtype = {c : declared.get(c, "string") for c in header})
 
+def output_schema(table, input_path):
+    """
+    Schema of the Parquet output : the input types for the columns of a Parquet input (the first chunk alone would type
+    a column it has no value of as null), the types of the first chunk's table for the other columns
+    """
+    declared = pq.read_schema(input_path) if input_path.endswith(".parquet") else pa.schema([])
+    return pa.schema([
+        declared.field(field.name) if field.name in declared.names else field for field in table.schema
+    ])
 
+def extract_features_file(input_path, output_path, text_col = "tweet", chunksize = 50000, n_workers = None, columns = None, dtypes = None, catalog = None, cache = None, event = None):
+    """
+    Computes the features of a CSV / Parquet file of tweets chunk by chunk in a process pool, chunks are written
+    to the output (CSV or Parquet, from the extension) in input order as soon as they are done
+    At most 2 chunks per worker are in memory at once, whatever the size of the input
+    Inputs : input_path, output_path - CSV or Parquet files
+             text_col - name of the text column
+             chunksize - rows per chunk
+             n_workers - number of worker processes (defaults to the number of cores)
+             columns - input columns to read (defaults to all)
+             dtypes - dict column -> dtype of the CSV input columns not in CSV_DTYPES (read as strings otherwise)
+             catalog - hazard_sites.HazardCatalog of the nearest site features
+             cache, event - feature_cache.FeatureCache of the features and the event of the tweets, only tweets not
+                            in the cache (or cached by an older version of a feature) are computed
+    Outputs : number of rows written
+    """
+    n_workers = os.cpu_count() if n_workers is None else n_workers
+    writer = None
+    n_rows = 0
+
+    def write(df):
+        nonlocal writer, n_rows
+        if output_path.endswith(".parquet"):
+            if writer is None:
+                writer = pq.ParquetWriter(output_path, output_schema(pa.Table.from_pandas(df, preserve_index = False), input_path))
+            # Every chunk is cast to the schema of the file
+            writer.write_table(pa.Table.from_pandas(df, schema = writer.schema, preserve_index = False))
+        else:
+            df.to_csv(output_path, mode = "w" if n_rows == 0 else "a", header = n_rows == 0, index = False)
+        n_rows += len(df)
+
+    pending = deque()
+    try:
+        with ProcessPoolExecutor(n_workers, initializer = _init_worker) as pool:
+            for chunk in iter_chunks(input_path, chunksize = chunksize, columns = columns, dtypes = dtypes):
+                pending.append(pool.submit(chunk_features, chunk, text_col, catalog, cache, event))
+                # Bounded number of chunks in flight, written in submission order
+                if len(pending) >= 2 * n_workers:
+                    write(pending.popleft().result())
+            while len(pending) > 0:
+                write(pending.popleft().result())
+    finally:
+        if writer is not None:
+            writer.close()
+
+    return n_rows
 
 
 if __name__ == "__main__":
 
+    parser = argparse.ArgumentParser(description = "Feature extraction of labeled tweets")
+    parser.add_argument("--input", help = "CSV / Parquet file of tweets, features are extracted chunk by chunk in a process pool")
+    parser.add_argument("--output", help = "CSV / Parquet file the features of --input are written to")
+    parser.add_argument("--chunksize", type = int, default = 50000, help = "rows per chunk")
+    parser.add_argument("--workers", type = int, default = None, help = "worker processes (defaults to the number of cores)")
+    parser.add_argument("--sites", default = None, help = "CSV catalog of hazard sites (site_id, lat, lon) of the nearest site features")
+    parser.add_argument("--cache", default = None, help = "feature cache directory, only tweets not cached yet are featurized")
+    parser.add_argument("--event", default = "default", help = "event the tweets are cached under")
+    args = parser.parse_args()
+
+    # Batch mode
+    if args.input is not None:
+        catalog = HazardCatalog.from_csv(args.sites) if args.sites is not None else None
+        cache = FeatureCache(args.cache) if args.cache is not None else None
+        n = extract_features_file(args.input, args.output, chunksize = args.chunksize, n_workers = args.workers, catalog = catalog, cache = cache, event = args.event)
+        print("{} rows written to {}".format(n, args.output))
+        raise SystemExit(0)
+
     # Load data
     path = os.path.join(os.getcwd(),"twitter_sentiment_analysis", "Data","Taal_200111_200119_en_PH_labeled.csv")
-    data = pd.read_csv(path)
+    data = load_labeled(path, columns = ["id", "tweet", "lat", "lon", "sentiment_labels"])
 
     # Replace sentiment interger values with
-    replace_with = {1 : "positive", 0 : "neutral", -1 : "negative"}
-
-    df = label_sentiment(df = data, replace_with = replace_with)
+    df = label_sentiment(df = data, replace_with = SENTIMENT_NAMES)
     
     # Feature extraction
     # ++++++++++++++++++++++++++++++++++++++++++++++++++++++++++++++++++++++
@@ -151,34 +518,15 @@ if __name__ == "__main__":
     df = df.assign(distance_from_volcano = lambda x: havesine_distance(x.lat, x.lon))
     
     # Extracts Mention, Hashtags and URLS counts
-    regExpDict = {
-        "mentions" : r'@\w+',
-        "hashtags" : r'#\w+',
-        "urls" :  r'http[s]?://(?:[a-zA-Z]|[0-9]|[$-_@.&+]|[!*\(\),]|(?:%[0-9a-fA-F][0-9a-fA-F]))+'
-    }
-    
-    for k,v in regExpDict.items():
-        df[k] = df.tweet.apply(lambda tw: extract_tokens(tw, v))
+    for k,v in count_entities(df.tweet).items():
+        df[k] = v
 
     # Extract other text related features : Word count, unique words ...
-    nlp = English()
-    tokenizer = Tokenizer(nlp.vocab)
-
-    sp = spacy.load("en_core_web_sm")
-    all_stop_words = sp.Defaults.stop_words 
-    all_punctuations = string.punctuation 
-
-    df["word_count"] = df.tweet.apply(lambda x: len(tokenizer(x)))
-    df["unique_word_count"] = df.tweet.apply(lambda x: len(set([word.text.lower() for word in tokenizer(x)])))
-    df["char_count"] = df.tweet.apply(lambda x: len(x))
-    df["stop_word_count"] = df.tweet.apply(lambda x: len([word for word in map(lambda x: x.text.lower(), tokenizer(x)) if word in all_stop_words]))
-    df["mean_word_length"] = df.tweet.apply(lambda x: np.mean([len(w) for w in x.split()]))
-    df["punctuation_count"] = df.tweet.apply(lambda x: len([char for char in x if char in all_punctuations]))
+    df = df.join(text_features(df.tweet))
 
     # Compute emoticon score
     df["emoticons"] = df.tweet.apply(lambda x: extract_emoticons(tweet = x))
-    df["emoticon_count"] = df["emoticons"].apply(lambda x: len(x))
-    df["emoticon_score"] = df["emoticons"].apply(lambda x: compute_emoticon_score(emoticonList = x))
+    df["emoticon_count"], df["emoticon_score"] = emoji_matcher().count_and_score(df.tweet)
 
 
     # Data Visualization
@@ -0,0 +1,201 @@
+import csv
+import unicodedata
+from collections import namedtuple
+
+import numpy as np
+import pandas as pd
+
+# Columns of a GeoNames dump (allCountries.txt, PH.txt, cities500.txt, ...)
+GEONAMES_COLUMNS = [
+    "geonameid", "name", "asciiname", "alternatenames", "latitude", "longitude", "feature_class", "feature_code",
+    "country_code", "cc2", "admin1_code", "admin2_code", "admin3_code", "admin4_code", "population", "elevation",
+    "dem", "timezone", "modification_date"
+]
+
+# Confidence of each kind of match
+EXACT, PART, PREFIX, FUZZY = 1.0, 0.9, 0.7, 0.6
+
+# A gazetteer match, latitude / longitude as in geopy's Location so it can replace a geopy geocoder
+GazetteerMatch = namedtuple("GazetteerMatch", ["latitude", "longitude", "name", "geonameid", "population", "confidence"])
+
+def normalize_name(name):
+    """ Lowercase, accents removed, punctuation replaced by spaces, whitespace collapsed (e.g. 'Parañaque City!' -> 'paranaque city') """
+    name = unicodedata.normalize("NFKD", str(name))
+    name = "".join(c if c.isalnum() else " " for c in name if not unicodedata.combining(c))
+    return " ".join(name.lower().split())
+
+def _deletes(key):
+    """ Strings of key with one character deleted """
+    return {key[:i] + key[i + 1:] for i in range(len(key))}
+
+# ---------------------------------------- Gazetteer ------------------------------------
+
+class Gazetteer():
+    """
+    A class to geocode place names offline from a GeoNames dump : normalized names (name, ascii name and alternate names)
+    are held in a dict for exact matches and a sorted array for prefix matches, fuzzy matches (one typo) use a delete index
+    built on first use. Homonyms are ranked by population.
+    """
+    # Offline : no request rate to respect (lat_lon_extractor.default_limiter)
+    rate_limit = None
+
+    def __init__(self, places, min_prefix = 4, fuzzy_min_population = 1000):
+        """
+        Inputs : places - DataFrame of GeoNames rows (name, asciiname, alternatenames, latitude, longitude, population columns)
+                 min_prefix - shortest query matched by prefix
+                 fuzzy_min_population - places with a smaller population are not fuzzy matched (keeps the delete index small)
+        """
+        places = places.reset_index(drop = True)
+        self.min_prefix = min_prefix
+        self.fuzzy_min_population = fuzzy_min_population
+        self.geonameid = places["geonameid"].to_numpy(dtype = np.int64)
+        self.names = places["name"].to_numpy(dtype = object)
+        self.lat = places["latitude"].to_numpy(dtype = np.float64)
+        self.lon = places["longitude"].to_numpy(dtype = np.float64)
+        self.population = places["population"].fillna(0).to_numpy(dtype = np.int64)
+
+        # Every (normalized name, place) pair, the most populated place of a name wins
+        names = pd.concat([
+            places["name"],
+            places["asciiname"],
+            places["alternatenames"].fillna("").str.split(",").explode()
+        ])
+        names = names[names.astype(bool) & names.notna()]
+        unique = pd.Series(names.unique())
+        normalized = names.map(dict(zip(unique, unique.map(normalize_name))))
+        pairs = pd.DataFrame({"key" : normalized.to_numpy(), "row" : names.index.to_numpy()})
+        pairs = pairs[pairs["key"] != ""]
+        pairs["population"] = self.population[pairs["row"].to_numpy()]
+        pairs = pairs.sort_values(["key", "population"], ascending = [True, False]).drop_duplicates("key")
+
+        self.keys = pairs["key"].to_numpy(dtype = object)
+        self.key_rows = pairs["row"].to_numpy(dtype = np.int64)
+        self.exact = dict(zip(self.keys, self.key_rows))
+        self._fuzzy = None
+
+    @classmethod
+    def from_geonames(cls, path, countries = None, feature_classes = ("P", "A"), min_population = 0, **kwargs):
+        """
+        Loads a GeoNames dump
+        Inputs : path - tab separated GeoNames file
+                 countries - country codes to keep (e.g. ['PH']), None for all
+                 feature_classes - GeoNames feature classes to keep (P : populated places, A : administrative areas)
+                 min_population - places with a smaller population are dropped
+        """
+        places = pd.read_csv(
+            path, sep = "\t", header = None, names = GEONAMES_COLUMNS, quoting = csv.QUOTE_NONE,
+            usecols = ["geonameid", "name", "asciiname", "alternatenames", "latitude", "longitude", "feature_class", "country_code", "population"],
+            dtype = {"name" : str, "asciiname" : str, "alternatenames" : str, "feature_class" : str, "country_code" : str},
+            keep_default_na = False, na_values = {"population" : [""]}, encoding = "utf-8"
+        )
+        if countries is not None:
+            places = places[places["country_code"].isin(countries)]
+        if feature_classes is not None:
+            places = places[places["feature_class"].isin(feature_classes)]
+        places = places[places["population"].fillna(0) >= min_population]
+        return cls(places, **kwargs)
+
+    def __len__(self):
+        return len(self.keys)
+
+    # Matching ----------------------------------------------------------------------------------------
+
+    def _prefix(self, key):
+        """ Most populated place whose name starts with key, returns (row, matched name) """
+        if len(key) < self.min_prefix:
+            return None, None
+        lo = np.searchsorted(self.keys, key, side = "left")
+        hi = np.searchsorted(self.keys, key + "\U0010ffff", side = "left")
+        if lo == hi:
+            return None, None
+        best = lo + np.argmax(self.population[self.key_rows[lo:hi]])
+        return self.key_rows[best], self.keys[best]
+
+    def _fuzzy_index(self):
+        """ Delete index : name with one character deleted -> rows, of the places of at least fuzzy_min_population """
+        if self._fuzzy is None:
+            index = {}
+            for key, row in zip(self.keys, self.key_rows):
+                if (len(key) >= self.min_prefix) and (self.population[row] >= self.fuzzy_min_population):
+                    for variant in _deletes(key) | {key}:
+                        best = index.get(variant)
+                        if (best is None) or (self.population[row] > self.population[best]):
+                            index[variant] = row
+            self._fuzzy = index
+        return self._fuzzy
+
+    def _fuzzy_match(self, key):
+        """ Most populated place within one insertion / deletion / substitution of key """
+        if len(key) < self.min_prefix:
+            return None
+        index = self._fuzzy_index()
+        rows = [index[v] for v in _deletes(key) | {key} if v in index]
+        if len(rows) == 0:
+            return None
+        return max(rows, key = lambda row: self.population[row])
+
+    def match(self, address, fuzzy = True):
+        """
+        Best place of an address : exact match of the whole address, then of its comma separated parts
+        (most specific first), then prefix and fuzzy matches of the whole address / first part
+        Outputs : (row, confidence), (None, 0.0) when nothing matches
+        """
+        key = normalize_name(address)
+        if key == "":
+            return None, 0.0
+
+        row = self.exact.get(key)
+        if row is not None:
+            return row, EXACT
+
+        parts = [normalize_name(p) for p in str(address).split(",")]
+        parts = [p for p in parts if p != ""]
+        for part in parts:
+            row = self.exact.get(part)
+            if row is not None:
+                return row, PART
+
+        for candidate in dict.fromkeys([key] + parts[:1]):
+            row, name = self._prefix(candidate)
+            if row is not None:
+                return row, PREFIX * len(candidate) / len(name)
+
+        if fuzzy:
+            for candidate in dict.fromkeys([key] + parts[:1]):
+                row = self._fuzzy_match(candidate)
+                if row is not None:
+                    return row, FUZZY
+
+        return None, 0.0
+
+    # Geocoding ---------------------------------------------------------------------------------------
+
+    def geocode(self, address, timeout = None, min_confidence = 0.0):
+        """ geopy style geocode : GazetteerMatch of an address, None when nothing matches (timeout is ignored) """
+        row, confidence = self.match(address)
+        if (row is None) or (confidence < min_confidence):
+            return None
+        return GazetteerMatch(float(self.lat[row]), float(self.lon[row]), self.names[row], int(self.geonameid[row]), int(self.population[row]), confidence)
+
+    def geocode_batch(self, addresses, fuzzy = True):
+        """
+        Geocodes a batch of addresses, each distinct address is matched once
+        Outputs : DataFrame of lat, lon, confidence and geonameid (NaN / 0 / -1 for addresses without a match)
+        """
+        addresses = pd.Series(addresses)
+        distinct = addresses.dropna().unique()
+        matches = [self.match(a, fuzzy = fuzzy) for a in distinct]
+        rows = np.array([-1 if r is None else r for r, _ in matches], dtype = np.int64)
+        confidence = pd.Series([c for _, c in matches], index = distinct, dtype = np.float32)
+        found = rows >= 0
+
+        lat = pd.Series(np.where(found, self.lat[rows], np.nan), index = distinct)
+        lon = pd.Series(np.where(found, self.lon[rows], np.nan), index = distinct)
+        ids = pd.Series(np.where(found, self.geonameid[rows], -1), index = distinct)
+
+        return pd.DataFrame({
+            "lat" : addresses.map(lat).to_numpy(dtype = np.float64),
+            "lon" : addresses.map(lon).to_numpy(dtype = np.float64),
+            "confidence" : addresses.map(confidence).fillna(0).to_numpy(dtype = np.float32),
+            "geonameid" : addresses.map(ids).fillna(-1).to_numpy(dtype = np.int64),
+        }, index = addresses.index)
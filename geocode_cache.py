@@ -0,0 +1,70 @@
+import time
+import threading
+
+from sqlite_helpers import connect, select_in
+
+# ---------------------------------------- Geocode Cache --------------------------------
+
+class GeocodeCache():
+    """
+    A class to persist geocoding results per geocoder and normalized address (SQLite), including addresses the geocoder
+    could not resolve (negative results), so a rerun only geocodes addresses never seen. Results expire after ttl seconds,
+    negative results after negative_ttl seconds (the geocoder may learn the place, or a lookup failed transiently)
+    Each geocoder (e.g. 'GeoNames', 'Gazetteer') has its own results, one never answers from another's
+    """
+    def __init__(self, path, ttl = 180 * 24 * 60 * 60, negative_ttl = 7 * 24 * 60 * 60):
+        self.path = path
+        self.ttl = ttl
+        self.negative_ttl = negative_ttl
+        self.hits = 0
+        self.misses = 0
+        self._lock = threading.Lock()
+        self._conn = connect(
+            path,
+            """CREATE TABLE IF NOT EXISTS geocodes (
+                geocoder TEXT, address TEXT, lat REAL, lon REAL, found INTEGER, cached_at REAL,
+                PRIMARY KEY (geocoder, address))"""
+        )
+
+    def get_many(self, addresses, geocoder = ""):
+        """
+        Returns the cached results of addresses that have not expired
+        Inputs : geocoder - name of the geocoder the results were stored for
+        Outputs : dict address -> (lat, lon), (None, None) for a negative result
+        """
+        addresses = list(addresses)
+        now = time.time()
+        found = {}
+        with self._lock:
+            rows = select_in(
+                self._conn, "SELECT address, lat, lon, found, cached_at FROM geocodes WHERE geocoder = ? AND address IN ({})", addresses, params = (geocoder,)
+            )
+        for address, lat, lon, ok, cached_at in rows:
+            if now - cached_at < (self.ttl if ok else self.negative_ttl):
+                found[address] = (lat, lon) if ok else (None, None)
+
+        self.hits += len(found)
+        self.misses += len(addresses) - len(found)
+        return found
+
+    def put_many(self, results, geocoder = ""):
+        """ Stores the results of a geocoder : dict address -> (lat, lon), (None, None) when the geocoder found nothing """
+        now = time.time()
+        with self._lock, self._conn:
+            self._conn.executemany(
+                "INSERT OR REPLACE INTO geocodes VALUES (?, ?, ?, ?, ?, ?)",
+                [(geocoder, address, lat, lon, int(lat is not None), now) for address, (lat, lon) in results.items()]
+            )
+
+    def purge(self):
+        """ Deletes the expired entries """
+        now = time.time()
+        with self._lock, self._conn:
+            self._conn.execute(
+                "DELETE FROM geocodes WHERE (found = 1 AND cached_at <= ?) OR (found = 0 AND cached_at <= ?)",
+                (now - self.ttl, now - self.negative_ttl)
+            )
+
+    def __len__(self):
+        with self._lock:
+            return self._conn.execute("SELECT COUNT(*) FROM geocodes").fetchone()[0]
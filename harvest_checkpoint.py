@@ -0,0 +1,108 @@
+import threading
+
+from sqlite_helpers import connect, select_in
+
+# ------------------------------------- Harvest Checkpoint ------------------------------
+
+class HarvestCheckpoint():
+    """
+    A class to record the search windows / pages already harvested and, per live query, the last since_id and the
+    resume point of a run that stopped before reaching it (SQLite)
+    """
+    def __init__(self, path):
+        self.path = path
+        self._lock = threading.Lock()
+        self._conn = connect(
+            path,
+            """CREATE TABLE IF NOT EXISTS windows (
+                endpoint TEXT, query TEXT, from_date TEXT, to_date TEXT, max_results INTEGER,
+                pages_done INTEGER, next_token TEXT, done INTEGER,
+                PRIMARY KEY (endpoint, query, from_date, to_date, max_results))""",
+            "CREATE TABLE IF NOT EXISTS since_ids (query TEXT PRIMARY KEY, since_id INTEGER)",
+            "CREATE TABLE IF NOT EXISTS resume_points (query TEXT PRIMARY KEY, max_id INTEGER, newest_id INTEGER)"
+        )
+
+    def window(self, endpoint, query, search_from, search_to, max_results):
+        """
+        Returns the state of a search window
+        Outputs : (pages_done, next_token, done) - (0, None, False) for a window never harvested
+        """
+        with self._lock:
+            row = self._conn.execute(
+                "SELECT pages_done, next_token, done FROM windows WHERE endpoint = ? AND query = ? AND from_date = ? AND to_date = ? AND max_results = ?",
+                (endpoint, query, search_from, search_to, max_results)
+            ).fetchone()
+
+        if row is None:
+            return 0, None, False
+        return row[0], row[1], bool(row[2])
+
+    def page_done(self, endpoint, query, search_from, search_to, max_results, next_token):
+        """ Records a completed page of a search window, next_token is None once the window has no more pages """
+        with self._lock, self._conn:
+            self._conn.execute(
+                """INSERT INTO windows VALUES (?, ?, ?, ?, ?, 1, ?, ?)
+                ON CONFLICT (endpoint, query, from_date, to_date, max_results)
+                DO UPDATE SET pages_done = pages_done + 1, next_token = excluded.next_token, done = excluded.done""",
+                (endpoint, query, search_from, search_to, max_results, next_token, int(next_token is None))
+            )
+
+    def since_id(self, query):
+        """ Returns the newest tweet id harvested for a live query, None if the query was never harvested """
+        with self._lock:
+            row = self._conn.execute("SELECT since_id FROM since_ids WHERE query = ?", (query,)).fetchone()
+        return None if row is None else row[0]
+
+    def set_since_id(self, query, since_id):
+        """ Records the newest tweet id harvested for a live query, every tweet up to since_id has been harvested (clears the resume point) """
+        with self._lock, self._conn:
+            self._conn.execute(
+                "INSERT INTO since_ids VALUES (?, ?) ON CONFLICT (query) DO UPDATE SET since_id = MAX(since_id, excluded.since_id)",
+                (query, since_id)
+            )
+            self._conn.execute("DELETE FROM resume_points WHERE query = ?", (query,))
+
+    def resume_point(self, query):
+        """
+        Returns the resume point of a live query whose last run stopped (at its tweet cap) before reaching the since_id
+        Outputs : (max_id, newest_id) - tweets between the since_id and max_id are still to harvest, newest_id is the
+                  since_id once they are. (None, None) when there is no resume point
+        """
+        with self._lock:
+            row = self._conn.execute("SELECT max_id, newest_id FROM resume_points WHERE query = ?", (query,)).fetchone()
+        return (None, None) if row is None else row
+
+    def set_resume_point(self, query, max_id, newest_id):
+        """ Records the resume point of a live query (see resume_point) """
+        with self._lock, self._conn:
+            self._conn.execute(
+                "INSERT INTO resume_points VALUES (?, ?, ?) ON CONFLICT (query) DO UPDATE SET max_id = excluded.max_id, newest_id = excluded.newest_id",
+                (query, max_id, newest_id)
+            )
+
+# --------------------------------------- Tweet Id Index --------------------------------
+
+class TweetIdIndex():
+    """ A class to persist the ids of every tweet harvested, so re-runs never return a tweet twice (SQLite) """
+    def __init__(self, path):
+        self.path = path
+        self._lock = threading.Lock()
+        self._conn = connect(path, "CREATE TABLE IF NOT EXISTS tweet_ids (id INTEGER PRIMARY KEY)")
+
+    def __len__(self):
+        with self._lock:
+            return self._conn.execute("SELECT COUNT(*) FROM tweet_ids").fetchone()[0]
+
+    def __contains__(self, tweet_id):
+        return len(self.seen([tweet_id])) > 0
+
+    def seen(self, ids):
+        """ Returns the subset of ids already in the index """
+        with self._lock:
+            rows = select_in(self._conn, "SELECT id FROM tweet_ids WHERE id IN ({})", [int(i) for i in ids])
+        return {row[0] for row in rows}
+
+    def add(self, ids):
+        """ Adds ids to the index """
+        with self._lock, self._conn:
+            self._conn.executemany("INSERT OR IGNORE INTO tweet_ids VALUES (?)", [(int(i),) for i in ids])
@@ -0,0 +1,72 @@
+import numpy as np
+import pandas as pd
+from sklearn.neighbors import BallTree
+
+# Average radius of the earth in km (as in feature_extraction.havesine_distance)
+EARTH_RADIUS = 6371
+
+# Default catalog : active volcanoes of the Philippines (Taal at the coordinates used by havesine_distance)
+HAZARD_SITES = pd.DataFrame(
+    [
+        ("taal", "Taal", "volcano", 14.13, 120.99),
+        ("mayon", "Mayon", "volcano", 13.257, 123.685),
+        ("pinatubo", "Pinatubo", "volcano", 15.13, 120.35),
+        ("kanlaon", "Kanlaon", "volcano", 10.412, 123.132),
+        ("bulusan", "Bulusan", "volcano", 12.77, 124.05),
+    ],
+    columns = ["site_id", "name", "hazard", "lat", "lon"]
+)
+
+# ---------------------------------------- Hazard Catalog -------------------------------
+
+class HazardCatalog():
+    """
+    A class to find the hazard sites nearest to tweets : the sites are indexed in a BallTree on the haversine metric,
+    so each tweet costs O(log m) for m sites instead of a distance to every site
+    """
+    def __init__(self, sites = HAZARD_SITES):
+        """ sites - DataFrame with site_id, lat and lon columns (any other column, e.g. name / hazard, is kept) """
+        self.sites = sites.reset_index(drop = True)
+        self.site_ids = self.sites["site_id"].to_numpy()
+        self.tree = BallTree(np.radians(self.sites[["lat", "lon"]].to_numpy(dtype = np.float64)), metric = "haversine")
+
+    @classmethod
+    def from_csv(cls, path, hazard = None):
+        """ Catalog of a CSV file with site_id, lat and lon columns, optionally only the sites of one hazard type """
+        sites = pd.read_csv(path)
+        if hazard is not None:
+            sites = sites[sites["hazard"] == hazard]
+        return cls(sites)
+
+    def __len__(self):
+        return len(self.sites)
+
+    def nearest(self, lat, lon, radius = 50, chunksize = 1000000):
+        """
+        Nearest site of each tweet
+        Inputs : lat, lon - arrays / Series of tweet coordinates in degrees (NaN for tweets without coordinates)
+                 radius - radius (km) of the sites_within_radius count
+                 chunksize - tweets queried at once, bounds the memory of the query
+        Outputs : DataFrame (with the index of lat when it is a Series) of nearest_site, nearest_site_distance (km)
+                  and sites_within_radius, tweets without coordinates get no site, a NaN distance and a count of 0
+        """
+        index = lat.index if isinstance(lat, pd.Series) else None
+        coords = np.radians(np.column_stack([np.asarray(lat, dtype = np.float64), np.asarray(lon, dtype = np.float64)]))
+        located = np.flatnonzero(~np.isnan(coords).any(axis = 1))
+
+        site = np.full(len(coords), None, dtype = object)
+        distance = np.full(len(coords), np.nan)
+        within = np.zeros(len(coords), dtype = np.int32)
+
+        for i in range(0, len(located), chunksize):
+            rows = located[i:i + chunksize]
+            dist, ind = self.tree.query(coords[rows], k = 1)
+            site[rows] = self.site_ids[ind[:, 0]]
+            distance[rows] = dist[:, 0] * EARTH_RADIUS
+            within[rows] = self.tree.query_radius(coords[rows], r = radius / EARTH_RADIUS, count_only = True)
+
+        return pd.DataFrame(
+            # nearest_site is a string column even when no tweet has coordinates (an all None object column has no type in arrow)
+            {"nearest_site" : pd.array(site, dtype = "string"), "nearest_site_distance" : distance, "sites_within_radius" : within},
+            index = index
+        )
@@ -1,27 +1,163 @@
+import time
+import random
+import threading
 import pandas as pd
-from geopy import geocoders 
-from geopy.exc import GeocoderTimedOut
+from concurrent.futures import ThreadPoolExecutor
+from geopy import geocoders
+from geopy.exc import GeocoderTimedOut, GeocoderUnavailable
 
-# Authentication : Replace ??? with your api username 
+# Authentication : Replace ??? with your api username
 gn = geocoders.GeoNames(username = "???")
 
-def Lat_Lon_Extractor(df:pd.DataFrame, address_col_name: pd.Series)->pd.DataFrame:
-    """Extracts the lat/lon from an address : Max 1000 addresses allowed by geopy api per hour"""
+def normalize_addresses(addresses:pd.Series)->pd.Series:
+    """
+    Normalizes addresses so spellings of the same place share a lookup : unicode (NFKC) and case folding,
+    symbols / emojis removed, whitespace collapsed. Addresses left empty become None
+    """
+    # Python storage : the regex engine of pyarrow strings (RE2) reads \w as ASCII only, 'Parañaque' would lose its ñ
+    normalized = (
+        addresses.astype("string[python]")
+        .str.normalize("NFKC")
+        .str.lower()
+        .str.replace(r"[^\w\s,.'-]", " ", regex = True)
+        .str.replace(r"\s+", " ", regex = True)
+        .str.strip(" ,.-")
+    )
+    return normalized.mask(normalized == "")
 
-    lat_ls = []
-    lon_ls = []
+# ---------------------------------------- Rate Limit / Retry ---------------------------
 
-    for addr in df[address_col_name]:
-        geo = gn.geocode(addr,timeout = 15)
-        if geo is not None:
-            lat_ls.append(geo.latitude)
-            lon_ls.append(geo.longitude)
-        else:
-            lat_ls.append(None)
-            lon_ls.append(None)
+class TokenBucket():
+    """
+    A class to share a request rate between threads : tokens refill at rate per second up to capacity (the burst size),
+    each request takes a token and waits for it when the bucket is empty
+    """
+    def __init__(self, rate, capacity = 1):
+        self.rate = rate
+        self.capacity = capacity
+        self._tokens = capacity
+        self._updated = time.monotonic()
+        self._lock = threading.Lock()
 
-    df["lat"] = lat_ls
-    df["lon"] = lon_ls
+    def acquire(self):
+        """ Takes a token, blocks until it is available. Tokens are reserved in call order, so waiting threads are served in turn """
+        with self._lock:
+            now = time.monotonic()
+            self._tokens = min(self.capacity, self._tokens + (now - self._updated) * self.rate)
+            self._updated = now
+            self._tokens -= 1
+            wait = -self._tokens / self.rate if self._tokens < 0 else 0.0
+        if wait > 0:
+            time.sleep(wait)
+
+# Request rates (per second) of the geocoding providers' usage policies, the default limit of concurrent geocoding
+# GeoNames : 1000 credits per hour (free account), Nominatim : 1 request per second
+PROVIDER_RATES = {
+    'GeoNames' : 1000 / 3600,
+    'Nominatim' : 1.0,
+}
+# Rate of providers not in PROVIDER_RATES
+DEFAULT_RATE = 1.0
+
+_defaultLimiters = {}
+_defaultLimitersLock = threading.Lock()
+
+def default_limiter(geocoder):
+    """
+    TokenBucket of a geocoder's provider, shared by every call of the process : geocoder.rate_limit when the geocoder
+    has one (None for no limit), else the rate of PROVIDER_RATES (DEFAULT_RATE for other providers)
+    """
+    name = type(geocoder).__name__
+    rate = getattr(geocoder, 'rate_limit', PROVIDER_RATES.get(name, DEFAULT_RATE))
+    if rate is None:
+        return None
+    with _defaultLimitersLock:
+        if (name, rate) not in _defaultLimiters:
+            _defaultLimiters[(name, rate)] = TokenBucket(rate)
+        return _defaultLimiters[(name, rate)]
+
+def _geocode_retry(addr, geocoder, limiter = None, retries = 3, backoff = 1.0, max_backoff = 60.0, timeout = 15):
+    """
+    Geocodes an address, timeouts (and unavailable service) are retried up to retries times after a jittered exponential
+    backoff (uniform between 0 and backoff * 2 ** attempt seconds)
+    Outputs : (lat, lon), (None, None) when not found, None when every attempt failed
+    """
+    for attempt in range(retries + 1):
+        if limiter is not None:
+            limiter.acquire()
+        try:
+            geo = geocoder.geocode(addr, timeout = timeout)
+            return (geo.latitude, geo.longitude) if geo is not None else (None, None)
+        except (GeocoderTimedOut, GeocoderUnavailable):
+            if attempt == retries:
+                return None
+            time.sleep(random.uniform(0, min(max_backoff, backoff * 2 ** attempt)))
+
+# ---------------------------------------- Geocoding ------------------------------------
+
+def _geocode(addresses, geocoder, cache = None, namespace = "", flush_every = 100, n_workers = 1, limiter = None, retries = 3, backoff = 1.0):
+    """
+    Geocodes addresses, returns dict address -> (lat, lon), (None, None) when not found
+    Addresses are geocoded one after another, or by n_workers threads (sharing limiter), results are collected in order.
+    Addresses whose every attempt failed are left out (not cached, retried on the next run)
+    Results are written to the cache (under namespace) every flush_every addresses, so an interrupted run keeps its progress
+    A geocoder with a geocode_batch method (gazetteer.Gazetteer) geocodes all the addresses in one call
+    """
+    if hasattr(geocoder, "geocode_batch"):
+        found = geocoder.geocode_batch(addresses)
+        results = {
+            addr : (float(lat), float(lon)) if lat == lat else (None, None)
+            for addr, lat, lon in zip(addresses, found["lat"], found["lon"])
+        }
+        if cache is not None:
+            cache.put_many(results, geocoder = namespace)
+        return results
+
+    def lookup(addr):
+        return _geocode_retry(addr, geocoder, limiter = limiter, retries = retries, backoff = backoff)
+
+    results = {}
+    pending = {}
+    with ThreadPoolExecutor(max_workers = n_workers) as executor:
+        found = executor.map(lookup, addresses) if n_workers > 1 else map(lookup, addresses)
+        for addr, result in zip(addresses, found):
+            if result is not None:
+                pending[addr] = result
+            if (cache is not None) and (len(pending) >= flush_every):
+                cache.put_many(pending, geocoder = namespace)
+                results.update(pending)
+                pending = {}
+
+    if cache is not None:
+        cache.put_many(pending, geocoder = namespace)
+    results.update(pending)
+    return results
+
+def Lat_Lon_Extractor(df:pd.DataFrame, address_col_name: pd.Series, cache = None, geocoder = gn, n_workers = 1, limiter = None, retries = 3, namespace = None)->pd.DataFrame:
+    """
+    Extracts the lat/lon from an address : Max 1000 addresses allowed by geopy api per hour
+    Addresses are normalized and deduplicated, each distinct address is geocoded once.
+    With a geocode_cache.GeocodeCache only the addresses not in the cache (including those the geocoder could not
+    resolve) are sent to the geocoder. Results are cached per namespace, the geocoder class name by default (e.g. 'GeoNames'),
+    pass a namespace per data source for geocoders of the same class (e.g. gazetteers of different dumps)
+    geocoder can be a geopy geocoder or an offline gazetteer.Gazetteer (no quota, no network)
+    n_workers > 1 geocodes concurrently, limiter (TokenBucket) keeps the requests within the provider quota (defaults to
+    default_limiter(geocoder) with n_workers > 1), timeouts are retried retries times. Addresses that kept timing out get
+    NaN lat / lon
+    """
+    if (limiter is None) and (n_workers > 1):
+        limiter = default_limiter(geocoder)
+    normalized = normalize_addresses(df[address_col_name])
+    addresses = normalized.dropna().unique().tolist()
+
+    namespace = type(geocoder).__name__ if namespace is None else namespace
+    results = cache.get_many(addresses, geocoder = namespace) if cache is not None else {}
+    missing = [addr for addr in addresses if addr not in results]
+    if len(missing) > 0:
+        results.update(_geocode(missing, geocoder, cache = cache, namespace = namespace, n_workers = n_workers, limiter = limiter, retries = retries))
+
+    # Rows are mapped through the distinct addresses
+    df["lat"] = normalized.map({addr : lat for addr, (lat, lon) in results.items()}).astype(float).to_numpy()
+    df["lon"] = normalized.map({addr : lon for addr, (lat, lon) in results.items()}).astype(float).to_numpy()
 
     return df
-        
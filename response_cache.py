@@ -0,0 +1,126 @@
+import json
+import time
+import zlib
+import hashlib
+import sqlite3
+import threading
+from datetime import datetime, timedelta, timezone
+
+# ---------------------------------------- Response Cache -------------------------------
+
+class ResponseCache():
+    """
+    A class to cache raw search result pages on disk (SQLite, zlib compressed json)
+    Entries of live windows (toDate not reached yet) expire after live_ttl seconds, recent windows (closed less than
+    settle ago, tweets can still be deleted / counted) after recent_ttl seconds, older windows never expire.
+    The least recently used entries are evicted once the cache grows over max_bytes.
+    """
+    def __init__(self, path, max_bytes = 512 * 1024 ** 2, live_ttl = 5 * 60, recent_ttl = 6 * 60 * 60, settle = timedelta(days = 1)):
+        self.path = path
+        self.max_bytes = max_bytes
+        self.live_ttl = live_ttl
+        self.recent_ttl = recent_ttl
+        self.settle = settle
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+        self._lock = threading.Lock()
+        self._conn = sqlite3.connect(path, check_same_thread = False)
+        with self._conn:
+            self._conn.execute(
+                """CREATE TABLE IF NOT EXISTS pages (
+                    key TEXT PRIMARY KEY, payload BLOB, size INTEGER, accessed REAL, expires REAL)"""
+            )
+            self._conn.execute("CREATE INDEX IF NOT EXISTS pages_accessed ON pages (accessed)")
+        self._size = self._conn.execute("SELECT COALESCE(SUM(size), 0) FROM pages").fetchone()[0]
+
+    # keys and expiry ---------------------------------------------------------------------------------
+
+    def key(self, endpoint, **params):
+        """ Normalised key of a request : the query is case and whitespace insensitive, None parameters are dropped """
+        if params.get('query') is not None:
+            params['query'] = ' '.join(params['query'].lower().split())
+        params = {k : v for k, v in params.items() if v is not None}
+        return hashlib.sha1(json.dumps([endpoint, params], sort_keys = True).encode()).hexdigest()
+
+    def ttl(self, search_to = None):
+        """ Seconds an entry of a window ending at search_to ('YYYYMMDDHHMM', UTC) stays valid, None for permanent """
+        now = datetime.now(timezone.utc).replace(tzinfo = None)
+        if (search_to is None) or (datetime.strptime(search_to, '%Y%m%d%H%M') > now):
+            return self.live_ttl
+        if datetime.strptime(search_to, '%Y%m%d%H%M') > now - self.settle:
+            return self.recent_ttl
+        return None
+
+    # get / put ---------------------------------------------------------------------------------------
+
+    def get(self, key):
+        """ Returns the cached payload of a key, None on a miss """
+        now = time.time()
+        with self._lock:
+            row = self._conn.execute("SELECT payload, size, expires FROM pages WHERE key = ?", (key,)).fetchone()
+            if (row is not None) and (row[2] is not None) and (row[2] <= now):
+                with self._conn:
+                    self._conn.execute("DELETE FROM pages WHERE key = ?", (key,))
+                self._size -= row[1]
+                row = None
+
+            if row is None:
+                self.misses += 1
+                return None
+
+            with self._conn:
+                self._conn.execute("UPDATE pages SET accessed = ? WHERE key = ?", (now, key))
+            self.hits += 1
+
+        return json.loads(zlib.decompress(row[0]))
+
+    def put(self, key, payload, ttl = None):
+        """ Stores a json serialisable payload, ttl in seconds (None for a permanent entry) """
+        blob = zlib.compress(json.dumps(payload, separators = (',', ':')).encode(), 6)
+        now = time.time()
+        with self._lock, self._conn:
+            old = self._conn.execute("SELECT size FROM pages WHERE key = ?", (key,)).fetchone()
+            self._conn.execute(
+                "INSERT OR REPLACE INTO pages VALUES (?, ?, ?, ?, ?)",
+                (key, blob, len(blob), now, None if ttl is None else now + ttl)
+            )
+            self._size += len(blob) - (old[0] if old is not None else 0)
+            self._evict()
+
+    def _evict(self):
+        """ Deletes expired entries, then the least recently used ones until the cache fits in max_bytes """
+        if self._size <= self.max_bytes:
+            return
+
+        expired = self._conn.execute("SELECT COALESCE(SUM(size), 0), COUNT(*) FROM pages WHERE expires <= ?", (time.time(),)).fetchone()
+        self._conn.execute("DELETE FROM pages WHERE expires <= ?", (time.time(),))
+        self._size -= expired[0]
+        self.evictions += expired[1]
+
+        for key, size in self._conn.execute("SELECT key, size FROM pages ORDER BY accessed").fetchall():
+            if self._size <= self.max_bytes:
+                break
+            self._conn.execute("DELETE FROM pages WHERE key = ?", (key,))
+            self._size -= size
+            self.evictions += 1
+
+    def stats(self):
+        """ Hit / miss counters and size of the cache """
+        with self._lock:
+            entries = self._conn.execute("SELECT COUNT(*) FROM pages").fetchone()[0]
+        requests = self.hits + self.misses
+        return {
+            'hits' : self.hits,
+            'misses' : self.misses,
+            'hit_rate' : self.hits / requests if requests > 0 else 0.0,
+            'evictions' : self.evictions,
+            'entries' : entries,
+            'bytes' : self._size
+        }
+
+    def clear(self):
+        """ Deletes every entry """
+        with self._lock, self._conn:
+            self._conn.execute("DELETE FROM pages")
+            self._size = 0
@@ -0,0 +1,198 @@
+import os
+import json
+import time
+import threading
+import pandas as pd
+
+MANIFEST = 'manifest.json'
+
+def _fsync_dir(directory):
+    """ Makes renames / new files in the directory durable (no-op where directories can not be opened, e.g. Windows) """
+    try:
+        fd = os.open(directory, os.O_RDONLY)
+    except OSError:
+        return
+    try:
+        os.fsync(fd)
+    finally:
+        os.close(fd)
+
+# ---------------------------------------- Segment Writer -------------------------------
+
+class SegmentWriter():
+    """
+    A class to append tweets to rolling csv segment files : appended rows are buffered and flushed in batches,
+    segments are rotated by size or age and fsynced in groups. A manifest records the rows / bytes of every segment
+    that are on disk, so a crash never leaves a torn row visible to readers and saving costs O(new rows).
+    """
+    def __init__(self, directory, prefix = 'tweets', max_bytes = 64 * 1024 ** 2, max_age = 60 * 60, flush_rows = 1000, flush_interval = 5, fsync_every = 10):
+        """
+        Inputs : directory - folder of the segments and the manifest
+                 max_bytes, max_age - a segment is sealed once it holds max_bytes or is max_age seconds old
+                 flush_rows, flush_interval - buffered rows are written once flush_rows are buffered or flush_interval seconds passed
+                 fsync_every - number of flushes per fsync (group fsync), segments are always fsynced when sealed
+        """
+        self.directory = directory
+        self.prefix = prefix
+        self.max_bytes = max_bytes
+        self.max_age = max_age
+        self.flush_rows = flush_rows
+        self.flush_interval = flush_interval
+        self.fsync_every = fsync_every
+
+        self._lock = threading.RLock()
+        self._buffer = []
+        self._buffered = 0
+        self._last_flush = time.monotonic()
+        self._unsynced = 0
+        self._flushes = 0
+        self._file = None
+        self._columns = None
+
+        os.makedirs(directory, exist_ok = True)
+        self.manifest = read_manifest(directory)
+        self._recover()
+
+    # Manifest ----------------------------------------------------------------------------------------
+
+    def _write_manifest(self):
+        """ Atomically replaces the manifest """
+        path = os.path.join(self.directory, MANIFEST)
+        with open(path + '.tmp', 'w') as f:
+            json.dump(self.manifest, f, indent = 1)
+            f.flush()
+            os.fsync(f.fileno())
+        os.replace(path + '.tmp', path)
+
+    def _recover(self):
+        """ Seals a segment left open by a crash, dropping the bytes written after its last fsync """
+        segments = self.manifest['segments']
+        if (len(segments) > 0) and (not segments[-1]['sealed']):
+            path = os.path.join(self.directory, segments[-1]['file'])
+            if os.path.exists(path) and (os.path.getsize(path) > segments[-1]['bytes']):
+                with open(path, 'r+b') as f:
+                    f.truncate(segments[-1]['bytes'])
+            segments[-1]['sealed'] = True
+            self._write_manifest()
+
+    # Segments ----------------------------------------------------------------------------------------
+
+    def _open_segment(self, columns):
+        n = self.manifest['next_segment']
+        name = '{}-{:06d}.csv'.format(self.prefix, n)
+        self._file = open(os.path.join(self.directory, name), 'w', newline = '', encoding = 'utf-8')
+        self._columns = columns
+        self._opened = time.monotonic()
+        self.manifest['next_segment'] = n + 1
+        self.manifest['segments'].append({'file' : name, 'rows' : 0, 'bytes' : 0, 'created' : time.time(), 'sealed' : False})
+
+    def _sync(self):
+        """ fsyncs the open segment and records its synced rows / bytes in the manifest """
+        self._file.flush()
+        os.fsync(self._file.fileno())
+        segment = self.manifest['segments'][-1]
+        segment['rows'] += self._unsynced
+        segment['bytes'] = self._file.tell()
+        self._unsynced = 0
+        self._flushes = 0
+        self._write_manifest()
+
+    def _seal(self):
+        if self._file is None:
+            return
+        self._sync()
+        self._file.close()
+        self._file = None
+        self.manifest['segments'][-1]['sealed'] = True
+        self._write_manifest()
+        _fsync_dir(self.directory)
+
+    # Append / flush ----------------------------------------------------------------------------------
+
+    def append(self, df):
+        """ Buffers a DataFrame of tweets (indexed on id), flushing when the buffer is full or old enough """
+        if len(df) == 0:
+            return
+        with self._lock:
+            self._buffer.append(df)
+            self._buffered += len(df)
+            if (self._buffered >= self.flush_rows) or (time.monotonic() - self._last_flush >= self.flush_interval):
+                self.flush()
+
+    # Writers such as TweetPipeline take a callable persisting a batch
+    __call__ = append
+
+    def flush(self, fsync = False):
+        """ Writes the buffered rows to the open segment, rotating it by size / age and fsyncing every fsync_every flushes """
+        with self._lock:
+            self._last_flush = time.monotonic()
+            if len(self._buffer) > 0:
+                df = pd.concat(self._buffer) if len(self._buffer) > 1 else self._buffer[0]
+                self._buffer = []
+                self._buffered = 0
+
+                # A segment has a single header : a change of columns starts a new segment
+                columns = [df.index.name] + list(df.columns)
+                if (self._file is not None) and (columns != self._columns):
+                    self._seal()
+                if self._file is None:
+                    self._open_segment(columns)
+
+                df.to_csv(self._file, header = self._file.tell() == 0)
+                self._unsynced += len(df)
+                self._flushes += 1
+
+                if (self._file.tell() >= self.max_bytes) or (time.monotonic() - self._opened >= self.max_age):
+                    self._seal()
+                    return
+
+            if (self._file is not None) and (self._unsynced > 0) and (fsync or self._flushes >= self.fsync_every):
+                self._sync()
+
+    def close(self):
+        """ Flushes the buffer and seals the open segment """
+        with self._lock:
+            self.flush()
+            self._seal()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        self.close()
+
+# ---------------------------------------- Segment Reader -------------------------------
+
+def read_manifest(directory):
+    """ Returns the manifest of a segment directory (an empty manifest for a new directory) """
+    path = os.path.join(directory, MANIFEST)
+    if not os.path.exists(path):
+        return {'next_segment' : 0, 'segments' : []}
+    with open(path) as f:
+        return json.load(f)
+
+def iter_segments(directory, columns = None, chunksize = None):
+    """
+    Lazily reads the segments of a directory in write order, yields one DataFrame per segment (or per chunksize rows)
+    Only the rows recorded in the manifest are read, rows of an unsynced tail are skipped
+    """
+    usecols = None if columns is None else ['id'] + [c for c in columns if c != 'id']
+    for segment in read_manifest(directory)['segments']:
+        if segment['rows'] == 0:
+            continue
+        reader = pd.read_csv(
+            os.path.join(directory, segment['file']), index_col = 'id', usecols = usecols,
+            nrows = segment['rows'], chunksize = chunksize
+        )
+        if chunksize is None:
+            yield reader
+        else:
+            with reader:
+                yield from reader
+
+def read_segments(directory, columns = None):
+    """ Reads every segment of a directory into a single DataFrame """
+    frames = list(iter_segments(directory, columns = columns))
+    if len(frames) == 0:
+        return pd.DataFrame()
+    return pd.concat(frames)
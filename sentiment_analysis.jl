@@ -6,7 +6,8 @@ using MLDataUtils
 
 #Load Data -------------------------------------------------------------------------
 dir = "Disaster_Social_Media_Analysis"
-data = CSV.read(joinpath(dir,"Data","Taal_200111_200119_en_PH_labeled.csv"))
+# Only the text and label columns are read, labels as Int8 (same schema as data_loader.py)
+data = CSV.read(joinpath(dir,"Data","Taal_200111_200119_en_PH_labeled.csv"); select = [:tweet,:sentiment_labels], types = Dict(:sentiment_labels => Int8))
 
 names(data)
 
@@ -0,0 +1,138 @@
+import argparse
+import numpy as np
+import scipy.sparse as sp
+from scipy.special import logsumexp
+
+from text_vectorizer import TweetVectorizer
+from data_loader import load_labeled, SENTIMENT_NAMES
+
+# ---------------------------------------- Sentiment Classifier -------------------------
+
+class SentimentClassifier():
+    """
+    A class for a multinomial Naive Bayes sentiment classifier of tweets : term counts per class are kept in a
+    (classes x hashed terms) array, so training (fit / partial_fit) and prediction run on whole batches of tweets
+    """
+    def __init__(self, classes = (-1, 0, 1), n_features = 2 ** 18, ngram_range = (1, 1), alpha = 1.0):
+        """
+        Inputs : classes - sentiment labels
+                 n_features - number of hashed term columns
+                 ngram_range - word n-grams counted
+                 alpha - additive (Laplace) smoothing
+        """
+        self.classes = np.array(sorted(classes))
+        self.n_features = n_features
+        self.ngram_range = tuple(ngram_range)
+        self.alpha = alpha
+        self.vectorizer = TweetVectorizer(hashed = True, n_features = n_features, ngram_range = self.ngram_range)
+        self.class_counts = np.zeros(len(self.classes), dtype = np.float64)
+        self.feature_counts = np.zeros((len(self.classes), n_features), dtype = np.float64)
+        self._log_probs = None
+
+    # Train -------------------------------------------------------------------------------------------
+
+    def _class_index(self, labels):
+        labels = np.asarray(labels)
+        idx = np.searchsorted(self.classes, labels)
+        if (idx >= len(self.classes)).any() or (self.classes[np.minimum(idx, len(self.classes) - 1)] != labels).any():
+            raise ValueError("labels must be one of {}".format(self.classes.tolist()))
+        return idx
+
+    def partial_fit(self, tweets, labels):
+        """ Adds the term counts of a batch of labeled tweets """
+        X = self.vectorizer.transform(tweets)
+        idx = self._class_index(labels)
+        Y = sp.csr_matrix((np.ones(len(idx)), (idx, np.arange(len(idx)))), shape = (len(self.classes), len(idx)))
+
+        self.feature_counts += (Y @ X).toarray()
+        self.class_counts += np.bincount(idx, minlength = len(self.classes))
+        self._log_probs = None
+        return self
+
+    def fit(self, batches):
+        """ partial_fit on every (tweets, labels) batch of an iterable """
+        for tweets, labels in batches:
+            self.partial_fit(tweets, labels)
+        return self
+
+    def _fitted(self):
+        """ Log priors and smoothed log term probabilities, recomputed after each partial_fit """
+        if self._log_probs is None:
+            if self.class_counts.sum() == 0:
+                raise ValueError("the classifier has not been trained")
+            counts = self.feature_counts + self.alpha
+            feature_log_prob = np.log(counts) - np.log(counts.sum(axis = 1, keepdims = True))
+            class_log_prior = np.log(np.maximum(self.class_counts, 1e-12)) - np.log(self.class_counts.sum())
+            self._log_probs = (class_log_prior, feature_log_prob.T.astype(np.float32))
+        return self._log_probs
+
+    # Predict -----------------------------------------------------------------------------------------
+
+    def predict_log_proba(self, tweets):
+        """ (tweets x classes) array of log probabilities """
+        class_log_prior, feature_log_prob = self._fitted()
+        jll = np.asarray(self.vectorizer.transform(tweets) @ feature_log_prob) + class_log_prior
+        return jll - logsumexp(jll, axis = 1, keepdims = True)
+
+    def predict_proba(self, tweets):
+        """ (tweets x classes) array of probabilities, columns in the order of self.classes """
+        return np.exp(self.predict_log_proba(tweets))
+
+    def predict(self, tweets):
+        """ Most probable label of each tweet """
+        return self.classes[np.argmax(self.predict_log_proba(tweets), axis = 1)]
+
+    def score(self, tweets, labels):
+        """ Accuracy on a batch of labeled tweets """
+        return float(np.mean(self.predict(tweets) == np.asarray(labels)))
+
+    # Persistence -------------------------------------------------------------------------------------
+
+    def save(self, path):
+        """ Saves the model to a compressed .npz file, only the non zero term counts are stored """
+        counts = sp.csr_matrix(self.feature_counts)
+        np.savez_compressed(
+            path,
+            classes = self.classes, class_counts = self.class_counts,
+            n_features = self.n_features, ngram_range = np.array(self.ngram_range), alpha = self.alpha,
+            data = counts.data.astype(np.float32), indices = counts.indices, indptr = counts.indptr
+        )
+
+    @classmethod
+    def load(cls, path):
+        """ Loads a model saved by save """
+        with np.load(path) as f:
+            model = cls(classes = f["classes"], n_features = int(f["n_features"]), ngram_range = tuple(f["ngram_range"]), alpha = float(f["alpha"]))
+            model.class_counts = f["class_counts"].astype(np.float64)
+            model.feature_counts = sp.csr_matrix(
+                (f["data"].astype(np.float64), f["indices"], f["indptr"]), shape = model.feature_counts.shape
+            ).toarray()
+        return model
+
+# --------------------------------------- Run Main File -----------------------------------------------
+
+if __name__ == "__main__":
+
+    parser = argparse.ArgumentParser(description = "Trains the Naive Bayes sentiment classifier on a labeled dataset (70 / 30 split)")
+    parser.add_argument("path", help = "labeled CSV file (tweet and sentiment_labels columns)")
+    parser.add_argument("--model", default = None, help = "file the trained model is saved to (.npz)")
+    parser.add_argument("--batch-size", type = int, default = 10000)
+    args = parser.parse_args()
+
+    df = load_labeled(args.path, columns = ["tweet", "sentiment_labels"]).dropna()
+    df = df.sample(frac = 1, random_state = 0)
+    n_train = int(0.7 * len(df))
+    train_df, test_df = df.iloc[:n_train], df.iloc[n_train:]
+
+    model = SentimentClassifier(classes = list(SENTIMENT_NAMES.keys()))
+    model.fit(
+        (train_df.tweet.iloc[i:i + args.batch_size], train_df.sentiment_labels.iloc[i:i + args.batch_size])
+        for i in range(0, len(train_df), args.batch_size)
+    )
+
+    yhat = model.predict(test_df.tweet)
+    correct_predictions = int((yhat == test_df.sentiment_labels.to_numpy()).sum())
+    print("correct predictions : {} / {} ({:.3f})".format(correct_predictions, len(test_df), correct_predictions / max(len(test_df), 1)))
+
+    if args.model is not None:
+        model.save(args.model)
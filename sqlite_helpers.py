@@ -0,0 +1,33 @@
+import sqlite3
+
+# SQLite helpers of the persistent indexes (harvest_checkpoint.py, geocode_cache.py)
+
+# SQLite limits the number of host parameters per statement
+MAX_PARAMS = 500
+
+def connect(path, *tables):
+    """
+    Opens a SQLite database shared by threads (its users serialize the access with a lock) and creates its tables
+    Inputs : path - database file
+             tables - CREATE TABLE IF NOT EXISTS statements
+    """
+    conn = sqlite3.connect(path, check_same_thread = False)
+    with conn:
+        for table in tables:
+            conn.execute(table)
+    return conn
+
+def select_in(conn, query, values, params = ()):
+    """
+    Runs a SELECT of the rows whose column is in values, in chunks of MAX_PARAMS values
+    Inputs : query - SELECT statement with an 'IN ({})' placeholder, e.g. 'SELECT id FROM tweet_ids WHERE id IN ({})'
+             values - values of the IN list
+             params - parameters of the query placed before the IN list
+    Outputs : list of rows
+    """
+    values = list(values)
+    rows = []
+    for i in range(0, len(values), MAX_PARAMS):
+        chunk = values[i:i + MAX_PARAMS]
+        rows.extend(conn.execute(query.format(','.join('?' * len(chunk))), list(params) + chunk).fetchall())
+    return rows
@@ -0,0 +1,94 @@
+import re
+import base64
+from io import BytesIO
+from collections import Counter
+
+import pandas as pd
+from wordcloud import WordCloud, STOPWORDS
+
+# Urls are dropped before counting, words are tokenized like WordCloud.process_text
+urlRegExp = re.compile(r"http\S+")
+wordRegExp = re.compile(r"\w[\w']*")
+
+def count_terms(tweets, stopwords = STOPWORDS):
+    """ Counter of the lowercased words of tweets : urls, trailing 's, numbers and stopwords removed """
+    text = urlRegExp.sub(" ", "\n".join(tweets)).lower()
+    words = (word[:-2] if word.endswith("'s") else word for word in wordRegExp.findall(text))
+    return Counter(word for word in words if (word not in stopwords) and not word.isdigit())
+
+# ---------------------------------------- Term Frequencies -----------------------------
+
+class TermFrequencies():
+    """
+    A class to keep word counts per (sentiment, language) of a growing set of tweets : update adds the counts of new tweets,
+    frequencies merges the counts of a sentiment and / or language. Each group has a version, incremented on update,
+    so results built from the counts (merged frequencies, word cloud images) are reused until the counts change
+    """
+    def __init__(self, stopwords = STOPWORDS):
+        self.stopwords = set(word.lower() for word in stopwords)
+        self.counts = {}
+        self.versions = Counter()
+        self._merged = {}
+
+    def update(self, tweets, sentiments, langs):
+        """ Adds the word counts of tweets (pd.Series / arrays of the same length) """
+        df = pd.DataFrame({"tweet" : list(tweets), "sentiment" : list(sentiments), "lang" : list(langs)}).dropna()
+        for (sentiment, lang), group in df.groupby(["sentiment", "lang"], sort = False):
+            key = (int(sentiment), str(lang))
+            self.counts.setdefault(key, Counter()).update(count_terms(group["tweet"], stopwords = self.stopwords))
+            self.versions[key] += 1
+        return self
+
+    @classmethod
+    def from_frame(cls, df, text_col = "tweet", sentiment_col = "sentiment_labels", lang_col = "lang", **kwargs):
+        return cls(**kwargs).update(df[text_col], df[sentiment_col], df[lang_col])
+
+    def _keys(self, sentiment = None, lang = None):
+        return [
+            key for key in self.counts
+            if ((sentiment is None) or (key[0] == sentiment)) and ((lang is None) or (key[1] == lang))
+        ]
+
+    def state(self, sentiment = None, lang = None):
+        """ Versions of the groups of a sentiment / language, changes whenever their counts change """
+        return tuple(sorted((key, self.versions[key]) for key in self._keys(sentiment, lang)))
+
+    def frequencies(self, sentiment = None, lang = None):
+        """ Counter of the words of a sentiment and / or a language (None for all), cached until the counts change """
+        state = self.state(sentiment, lang)
+        cached = self._merged.get((sentiment, lang))
+        if (cached is None) or (cached[0] != state):
+            merged = Counter()
+            for key in self._keys(sentiment, lang):
+                merged.update(self.counts[key])
+            cached = (state, merged)
+            self._merged[(sentiment, lang)] = cached
+        return cached[1]
+
+# ---------------------------------------- Word Cloud Images ----------------------------
+
+class WordCloudImages():
+    """
+    A class to render word clouds of TermFrequencies as base64 PNG sources (for an html.Img), an image is rendered
+    once per (sentiment, language) and served from the cache until the counts of that sentiment / language change
+    """
+    def __init__(self, terms, max_words = 5000, **wordcloud_kwargs):
+        self.terms = terms
+        self.max_words = max_words
+        self.wordcloud_kwargs = wordcloud_kwargs
+        self._images = {}
+
+    def src(self, sentiment = None, lang = None):
+        """ 'data:image/png;base64,...' word cloud of a sentiment and / or language """
+        state = self.terms.state(sentiment, lang)
+        cached = self._images.get((sentiment, lang))
+        if (cached is None) or (cached[0] != state):
+            frequencies = dict(self.terms.frequencies(sentiment, lang).most_common(self.max_words))
+            img = BytesIO()
+            if len(frequencies) > 0:
+                wordcloud = WordCloud(max_words = self.max_words, **self.wordcloud_kwargs)
+                wordcloud.generate_from_frequencies(frequencies)
+                wordcloud.to_image().save(img, format = 'PNG')
+            cached = (state, 'data:image/png;base64,{}'.format(base64.b64encode(img.getvalue()).decode()))
+            self._images[(sentiment, lang)] = cached
+        return cached[1]
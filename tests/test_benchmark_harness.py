@@ -0,0 +1,18 @@
+import os
+
+from benchmark_harness import run_isolated
+
+def _square(x):
+    return x * x
+
+def _raise():
+    raise ValueError("bad case")
+
+def _die():
+    # Killed without a result, e.g. by the out of memory killer
+    os._exit(9)
+
+def test_run_isolated():
+    assert run_isolated(_square, 7, poll = 0.1) == (49, None)
+    assert run_isolated(_raise, poll = 0.1) == (None, "ValueError('bad case')")
+    assert run_isolated(_die, poll = 0.1) == (None, "process exited with code 9")
@@ -0,0 +1,44 @@
+import numpy as np
+import pandas as pd
+
+from data_loader import load_labeled, name_categories, LANG_NAMES, SENTIMENT_NAMES
+
+def _labeled_csv(path):
+    pd.DataFrame({
+        "id" : [1220000000000000001, 1220000000000000002, 1220000000000000003, 1220000000000000004],
+        "created_at" : ["2020-01-12 10:00:00", "2020-01-12 11:30:00", "2020-01-13 08:15:00", "2020-01-13 09:00:00"],
+        "tweet" : ["Taal ash", "ligtas kami", "pray for Batangas", "lava"],
+        "lang" : ["en", "tl", "en", "xx"],
+        "lat" : [14.1, 14.2, None, 13.9],
+        "lon" : [121.0, 120.9, None, 121.1],
+        "username" : ["a", "b", "c", "d"],
+        "sentiment_labels" : [-1, 1, 1, 0],
+        "ash_labels" : [1, 0, 0, None],
+    }).to_csv(path, index = False)
+
+def test_load_labeled(tmp_path):
+    path = str(tmp_path / "Taal_labeled.csv")
+    _labeled_csv(path)
+
+    df = load_labeled(path, columns = ["id", "created_at", "tweet", "lang", "lat", "lon", "sentiment_labels", "ash_labels"])
+    assert "username" not in df.columns
+    assert df["id"].dtype == np.int64
+    assert df["created_at"].iloc[1] == pd.Timestamp("2020-01-12 11:30:00")
+    assert (df["lat"].dtype, df["lon"].dtype) == (np.float32, np.float32)
+    assert isinstance(df["lang"].dtype, pd.CategoricalDtype)
+    # Labels without missing values are narrowed to int8, nullable Int8 otherwise
+    assert df["sentiment_labels"].dtype == np.int8
+    assert df["ash_labels"].dtype == "Int8"
+
+    # Rows with a missing value dropped, language codes named (unknown codes kept)
+    named = load_labeled(path, columns = ["tweet", "lang", "lat", "lon", "ash_labels"], lang_names = LANG_NAMES, dropna = True)
+    assert list(named["tweet"]) == ["Taal ash", "ligtas kami"]
+    assert list(named["lang"]) == ["english", "taglog"]
+    assert list(load_labeled(path, columns = ["lang"], lang_names = LANG_NAMES)["lang"]) == ["english", "taglog", "english", "xx"]
+
+def test_name_categories():
+    labels = pd.Series([1, -1, 0, 1, 2], dtype = np.int8)
+    named = name_categories(labels, SENTIMENT_NAMES)
+    assert list(named) == ["positive", "negative", "neutral", "positive", 2]
+    assert isinstance(named.dtype, pd.CategoricalDtype)
+    assert len(named.cat.categories) == 4
@@ -0,0 +1,21 @@
+import numpy as np
+import pandas as pd
+
+from feature_cache import FeatureCache
+
+def test_lookup_reads_only_requested_ids(tmp_path):
+    cache = FeatureCache(str(tmp_path))
+    ids = np.arange(1000, dtype = np.int64) + 10 ** 18
+    hashes = np.arange(1000, dtype = np.uint64)
+    for i in range(0, 1000, 250):
+        cache.store('entities', 1, ids[i:i + 250], hashes[i:i + 250], pd.DataFrame({'n' : np.arange(i, i + 250)}), 'Taal2020')
+    # Tweet 10 re-stored with a new text : the last row wins
+    cache.store('entities', 1, ids[10:11], np.array([99999], dtype = np.uint64), pd.DataFrame({'n' : [-1]}), 'Taal2020')
+
+    query = np.array([ids[10], ids[500], ids[999], ids[0] - 1])
+    hit, features = cache.lookup('entities', 1, query, np.array([99999, 500, 7, 0], dtype = np.uint64), 'Taal2020')
+    assert hit.tolist() == [True, True, False, False]
+    assert features['n'].tolist() == [-1, 500]
+
+    hit, features = cache.lookup('entities', 2, query, np.array([99999, 500, 7, 0], dtype = np.uint64), 'Taal2020')
+    assert not hit.any()
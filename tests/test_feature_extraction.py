@@ -0,0 +1,145 @@
+import string
+import warnings
+
+import pytest
+import numpy as np
+import pandas as pd
+import pyarrow.parquet as pq
+import emoji
+from emosent import EMOJI_SENTIMENT_DICT, get_emoji_sentiment_rank
+from spacy.lang.en import English
+from spacy.lang.en.stop_words import STOP_WORDS
+from spacy.tokenizer import Tokenizer
+
+from hazard_sites import HazardCatalog
+from feature_extraction import extract_features_file, count_entities, extract_tokens, regExpDict, text_features, emoji_matcher
+
+def test_first_chunk_without_coordinates(tmp_path):
+    n = 40
+    df = pd.DataFrame({
+        "tweet" : ["taal volcano ash #Taal @phivolcs https://t.co/x 😭"] * n,
+        # First chunk (20 rows) has no coordinates, so no nearest site
+        "lat" : np.where(np.arange(n) < 20, np.nan, 14.0),
+        "lon" : np.where(np.arange(n) < 20, np.nan, 121.0),
+    })
+    input_path, output_path = str(tmp_path / "tweets.parquet"), str(tmp_path / "features.parquet")
+    df.to_parquet(input_path, index = False)
+
+    n_rows = extract_features_file(input_path, output_path, chunksize = 20, n_workers = 1, catalog = HazardCatalog())
+
+    features = pq.read_table(output_path).to_pandas()
+    assert n_rows == n == len(features)
+    assert features["nearest_site"].iloc[:20].isna().all()
+    assert (features["nearest_site"].iloc[20:] == "taal").all()
+
+@pytest.mark.parametrize("ext", ["csv", "parquet"])
+def test_column_empty_in_first_chunk(tmp_path, ext):
+    n = 40
+    df = pd.DataFrame({
+        "id" : np.arange(n),
+        "tweet" : ["taal volcano ash #Taal"] * n,
+        # Pass-through column with no value in the first chunk (20 rows)
+        "user_location" : [None] * 20 + ["Manila"] * 20,
+        "lat" : 14.0,
+        "lon" : 121.0,
+    })
+    input_path, output_path = str(tmp_path / ("tweets." + ext)), str(tmp_path / "features.parquet")
+    if ext == "csv":
+        df.to_csv(input_path, index = False)
+    else:
+        df.to_parquet(input_path, index = False)
+
+    n_rows = extract_features_file(input_path, output_path, chunksize = 20, n_workers = 1)
+
+    features = pq.read_table(output_path).to_pandas()
+    assert n_rows == n == len(features)
+    assert features["user_location"].iloc[:20].isna().all()
+    assert (features["user_location"].iloc[20:] == "Manila").all()
+    assert (features["id"] == df["id"]).all()
+
+def test_count_entities_matches_extract_tokens():
+    tweets = pd.Series([
+        "Ash fall in #Batangas @phivolcs_dost https://t.co/abc123",
+        "#火山 噴火 @田中さん http://example.com/päth?q=1&x=2",
+        "Dasal para sa #Taal #BulkangTaal! @josé_rizal, @Ñoño https://t.co/X-y_z",
+        "#ŞanlıUrfa #١٢٣ #Ⅻ #x² #तालाब @नमस्ते",
+        "#Καλημέρα @Владимир #_ #日本語テスト🙏 email a@b.com",
+        "@@double ##double https://https://t.co/a #a#b @a@b",
+        "no entities here 🌋😭",
+        "",
+    ])
+    counts = count_entities(tweets)
+    for k, v in regExpDict.items():
+        expected = tweets.apply(lambda tweet: extract_tokens(tweet, v)).to_numpy()
+        assert (counts[k] == expected).all(), k
+
+def test_text_features_match_per_row_features():
+    tweets = pd.Series([
+        "Ash fall in #Batangas, we are safe! https://t.co/abc",
+        "The THE the  double  spaces and   more",
+        "line one\nline two\tTabbed",
+        " leading and trailing ",
+        "Tulong! Ang mga tao sa Batangas... 🙏🙏",
+        "火山 噴火 です",
+        "I'm sure it's not what we've done",
+        "",
+        "   ",
+    ])
+    # Per row features as feature_extraction computed them before text_features
+    tokenizer = Tokenizer(English().vocab)
+    with warnings.catch_warnings():
+        # Mean of no words
+        warnings.simplefilter("ignore", RuntimeWarning)
+        expected = pd.DataFrame({
+            "word_count" : tweets.apply(lambda x: len(tokenizer(x))),
+            "unique_word_count" : tweets.apply(lambda x: len(set([word.text.lower() for word in tokenizer(x)]))),
+            "char_count" : tweets.apply(lambda x: len(x)),
+            "stop_word_count" : tweets.apply(lambda x: len([word for word in map(lambda x: x.text.lower(), tokenizer(x)) if word in STOP_WORDS])),
+            "mean_word_length" : tweets.apply(lambda x: np.mean([len(w) for w in x.split()])),
+            "punctuation_count" : tweets.apply(lambda x: len([char for char in x if char in string.punctuation])),
+        })
+
+    features = text_features(tweets)
+    assert list(features.columns) == list(expected.columns)
+    for column in expected:
+        assert np.allclose(features[column].astype(float), expected[column].astype(float), equal_nan = True), column
+
+def _emoticons_per_row(tweet):
+    """ Emoji count and score as feature_extraction computed them before EmojiMatcher (unranked emojis score 0) """
+    emoticons = [c for c in tweet if c in emoji.UNICODE_EMOJI["en"]]
+    scores = []
+    for emoticon in emoticons:
+        try:
+            scores.append(get_emoji_sentiment_rank(emoticon)["sentiment_score"])
+        except (KeyError, TypeError):
+            scores.append(0)
+    return len(emoticons), sum(scores) / len(scores) if len(scores) > 0 else 0
+
+def test_emoji_count_and_score():
+    matcher = emoji_matcher()
+
+    # Single codepoint emojis ranked by emosent : same counts and scores as the per row scan
+    ranked = [e for e in EMOJI_SENTIMENT_DICT if (len(e) == 1) and (e in emoji.UNICODE_EMOJI["en"])]
+    rng = np.random.default_rng(0)
+    tweets = ["Taal " + " ".join(rng.choice(ranked, size = n)) + " ash" for n in rng.integers(0, 5, 200)] + ["", "no emoji"]
+    counts, scores = matcher.count_and_score(tweets)
+    expected = [_emoticons_per_row(tweet) for tweet in tweets]
+    assert (counts == [c for c, _ in expected]).all()
+    assert np.allclose(scores, [s for _, s in expected])
+
+    # Multi codepoint emojis count as one emoji : skin tones score as their base emoji, ZWJ sequences and flags
+    # emosent does not rank score 0, like unranked emojis
+    thumbs = EMOJI_SENTIMENT_DICT["👍"]["sentiment_score"]
+    cases = {
+        "👍🏽 ok" : (1, thumbs),
+        "🙏🏻" : (1, EMOJI_SENTIMENT_DICT["🙏"]["sentiment_score"]),
+        "👨\u200d👩\u200d👧" : (1, 0.0),
+        "🇵🇭" : (1, 0.0),
+        "🫠" : (1, 0.0),
+        "👍🏽🇵🇭" : (2, thumbs / 2),
+    }
+    assert "🫠" not in EMOJI_SENTIMENT_DICT
+    counts, scores = matcher.count_and_score(list(cases))
+    assert list(counts) == [c for c, _ in cases.values()]
+    assert np.allclose(scores, [s for _, s in cases.values()])
+    assert matcher.findall("👨\u200d👩\u200d👧 and 🇵🇭") == ["👨\u200d👩\u200d👧", "🇵🇭"]
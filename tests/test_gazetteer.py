@@ -0,0 +1,48 @@
+import numpy as np
+import pandas as pd
+
+from gazetteer import Gazetteer, EXACT, PART, FUZZY
+from lat_lon_extractor import Lat_Lon_Extractor
+
+# geonameid, name, asciiname, alternatenames, lat, lon, feature class, country, population
+PLACES = [
+    (1701668, "Manila", "Manila", "Maynila,Lungsod ng Maynila", 14.6042, 120.9822, "P", "PH", 1600000),
+    (1694781, "Parañaque City", "Paranaque City", "Paranaque", 14.4793, 121.0198, "P", "PH", 665822),
+    (1726280, "Batangas City", "Batangas City", "Batangas", 13.7565, 121.0583, "P", "PH", 305607),
+    (1689431, "San Jose", "San Jose", "", 12.3528, 121.0676, "P", "PH", 140000),
+    (1689395, "San Jose", "San Jose", "", 15.7922, 120.9908, "P", "PH", 40000),
+    (1682295, "Taal Volcano", "Taal Volcano", "Bulkang Taal", 14.0021, 120.9930, "T", "PH", 0),
+    (5392171, "San Jose", "San Jose", "", 37.3394, -121.8950, "P", "US", 1030000),
+]
+
+def _dump(path):
+    with open(path, "w", encoding = "utf-8") as f:
+        for gid, name, ascii_name, alternate, lat, lon, fclass, country, population in PLACES:
+            row = [gid, name, ascii_name, alternate, lat, lon, fclass, "PPL", country, "", "", "", "", "", population, "", 10, "Asia/Manila", "2020-01-01"]
+            f.write("\t".join(map(str, row)) + "\n")
+
+def test_lookup(tmp_path):
+    _dump(tmp_path / "PH.txt")
+    gazetteer = Gazetteer.from_geonames(str(tmp_path / "PH.txt"), countries = ["PH"])
+    # Feature class T (mountains) and other countries are not loaded
+    assert gazetteer.geocode("Taal Volcano") is None
+    assert gazetteer.match("San Jose")[0] is not None
+
+    manila = gazetteer.geocode("  MAYNILA!! ")
+    assert (manila.name, manila.geonameid, manila.confidence) == ("Manila", 1701668, EXACT)
+    assert gazetteer.geocode("Paranaque").name == "Parañaque City"
+    assert gazetteer.geocode("Brgy. 5, Batangas").confidence == PART
+    assert gazetteer.geocode("Batanga").name == "Batangas City"
+    assert gazetteer.geocode("Manilla").confidence == FUZZY
+    # Homonyms : the most populated place of the kept countries
+    assert gazetteer.geocode("San Jose").geonameid == 1689431
+    assert gazetteer.geocode("Atlantis") is None
+
+    found = gazetteer.geocode_batch(pd.Series(["manila", "Atlantis", None, "manila"], index = [10, 11, 12, 13]))
+    assert list(found.index) == [10, 11, 12, 13]
+    assert np.allclose(found["lat"], [14.6042, np.nan, np.nan, 14.6042], equal_nan = True)
+    assert list(found["geonameid"]) == [1701668, -1, -1, 1701668]
+
+    # Replaces the web geocoder of Lat_Lon_Extractor, without a rate limit
+    df = Lat_Lon_Extractor(pd.DataFrame({"loc" : ["Manila 🇵🇭", "Batangas City", "Atlantis"]}), "loc", geocoder = gazetteer, n_workers = 4)
+    assert np.allclose(df["lon"], [120.9822, 121.0583, np.nan], equal_nan = True)
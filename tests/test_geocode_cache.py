@@ -0,0 +1,72 @@
+import time
+
+import numpy as np
+import pandas as pd
+import pytest
+
+from fake_geocoder import FakeGeocoder
+from geocode_cache import GeocodeCache
+from lat_lon_extractor import Lat_Lon_Extractor, normalize_addresses
+
+def test_normalize_addresses():
+    addresses = pd.Series(["  Manila, PH 🌋", "MANILA,  ph", "Parañaque!!", "🌋🌋", None])
+    normalized = normalize_addresses(addresses)
+    assert normalized[0] == normalized[1] == "manila, ph"
+    assert normalized[2] == "parañaque"
+    assert normalized[3:].isna().all()
+
+def test_negative_results_expire(tmp_path):
+    cache = GeocodeCache(str(tmp_path / "geocodes.db"), negative_ttl = 0.5)
+    geocoder = FakeGeocoder({"manila" : (14.6, 121.0)})
+    df = pd.DataFrame({"loc" : ["Manila", "Atlantis", "manila"]})
+
+    out = Lat_Lon_Extractor(df, "loc", cache = cache, geocoder = geocoder)
+    assert geocoder.calls["geocode"] == 2
+    assert np.allclose(out["lat"], [14.6, np.nan, 14.6], equal_nan = True)
+
+    # Both results are cached, the negative one until negative_ttl
+    Lat_Lon_Extractor(df, "loc", cache = cache, geocoder = geocoder)
+    assert geocoder.calls["geocode"] == 2
+    time.sleep(0.6)
+    Lat_Lon_Extractor(df, "loc", cache = cache, geocoder = geocoder)
+    assert geocoder.calls["geocode"] == 3
+
+def test_results_cached_per_geocoder(tmp_path):
+    cache = GeocodeCache(str(tmp_path / "geocodes.db"))
+    df = pd.DataFrame({"loc" : ["Manila"]})
+
+    Lat_Lon_Extractor(df, "loc", cache = cache, geocoder = FakeGeocoder({"manila" : (1.0, 1.0)}), namespace = "first")
+    other = FakeGeocoder({"manila" : (2.0, 2.0)})
+    out = Lat_Lon_Extractor(df, "loc", cache = cache, geocoder = other, namespace = "second")
+    assert out["lat"][0] == 2.0
+    assert other.calls["geocode"] == 1
+
+    # Without a namespace the geocoder class name is the key
+    assert cache.get_many(["manila"], geocoder = "first") == {"manila" : (1.0, 1.0)}
+    assert cache.get_many(["manila"], geocoder = "FakeGeocoder") == {}
+
+class _Interrupted(FakeGeocoder):
+    """ Fails (not a timeout, so not retried) from the call after max_calls """
+    def __init__(self, places, max_calls):
+        super().__init__(places)
+        self.max_calls = max_calls
+
+    def geocode(self, query, timeout = None):
+        if self.calls["geocode"] >= self.max_calls:
+            raise RuntimeError("interrupted")
+        return super().geocode(query, timeout = timeout)
+
+def test_interrupted_run_keeps_flushed_results(tmp_path):
+    cache = GeocodeCache(str(tmp_path / "geocodes.db"))
+    places = {"town{}".format(i) : (i / 10, 0.0) for i in range(250)}
+    df = pd.DataFrame({"loc" : list(places)})
+
+    with pytest.raises(RuntimeError):
+        Lat_Lon_Extractor(df, "loc", cache = cache, geocoder = _Interrupted(places, 230), namespace = "fake")
+    # Results are flushed every 100 addresses
+    assert len(cache) == 200
+
+    geocoder = FakeGeocoder(places)
+    out = Lat_Lon_Extractor(df, "loc", cache = cache, geocoder = geocoder, namespace = "fake")
+    assert geocoder.calls["geocode"] == 50
+    assert np.allclose(out["lat"], np.arange(250) / 10)
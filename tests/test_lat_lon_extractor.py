@@ -0,0 +1,21 @@
+import time
+
+import numpy as np
+import pandas as pd
+
+from fake_geocoder import FakeGeocoder
+from lat_lon_extractor import Lat_Lon_Extractor
+
+def test_concurrent_geocoding_ordered_and_rate_limited():
+    places = {"city{}".format(i) : (float(i), -float(i)) for i in range(10)}
+    df = pd.DataFrame({"loc" : ["City{}".format(i % 12) for i in range(30)]})
+
+    # No limiter given : the provider rate of the geocoder (5 requests per second) applies to the 8 threads
+    geocoder = FakeGeocoder(places, latency = 0.01, rate_limit = 5)
+    start = time.monotonic()
+    out = Lat_Lon_Extractor(df, "loc", geocoder = geocoder, n_workers = 8)
+    assert time.monotonic() - start >= (12 - 1) / 5
+
+    expected = [places.get("city{}".format(i % 12), (np.nan, np.nan))[0] for i in range(30)]
+    assert np.allclose(out["lat"].to_numpy(), expected, equal_nan = True)
+    assert geocoder.calls["geocode"] == 12
@@ -0,0 +1,50 @@
+import time
+import random
+from datetime import datetime, timedelta, timezone
+
+from response_cache import ResponseCache
+
+def _page(seed):
+    rng = random.Random(seed)
+    return {'tweets' : ['{:032x}'.format(rng.getrandbits(128)) for _ in range(50)], 'next' : None}
+
+def test_ttl_of_live_recent_and_closed_windows(tmp_path):
+    cache = ResponseCache(str(tmp_path / 'pages.db'), live_ttl = 60, recent_ttl = 3600, settle = timedelta(days = 1))
+    now = datetime.now(timezone.utc).replace(tzinfo = None)
+    assert cache.ttl((now + timedelta(hours = 1)).strftime('%Y%m%d%H%M')) == 60
+    assert cache.ttl(None) == 60
+    assert cache.ttl((now - timedelta(hours = 2)).strftime('%Y%m%d%H%M')) == 3600
+    assert cache.ttl((now - timedelta(days = 3)).strftime('%Y%m%d%H%M')) is None
+
+    # Expired entries are misses
+    key = cache.key('search_30_day', query = 'Taal', toDate = '202001200000')
+    cache.put(key, _page(0), ttl = 0.2)
+    assert cache.get(key) == _page(0)
+    time.sleep(0.3)
+    assert cache.get(key) is None
+
+def test_lru_eviction_and_stats(tmp_path):
+    cache = ResponseCache(str(tmp_path / 'pages.db'))
+    # Queries are case and whitespace insensitive, None parameters dropped
+    assert cache.key('search_30_day', query = ' Taal  LANG:en', next = None) == cache.key('search_30_day', query = 'taal lang:en')
+
+    cache.put('a', _page(1))
+    size = cache.stats()['bytes']
+    cache.max_bytes = int(2.5 * size)
+    cache.put('b', _page(2))
+    time.sleep(0.01)
+    # a is used more recently than b, b is evicted when c does not fit
+    assert cache.get('a') == _page(1)
+    cache.put('c', _page(3))
+
+    assert cache.get('b') is None
+    assert cache.get('c') == _page(3)
+    stats = cache.stats()
+    assert stats['entries'] == 2
+    assert stats['evictions'] == 1
+    assert (stats['hits'], stats['misses']) == (2, 1)
+    assert stats['hit_rate'] == 2 / 3
+    assert stats['bytes'] <= cache.max_bytes
+
+    # Sizes are recovered when the cache is reopened
+    assert ResponseCache(str(tmp_path / 'pages.db')).stats()['bytes'] == stats['bytes']
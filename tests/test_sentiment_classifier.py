@@ -0,0 +1,53 @@
+import numpy as np
+import pytest
+from sklearn.naive_bayes import MultinomialNB
+
+from sentiment_classifier import SentimentClassifier
+
+WORDS = {
+    -1 : ["lava", "evacuate", "scared", "damage", "help"],
+    0 : ["update", "alert", "level", "phivolcs", "report"],
+    1 : ["safe", "thank", "pray", "blessed", "okay"],
+}
+
+def _labeled(n, seed = 0):
+    rng = np.random.default_rng(seed)
+    labels = rng.choice([-1, 0, 1], size = n)
+    # Mostly words of the tweet's label, some of the others
+    tweets = [
+        " ".join(rng.choice(WORDS[label] if rng.random() < 0.8 else WORDS[rng.choice([-1, 0, 1])], size = 6)) + " Taal"
+        for label in labels
+    ]
+    return tweets, labels
+
+def test_matches_multinomial_nb():
+    tweets, labels = _labeled(600)
+    model = SentimentClassifier(n_features = 2 ** 12)
+    model.fit([(tweets[:250], labels[:250]), (tweets[250:], labels[250:])])
+
+    X = model.vectorizer.transform(tweets)
+    reference = MultinomialNB(alpha = 1.0).fit(X, labels)
+
+    test_tweets, test_labels = _labeled(200, seed = 1)
+    assert list(reference.classes_) == list(model.classes)
+    assert np.allclose(model.predict_log_proba(test_tweets), reference.predict_log_proba(model.vectorizer.transform(test_tweets)), atol = 1e-4)
+    assert (model.predict(test_tweets) == reference.predict(model.vectorizer.transform(test_tweets))).all()
+    assert model.score(test_tweets, test_labels) > 0.8
+
+    with pytest.raises(ValueError):
+        model.partial_fit(["lava"], [2])
+
+def test_save_load_round_trip(tmp_path):
+    tweets, labels = _labeled(300)
+    model = SentimentClassifier(n_features = 2 ** 12, ngram_range = (1, 2), alpha = 0.5).partial_fit(tweets, labels)
+    path = str(tmp_path / "sentiment_nb.npz")
+    model.save(path)
+
+    loaded = SentimentClassifier.load(path)
+    assert (loaded.ngram_range, loaded.alpha, loaded.n_features) == ((1, 2), 0.5, 2 ** 12)
+    test_tweets, _ = _labeled(100, seed = 2)
+    assert np.allclose(loaded.predict_proba(test_tweets), model.predict_proba(test_tweets), atol = 1e-6)
+
+    # Training continues from the loaded counts
+    more, more_labels = _labeled(100, seed = 3)
+    assert np.allclose(loaded.partial_fit(more, more_labels).predict_proba(test_tweets), model.partial_fit(more, more_labels).predict_proba(test_tweets), atol = 1e-6)
@@ -0,0 +1,22 @@
+from term_frequencies import TermFrequencies, WordCloudImages, count_terms
+
+def test_count_terms():
+    counts = count_terms(["Taal's ash https://t.co/x, the ASH 2020", "ash fall"])
+    assert counts == {"taal" : 1, "ash" : 3, "fall" : 1}
+
+def test_version_bump_invalidates_images():
+    terms = TermFrequencies().update(["ash fall", "lava flow", "pray safe"], [-1, -1, 1], ["en", "tl", "en"])
+    images = WordCloudImages(terms, width = 120, height = 60)
+
+    negative, positive = images.src(sentiment = -1), images.src(sentiment = 1)
+    assert negative.startswith("data:image/png;base64,")
+    # Served from the cache while the counts do not change
+    assert images.src(sentiment = -1) is negative
+    assert terms.frequencies(sentiment = -1) == {"ash" : 1, "fall" : 1, "lava" : 1, "flow" : 1}
+
+    # New negative tweets bump the version of the negative groups only
+    terms.update(["ash ash ash"], [-1], ["en"])
+    assert terms.frequencies(sentiment = -1)["ash"] == 4
+    assert terms.frequencies(lang = "en") == {"ash" : 4, "fall" : 1, "pray" : 1, "safe" : 1}
+    assert images.src(sentiment = -1) is not negative
+    assert images.src(sentiment = 1) is positive
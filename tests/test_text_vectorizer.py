@@ -0,0 +1,38 @@
+import numpy as np
+import pytest
+from sklearn.feature_extraction.text import TfidfVectorizer
+
+from text_vectorizer import TweetVectorizer, clean_tweets
+
+BATCHES = [
+    ["Taal volcano eruption @phivolcs #Taal https://t.co/abc", "Ash fall in Batangas, stay safe"],
+    ["Pray for Batangas #PrayForTaal", "volcano ash ash ash", None],
+]
+
+def test_vocabulary_frozen_at_first_transform():
+    v = TweetVectorizer(hashed = False, min_df = 2).fit(BATCHES)
+    X = v.transform(["volcano ash lava"])
+    # Terms of a single document are dropped, mentions / hashtags / urls are stripped before counting
+    assert sorted(v.vocabulary) == ["ash", "batangas", "volcano"]
+    assert X.shape == (1, 3)
+    assert X.sum() == 2
+
+    with pytest.raises(ValueError):
+        v.partial_fit(["new lava words"])
+    assert v.transform(["lava lava"]).nnz == 0
+
+def test_tfidf_rows_l2_normalised():
+    v = TweetVectorizer(hashed = False, tfidf = True, stop_words = None).fit(BATCHES)
+    tweets = [t for batch in BATCHES for t in batch]
+    X = v.transform(tweets)
+
+    norms = np.sqrt(np.asarray(X.multiply(X).sum(axis = 1))).ravel()
+    assert np.allclose(norms, [1, 1, 1, 1, 0])
+
+    # Same weights as sklearn's TfidfVectorizer (smoothed idf, l2 norm) fit on the whole corpus at once
+    reference = TfidfVectorizer(vocabulary = v.vocabulary, dtype = np.float32).fit(clean_tweets(tweets))
+    assert np.allclose(X.toarray(), reference.transform(clean_tweets(tweets)).toarray(), atol = 1e-6)
+
+    # Hashed columns are weighted the same way
+    H = TweetVectorizer(hashed = True, n_features = 2 ** 10, tfidf = True).fit(BATCHES).transform(tweets)
+    assert np.allclose(np.sqrt(np.asarray(H.multiply(H).sum(axis = 1))).ravel(), [1, 1, 1, 1, 0])
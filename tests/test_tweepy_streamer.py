@@ -0,0 +1,65 @@
+import gc
+import tweepy as tw
+
+from twitter_replay import ReplayAPI, synthetic_tweets
+from tweet_schema import flatten_tweets
+from segment_writer import SegmentWriter, read_segments
+from harvest_checkpoint import HarvestCheckpoint
+from tweepy_streamer import GetTweets
+
+def test_write_to_segments_appends_new_rows_only(tmp_path):
+    inst = GetTweets(api = ReplayAPI([]), data_dir = str(tmp_path))
+    inst.df_live_tweets = flatten_tweets(synthetic_tweets(500, '202001120000', '202001130000', seed = 1))
+    more = flatten_tweets(synthetic_tweets(300, '202001130000', '202001140000', seed = 2))
+
+    with SegmentWriter(str(tmp_path / 'segments')) as writer:
+        inst.write_to_segments(writer)
+        inst.write_to_segments(writer)
+    df = read_segments(str(tmp_path / 'segments'))
+    assert len(df) == 500
+    assert df.index.is_unique
+
+    # A new stream replaces the result, its rows are appended once
+    inst.df_live_tweets = more
+    with SegmentWriter(str(tmp_path / 'segments')) as writer:
+        inst.write_to_segments(writer)
+        inst.write_to_segments(writer)
+    assert len(read_segments(str(tmp_path / 'segments'))) == 800
+
+def test_live_tweets_resume_after_cap(tmp_path):
+    api = ReplayAPI(synthetic_tweets(250, '202001120000', '202001130000', seed = 3))
+    query = 'Taal -filter:retweets'
+    expected = {tweet['id'] for tweet in api.tweets if api._matches(tweet, query)}
+    checkpoint = HarvestCheckpoint(str(tmp_path / 'checkpoint.db'))
+    inst = GetTweets(api = api, data_dir = str(tmp_path), checkpoint = checkpoint)
+
+    # Runs capped below the number of matching tweets, each resumes where the previous one stopped
+    ids = []
+    for _ in range(10):
+        df = inst.stream_live_tweets('Taal', 60)
+        ids.extend(df.index)
+    assert len(ids) == len(set(ids))
+    assert set(ids) == expected
+    assert checkpoint.since_id(query) == max(expected)
+    assert checkpoint.resume_point(query) == (None, None)
+
+    # Newer tweets only once the gap is closed
+    assert len(inst.stream_live_tweets('Taal', 60)) == 0
+
+def _live_statuses():
+    gc.collect()
+    return sum(isinstance(obj, tw.models.Status) for obj in gc.get_objects())
+
+def test_live_tweets_hold_one_page(tmp_path):
+    api = ReplayAPI(synthetic_tweets(5000, '202001120000', '202001130000', seed = 4))
+    inst = GetTweets(api = api, data_dir = str(tmp_path))
+    before = _live_statuses()
+
+    n_rows = 0
+    for i, batch in enumerate(inst.iter_live_tweets('Taal', 3000, batch_size = 10)):
+        n_rows += len(batch)
+        # At most the current page (100 tweets) and the tweets of the batch being filled
+        if i % 10 == 0:
+            assert _live_statuses() - before <= 100 + 10
+    assert n_rows == 3000
+    assert api.calls['search'] == 30
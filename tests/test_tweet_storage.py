@@ -0,0 +1,47 @@
+from twitter_replay import ReplayAPI, synthetic_tweets
+from tweet_schema import flatten_tweets
+from tweet_storage import TweetStore
+from harvest_checkpoint import HarvestCheckpoint, TweetIdIndex
+from tweepy_streamer import GetTweets
+
+def test_mixed_null_batches_read_back(tmp_path):
+    store = TweetStore(str(tmp_path))
+    # No geotagged tweets : place.* columns are all null in the first batch
+    no_geo = flatten_tweets(synthetic_tweets(200, '202001120000', '202001130000', geo_rate = 0, seed = 1))
+    geo = flatten_tweets(synthetic_tweets(200, '202001120000', '202001130000', geo_rate = 0.5, seed = 2))
+    assert no_geo['place.place_type'].isna().all()
+    store.write(no_geo, 'Taal2020')
+    store.write(geo, 'Taal2020')
+
+    df = store.read()
+    assert len(df) == len(set(no_geo.index) | set(geo.index))
+    assert (df['place.place_type'].dropna() == 'city').all()
+    assert df['place.place_type'].notna().sum() == geo['place.place_type'].notna().sum()
+
+    en = store.read(columns = ['place.country_code'], lang = 'en')
+    assert len(en) == (no_geo['lang'] == 'en').sum() + (geo['lang'] == 'en').sum()
+
+def test_batch_replayed_after_crash_read_once(tmp_path):
+    api = ReplayAPI(synthetic_tweets(1000, '202001120000', '202001130000', seed = 3))
+    checkpoint = HarvestCheckpoint(str(tmp_path / 'checkpoint.db'))
+    id_index = TweetIdIndex(str(tmp_path / 'ids.db'))
+
+    def harvest(crash_after = None):
+        inst = GetTweets(api = api, data_dir = str(tmp_path), checkpoint = checkpoint, id_index = id_index)
+        batches = inst.iter_past30_tweets(keyword = 'Taal', search_from = '202001120000', search_to = '202001130000', pg = 20, batch_size = 100)
+        for i, df in enumerate(batches):
+            inst.store.write(df, 'Taal2020')
+            if i == crash_after:
+                # Stops after writing the batch, before the next batch commits it
+                break
+        return inst
+
+    harvest(crash_after = 2)
+    inst = harvest()
+
+    stored = inst.store.dataset().to_table(columns = ['id']).column('id').to_pylist()
+    # The third batch is written twice
+    assert len(stored) == 1000 + 100
+    df = inst.read_store()
+    assert df.index.is_unique
+    assert set(df.index) == {tweet['id'] for tweet in api.tweets}
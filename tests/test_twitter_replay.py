@@ -0,0 +1,21 @@
+from twitter_replay import ReplayAPI, synthetic_tweets
+
+def test_premium_pages_cover_the_window_once():
+    api = ReplayAPI(synthetic_tweets(1000, '202001120000', '202001140000', seed = 5))
+    query, search_from, search_to = 'Taal lang:en', '202001121200', '202001131200'
+    expected = [
+        tweet['id'] for tweet in api.tweets
+        if (search_from <= api._parse([tweet])[0].created_at.strftime('%Y%m%d%H%M') < search_to) and api._matches(tweet, query)
+    ]
+
+    ids, next_token = [], None
+    while True:
+        result = api.search_30_day('dev', query, fromDate = search_from, toDate = search_to, maxResults = 100, next = next_token, return_cursors = True)
+        page, next_token = result if isinstance(result, tuple) else (result, None)
+        ids.extend(tweet.id for tweet in page)
+        if next_token is None:
+            break
+
+    assert len(expected) > 100
+    assert ids == expected
+    assert api.calls['search_30_day'] == max(1, -(-len(expected) // 100))
@@ -0,0 +1,54 @@
+from datetime import datetime
+
+from window_planner import WindowPlanner, PlannedWindow
+
+# Hourly counts of a day with a burst at 04:00
+COUNTS = [
+    ('202001120000', '202001120100', 50),
+    ('202001120100', '202001120200', 30),
+    ('202001120200', '202001120300', 0),
+    ('202001120300', '202001120400', 0),
+    ('202001120400', '202001120500', 500),
+    ('202001120500', '202001120600', 20),
+]
+
+def test_plan_from_counts_within_budget():
+    # Complete harvest : buckets merged up to total / windows tweets, whole pages per window
+    plan = WindowPlanner(max_results = 100, budget = 50, windows = 3).plan_from_counts(COUNTS)
+    assert plan == [
+        PlannedWindow('202001120000', '202001120400', 1, None),
+        PlannedWindow('202001120400', '202001120500', 5, None),
+        PlannedWindow('202001120500', '202001120600', 1, None),
+    ]
+
+    # A single window when nothing is fetched concurrently
+    assert WindowPlanner(max_results = 100, budget = 50).plan_from_counts(COUNTS) == [PlannedWindow('202001120000', '202001120600', 6, None)]
+
+def test_plan_from_counts_over_budget():
+    # 6 pages of tweets for 3 requests : the pages are spread over the whole range
+    plan = WindowPlanner(max_results = 100, budget = 3).plan_from_counts(COUNTS)
+    assert sum(w.pages for w in plan) == 3
+    assert plan[0].search_from == '202001120000'
+    assert plan[-1].search_to == '202001120600'
+    assert all(a.search_to <= b.search_from for a, b in zip(plan[:-1], plan[1:]))
+
+def test_plan_from_probes():
+    planner = WindowPlanner(max_results = 100, budget = 12)
+    windows = planner.probe_windows('202001100000', '202001120000')
+    assert windows == [('202001100000', '202001110000'), ('202001110000', '202001120000')]
+
+    # The first day fit in its probe page, the second has a next page : 100 tweets in its last 6 hours,
+    # ~300 tweets expected in the 18 hours before
+    probes = [
+        {'search_from' : windows[0][0], 'search_to' : windows[0][1], 'n' : 40, 'next_token' : None, 'oldest' : datetime(2020, 1, 10, 1)},
+        {'search_from' : windows[1][0], 'search_to' : windows[1][1], 'n' : 100, 'next_token' : 'page2', 'oldest' : datetime(2020, 1, 11, 18)},
+    ]
+    # Enough budget : the window continues from the probe's next token with every request left
+    assert planner.plan_from_probes(probes) == [PlannedWindow('202001110000', '202001120000', 10, 'page2')]
+
+    # Truncated : the part the probe did not reach is split into single page windows
+    plan = planner.plan_from_probes(probes, budget = 2)
+    assert plan == [
+        PlannedWindow('202001110000', '202001110900', 1, None),
+        PlannedWindow('202001110900', '202001111801', 1, None),
+    ]
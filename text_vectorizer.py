@@ -0,0 +1,126 @@
+import re
+import numpy as np
+import pandas as pd
+import scipy.sparse as sp
+from sklearn.feature_extraction.text import CountVectorizer, HashingVectorizer
+from sklearn.preprocessing import normalize
+
+from feature_extraction import regExpDict
+
+# Urls first : a url can contain @ and # characters
+cleanRegExp = re.compile("|".join([regExpDict["urls"], regExpDict["mentions"], regExpDict["hashtags"]]))
+
+def clean_tweets(tweets):
+    """
+    Strips urls, mentions and hashtags from tweets and lowercases them
+    Inputs : tweets - pandas Series or list of tweets (missing tweets become empty strings)
+    Outputs : pandas Series of cleaned tweets
+    """
+    tweets = pd.Series(tweets).fillna("").astype(str)
+    return tweets.str.replace(cleanRegExp, " ", regex = True).str.lower()
+
+# ---------------------------------------- Tweet Vectorizer -----------------------------
+
+class TweetVectorizer():
+    """
+    A class to turn cleaned tweets into sparse CSR matrices batch by batch, the corpus is never held in memory at once :
+        hashed (n_features columns, nothing to fit) or vocabulary based (vocabulary built by partial_fit on the batches)
+        optionally weighted by TF-IDF, document frequencies are accumulated by partial_fit
+    """
+    def __init__(self, hashed = True, n_features = 2 ** 20, tfidf = False, ngram_range = (1, 1), stop_words = "english", min_df = 1):
+        """
+        Inputs : hashed - hashed columns (True) or a vocabulary (False)
+                 n_features - number of hashed columns
+                 tfidf - weights the counts by the smoothed idf and l2 normalises the rows
+                 ngram_range, stop_words - as in sklearn's CountVectorizer
+                 min_df - vocabulary mode : terms found in fewer documents are dropped when the vocabulary is frozen
+        """
+        self.hashed = hashed
+        self.n_features = n_features
+        self.tfidf = tfidf
+        self.min_df = min_df
+        self.n_docs = 0
+
+        if hashed:
+            self._vectorizer = HashingVectorizer(
+                n_features = n_features, ngram_range = ngram_range, stop_words = stop_words,
+                alternate_sign = False, norm = None, dtype = np.float32
+            )
+            self.doc_freq = np.zeros(n_features, dtype = np.int64)
+        else:
+            self._analyzer = CountVectorizer(ngram_range = ngram_range, stop_words = stop_words).build_analyzer()
+            self.vocabulary = {}
+            self.doc_freq = np.zeros(0, dtype = np.int64)
+            self._vectorizer = None
+
+    # Fit ---------------------------------------------------------------------------------------------
+
+    def partial_fit(self, tweets):
+        """ Updates the vocabulary and the document frequencies with a batch of raw tweets """
+        docs = clean_tweets(tweets)
+        self.n_docs += len(docs)
+
+        if self.hashed:
+            X = self._vectorizer.transform(docs)
+            self.doc_freq += np.bincount(X.indices, minlength = self.n_features)
+            return self
+
+        if self._vectorizer is not None:
+            raise ValueError("the vocabulary is frozen, partial_fit must be called before transform")
+        for doc in docs:
+            terms = set(self._analyzer(doc))
+            for term in terms:
+                self.vocabulary.setdefault(term, len(self.vocabulary))
+            idx = np.fromiter((self.vocabulary[t] for t in terms), dtype = np.int64, count = len(terms))
+            if len(self.vocabulary) > len(self.doc_freq):
+                self.doc_freq = np.concatenate([self.doc_freq, np.zeros(len(self.vocabulary) - len(self.doc_freq) + 1024, dtype = np.int64)])
+            self.doc_freq[idx] += 1
+        return self
+
+    def fit(self, batches):
+        """ partial_fit on every batch of an iterable of batches of raw tweets """
+        for tweets in batches:
+            self.partial_fit(tweets)
+        return self
+
+    def _freeze(self):
+        """ Vocabulary mode : drops the terms below min_df and builds the transform of the final vocabulary """
+        terms = [t for t, i in self.vocabulary.items() if self.doc_freq[i] >= self.min_df]
+        self.doc_freq = np.array([self.doc_freq[self.vocabulary[t]] for t in terms], dtype = np.int64)
+        self.vocabulary = {t : i for i, t in enumerate(terms)}
+        self._vectorizer = CountVectorizer(analyzer = self._analyzer, vocabulary = self.vocabulary, dtype = np.float32)
+
+    @property
+    def idf(self):
+        """ Smoothed idf of every column : log((1 + n) / (1 + df)) + 1 """
+        return (np.log((1 + self.n_docs) / (1 + self.doc_freq)) + 1).astype(np.float32)
+
+    # Transform ---------------------------------------------------------------------------------------
+
+    def transform(self, tweets):
+        """ CSR matrix of a batch of raw tweets """
+        if (not self.hashed) and (self._vectorizer is None):
+            self._freeze()
+        X = self._vectorizer.transform(clean_tweets(tweets))
+        if self.tfidf:
+            X = normalize(X.multiply(self.idf).tocsr(), norm = "l2", copy = False)
+        return X.tocsr()
+
+    def iter_transform(self, batches):
+        """ Yields the CSR matrix of each batch of raw tweets """
+        for tweets in batches:
+            yield self.transform(tweets)
+
+    def transform_batches(self, batches):
+        """ Stacks the CSR matrices of every batch (only the sparse matrices are held in memory) """
+        return sp.vstack(list(self.iter_transform(batches)), format = "csr")
+
+def hstack_features(X, features):
+    """
+    Appends numeric feature columns to a sparse text matrix
+    Inputs : X - CSR matrix of n rows
+             features - DataFrame / array of n rows of numeric features (e.g. the feature_extraction features)
+    Outputs : CSR matrix
+    """
+    numeric = sp.csr_matrix(np.nan_to_num(np.asarray(features, dtype = np.float32)))
+    return sp.hstack([X, numeric], format = "csr")
@@ -1,8 +1,33 @@
 import tweepy as tw
 import credentials
+from tweet_schema import flatten_tweets, concat_tweets
+from tweet_storage import TweetStore
+from window_planner import WindowPlanner
+from tweepy.binder import bind_api
+import os
 import pandas as pd
 import numpy as np
-from datetime import datetime
+import time
+import threading
+from collections import deque
+from concurrent.futures import ThreadPoolExecutor
+from datetime import datetime, timedelta
+
+# Request limits per endpoint : (max requests, window in seconds)
+RATE_LIMITS = {
+    'search' : (180, 15 * 60),
+    'search_30_day' : (30, 60),
+    'search_full_archive' : (30, 60)
+}
+
+# Search methods whose pages can be served from the response cache
+CACHED_METHODS = ('search_30_day', 'search_full_archive')
+
+# Premium counts endpoints of the search methods
+COUNTS_PATHS = {
+    'search_30_day' : '/tweets/search/30day/{}/counts.json',
+    'search_full_archive' : '/tweets/search/fullarchive/{}/counts.json'
+}
 
 # ------------------------------------- Twitter Authentication ---------------------------
 class TwitterAuthentication():
@@ -20,169 +45,457 @@ class TwitterAuthentication():
 
         return auth
 
+# ------------------------------------- Rate Limit Scheduler ----------------------------
+class RateLimitScheduler():
+    """ A class to throttle requests so an endpoint never exceeds its rate limit (no 429's) """
+    def __init__(self, max_requests, window, min_interval = 0.1):
+        self.max_requests = max_requests
+        self.window = window
+        self.min_interval = min_interval
+        self._lock = threading.Lock()
+        self._calls = deque()
+        self._remaining = None
+        self._reset = None
+
+    def acquire(self):
+        """ Blocks until a request can be sent without exceeding the rate limit """
+        while True:
+            with self._lock:
+                now = time.time()
+                while self._calls and now - self._calls[0] >= self.window:
+                    self._calls.popleft()
+
+                wait = 0
+                # Rate limit state reported by the API takes precedence over the local count
+                if (self._remaining is not None) and (self._remaining <= 0):
+                    if (self._reset is not None) and (self._reset > now):
+                        wait = self._reset - now
+                    else:
+                        self._remaining = None
+                if len(self._calls) >= self.max_requests:
+                    wait = max(wait, self.window - (now - self._calls[0]))
+                if self._calls and (now - self._calls[-1] < self.min_interval):
+                    wait = max(wait, self.min_interval - (now - self._calls[-1]))
+
+                if wait <= 0:
+                    self._calls.append(now)
+                    if self._remaining is not None:
+                        self._remaining -= 1
+                    return
+            time.sleep(wait)
+
+    def update(self, response):
+        """ Reads the rate limit headers of the last API response """
+        headers = getattr(response, 'headers', None) or {}
+        remaining = headers.get('x-rate-limit-remaining')
+        reset = headers.get('x-rate-limit-reset')
+        with self._lock:
+            if remaining is not None:
+                self._remaining = int(remaining)
+            if reset is not None:
+                self._reset = int(reset)
+
 # ---------------------------------------- Get Tweets -----------------------------------
 
 class GetTweets():
     """ A class to stream and write tweets """
-    def __init__(self):
+    def __init__(self, rate_limits = RATE_LIMITS, fields = None, data_dir = 'D:/Python/Disaster Sentiment Analysis/Data/', store_root = None, checkpoint = None, id_index = None, api = None, cache = None):
         # Instantiate TwitterAuthentication object and authenticate access to twitter
-        
-        auth = TwitterAuthentication().authenticate_twitter()
-        self.api = tw.API(auth)
+        # (api can be given instead e.g. a twitter_replay.ReplayAPI)
+        if api is None:
+            auth = TwitterAuthentication().authenticate_twitter()
+            api = tw.API(auth)
+        self.api = api
+        self.schedulers = {k : RateLimitScheduler(*v) for k,v in rate_limits.items()}
+        # Columns of the flat tweet schema to extract (None for all), see tweet_schema.TWEET_SCHEMA
+        self.fields = fields
         self.df_live_tweets = None
         self.df_past_tweets = None
         self.df_past30_tweets = None
         self.df_past_compiled = None
         self.file_name = None
+        self.data_dir = data_dir
+        # Partitioned parquet store (defaults to <data_dir>/store)
+        self.store = TweetStore(store_root if store_root is not None else os.path.join(data_dir, 'store'))
+        # Resumable harvesting : HarvestCheckpoint records the pages / since_ids harvested, TweetIdIndex the tweet ids
+        self.checkpoint = checkpoint
+        self.id_index = id_index
+        # response_cache.ResponseCache of the premium search pages
+        self.cache = cache
+        # Frame and number of rows of each result already appended by write_to_segments
+        self._segment_marks = {}
+
+    # Rate limited / cached API methods ---------------------------------------------------------------
+
+    def _cached_request(self, method_name, send, args, kwargs):
+        """ Returns a premium search page from the response cache, sending the request on a miss """
+        params = dict(kwargs)
+        params.pop('return_cursors', None)
+        if len(args) > 0:
+            params['environment_name'] = args[0]
+        key = self.cache.key(method_name, **params)
+
+        payload = self.cache.get(key)
+        if payload is None:
+            result = send()
+            tweets, next_token = result if isinstance(result, tuple) else (result, None)
+            payload = {'tweets' : [tweet._json for tweet in tweets], 'next' : next_token}
+            self.cache.put(key, payload, self.cache.ttl(kwargs.get('toDate')))
+            return result
+
+        tweets = tw.models.ResultSet()
+        tweets.extend(tw.models.Status.parse(self.api, raw) for raw in payload['tweets'])
+        if kwargs.get('return_cursors') and (payload['next'] is not None):
+            return tweets, payload['next']
+        return tweets
+
+    def _api_method(self, method_name):
+        """
+        Wraps an API method so every request waits for the endpoint's rate limit scheduler,
+        premium search pages are served from the response cache when one is set
+        """
+        method = getattr(self.api, method_name)
+        scheduler = self.schedulers.get(method_name)
+        cached = (self.cache is not None) and (method_name in CACHED_METHODS)
+        if (scheduler is None) and (not cached):
+            return method
+
+        def send(*args, **kwargs):
+            # create = True only builds the request object (tweepy IdIterator), no request is sent
+            if (scheduler is None) or kwargs.get('create'):
+                return method(*args, **kwargs)
+            scheduler.acquire()
+            result = method(*args, **kwargs)
+            scheduler.update(getattr(self.api, 'last_response', None))
+            return result
+
+        def call(*args, **kwargs):
+            if cached:
+                return self._cached_request(method_name, lambda: send(*args, **kwargs), args, kwargs)
+            return send(*args, **kwargs)
+
+        call.pagination_mode = method.pagination_mode
+        return call
+
+    def _build_query(self, keyword, lang = None, country_code = None):
+        """ Appends the language and country operators to the search keyword """
+        if (lang is not None) & (country_code is not None):
+            keyword = keyword + ' lang:' + lang + ' place_country:' + country_code
+        elif (lang is None) & (country_code is not None):
+            keyword = keyword  + ' place_country:' + country_code
+        elif (lang is not None) & (country_code is None):
+            keyword = keyword + ' lang:' + lang 
+        else:
+            keyword = keyword
+
+        return keyword
+
+    # Record batches ----------------------------------------------------------------------------------
+
+    def _unseen(self, tweets, seen):
+        """ Drops tweets already returned in this run or already in the persistent id index """
+        tweets = [tweet for tweet in tweets if tweet.id not in seen]
+        if (self.id_index is not None) and (len(tweets) > 0):
+            indexed = self.id_index.seen([tweet.id for tweet in tweets])
+            tweets = [tweet for tweet in tweets if tweet.id not in indexed]
+        seen.update(tweet.id for tweet in tweets)
+        return tweets
+
+    def _commit(self, pending, n_rows = None):
+        """
+        Commits the pages whose tweets are all within the first n_rows consumed (all pages if n_rows is None) :
+        their ids are added to the id index and their checkpoint callback is called
+        """
+        remaining = []
+        for end, ids, callback in pending:
+            if (n_rows is None) or (end <= n_rows):
+                if self.id_index is not None:
+                    self.id_index.add(ids)
+                if callback is not None:
+                    callback()
+            else:
+                remaining.append((end - n_rows, ids, callback))
+        return remaining
+
+    def _iter_batches(self, pages, batch_size):
+        """
+        Yields dataframes of batch_size tweets as the pages arrive, only a single batch is held in memory
+        pages yields (tweets, callback) : a page is only checkpointed once the consumer has taken all of its tweets
+        Delivery is at least once : the tweets of a batch are committed (id index, checkpoint) when the next batch is
+        requested, so a consumer that stops while processing a batch gets that batch again on the next run
+        """
+        batch = []
+        pending = []
+        seen = set()
+        for tweets, callback in pages:
+            tweets = self._unseen(tweets, seen)
+            batch.extend(tweets)
+            pending.append((len(batch), [tweet.id for tweet in tweets], callback))
+
+            while len(batch) >= batch_size:
+                yield flatten_tweets(batch[:batch_size], self.fields)
+                batch = batch[batch_size:]
+                pending = self._commit(pending, batch_size)
+
+        if len(batch) > 0:
+            yield flatten_tweets(batch, self.fields)
+        self._commit(pending)
+
+    def _concat(self, batches):
+        """ Concatenates record batches into a single dataframe """
+        return concat_tweets(batches, self.fields)
 
     # Stream live tweets ------------------------------------------------------------------------------
 
-    def stream_live_tweets(self,keyword,num_tweets):
-        """ Method to search live tweets (past 7 days) """
-        
-        # Stream live twitter data (past 7 days)
-        tweetsObj = tw.Cursor(
-            self.api.search,
-            q = keyword +'-filter:retweets',    
-        ).items(num_tweets)
+    def iter_live_tweets(self,keyword,num_tweets,batch_size = 100,count = 100):
+        """
+        Generator version of stream_live_tweets, yields dataframes of batch_size tweets
+        Pages of count tweets (at most 100) are requested with a max_id below the oldest tweet of the previous page,
+        only the current page is held in memory (tw.Cursor keeps every page it fetched)
+        With a checkpoint only tweets newer than the last run of the same keyword are requested. When a run stops at
+        num_tweets before reaching them, the next runs first harvest the tweets it left (older than its oldest tweet)
+        """
+        query = keyword +' -filter:retweets'
+        since_id, resume_id, newest_id = None, None, None
+        if self.checkpoint is not None:
+            since_id = self.checkpoint.since_id(query)
+            resume_id, newest_id = self.checkpoint.resume_point(query)
+        kwargs = {'since_id' : since_id} if since_id is not None else {}
 
-        properties = ['author','contributors','coordinates','created_at','destroy','entities','extended_entities','favorite','favorite_count','favorited','geo','id','id_str','in_reply_to_screen_name','in_reply_to_status_id','in_reply_to_status_id_str','in_reply_to_user_id','in_reply_to_user_id_str','is_quote_status','lang','metadata','parse','parse_list','place','possibly_sensitive','quoted_status','quoted_status_id','quoted_status_id_str','retweet','retweet_count','retweeted','retweets','source','source_url','text','truncated','user']
+        # Stream live twitter data (past 7 days)
+        search = self._api_method('search')
+
+        def pages():
+            newest, oldest, n_tweets = newest_id, None, 0
+            # A previous run stopped at num_tweets before reaching since_id : this run continues below its oldest tweet
+            max_id = resume_id
+            while n_tweets < num_tweets:
+                page_kwargs = dict(kwargs, max_id = max_id) if max_id is not None else kwargs
+                page = search(q = query, count = min(count, num_tweets - n_tweets), **page_kwargs)
+                if len(page) == 0:
+                    break
+                n_tweets += len(page)
+                newest = page[0].id if newest is None else max(newest, page[0].id)
+                oldest = page[-1].id
+                max_id = oldest - 1
+                yield page, None
+
+            # Results are newest first : the since_id only moves once the results have been consumed back to it,
+            # a run stopped by num_tweets records where the next run resumes instead
+            if (self.checkpoint is None) or (newest is None):
+                return
+            if n_tweets < num_tweets:
+                yield [], lambda: self.checkpoint.set_since_id(query, newest)
+            else:
+                yield [], lambda: self.checkpoint.set_resume_point(query, oldest - 1, newest)
+
+        return self._iter_batches(pages(), batch_size)
 
-        tweet_list = []
-        for tweet in tweetsObj:
-            tweet_list.append({key : getattr(tweet,key,None) for key in properties})
+    def stream_live_tweets(self,keyword,num_tweets):
+        """ Method to search live tweets (past 7 days) """
 
-        self.df_live_tweets= pd.DataFrame(data = tweet_list)
-        self.df_live_tweets.set_index('id',inplace = True)
+        self.df_live_tweets = self._concat(self.iter_live_tweets(keyword, num_tweets))
         
         return self.df_live_tweets
 
-    # Stream past tweets (30 days) --------------------------------------------------------------------------------
+    # Premium search ----------------------------------------------------------------------------------
 
-    def stream_past30_tweets(self,keyword,search_from,search_to,max_results = 100,pg = 1, lang = None ,country_code = None):
-        """Streams past 30 data tweets, uses 30 Days / Sandbox Account"""
+    def _iter_premium(self,method_name,environment_name,keyword,search_from,search_to,max_results = 100,pg = 1,lang = None,country_code = None,batch_size = 100,next_token = None):
+        """
+        Yields dataframes of batch_size tweets from a premium search window, pages are requested as the batches are consumed
+        With a checkpoint, pages harvested by a previous run are skipped and the window resumes from its next token
+        next_token starts the window from a page other than the first one
+        """
+        query = self._build_query(keyword, lang, country_code)
+        window = (method_name, query, search_from, search_to, max_results)
 
+        pages_done, done = 0, False
+        if self.checkpoint is not None:
+            pages_done, checkpoint_token, done = self.checkpoint.window(*window)
+            if pages_done > 0:
+                next_token = checkpoint_token
+        if done or (pages_done >= pg):
+            return iter([])
 
-        if (lang is not None) & (country_code is not None):
-            keyword = keyword + ' lang:' + lang + ' place_country:' + country_code
-        elif (lang is None) & (country_code is not None):
-            keyword = keyword  + ' place_country:' + country_code
-        elif (lang is not None) & (country_code is None):
-            keyword = keyword + ' lang:' + lang 
-        else:
-            keyword = keyword
-
+        kwargs = {'next' : next_token} if next_token is not None else {}
 
         # Tweepy cursor object
-        past30TweetsObj = tw.Cursor(
-            self.api.search_30_day,
-            environment_name = 'VolcanicDisaster30',
-            query = keyword, 
+        pagesObj = tw.Cursor(
+            self._api_method(method_name),
+            environment_name = environment_name,
+            query = query, 
             maxResults = max_results,
             fromDate = search_from,
-            toDate = search_to
-        ).pages(pg)
-        
-        
-        # Create Dataframe
-        properties = ['author','contributors','coordinates','created_at','destroy','display_text_range','entities','extended_entities','extended_tweet','favorite','favorite_count','favorited','filter_level','geo','id','id_str','in_reply_to_screen_name','in_reply_to_status_id','in_reply_to_status_id_str','in_reply_to_user_id','in_reply_to_user_id_str','is_quote_status','lang','matching_rules','parse','parse_list','place','possibly_sensitive','quote_count','quoted_status','quoted_status_id','quoted_status_id_str','quoted_status_permalink','reply_count','retweet','retweet_count','retweeted','retweeted_status','retweets','source','source_url','text','truncated','user']
-        
-        page_list = [pg for pg in past30TweetsObj]
-        tweet_list = [{key : getattr(tweet,key,None) for key in properties} for tweet_collection in page_list for tweet in tweet_collection]
+            toDate = search_to,
+            **kwargs
+        ).pages(pg - pages_done)
 
-        self.df_past30_tweets = pd.DataFrame(data = tweet_list)
-        self.df_past30_tweets.set_index('id', inplace = True)
-        
+        def pages():
+            for page in pagesObj:
+                callback = None
+                if self.checkpoint is not None:
+                    # The cursor sets next_token to -1 once the window has no more pages
+                    token = None if pagesObj.next_token == -1 else pagesObj.next_token
+                    callback = lambda token = token: self.checkpoint.page_done(*window, token)
+                yield page, callback
+
+        return self._iter_batches(pages(), batch_size)
+
+    def _search_premium(self,method_name,environment_name,keyword,search_from,search_to,max_results = 100,pg = 1,lang = None,country_code = None,next_token = None):
+        """ Streams a premium search window into a new dataframe, without touching the instance state """
+
+        batches = self._iter_premium(method_name, environment_name, keyword, search_from, search_to, max_results, pg, lang, country_code, next_token = next_token)
+
+        return self._concat(batches)
+
+    # Stream past tweets (30 days) --------------------------------------------------------------------------------
+
+    def iter_past30_tweets(self,keyword,search_from,search_to,max_results = 100,pg = 1, lang = None ,country_code = None, batch_size = 100):
+        """ Generator version of stream_past30_tweets, yields dataframes of batch_size tweets """
+
+        return self._iter_premium('search_30_day', 'VolcanicDisaster30', keyword, search_from, search_to, max_results, pg, lang, country_code, batch_size)
+
+    def stream_past30_tweets(self,keyword,search_from,search_to,max_results = 100,pg = 1, lang = None ,country_code = None):
+        """Streams past 30 data tweets, uses 30 Days / Sandbox Account"""
+
+        self.df_past30_tweets = self._search_premium('search_30_day', 'VolcanicDisaster30', keyword, search_from, search_to, max_results, pg, lang, country_code)
 
         return self.df_past30_tweets
       
     # stream past tweets (since 2006) -------------------------------------------------------------------------------
 
-    def stream_past_tweets(self,keyword,search_from,search_to,max_results = 100, pg = 1, lang = None ,country_code = None):
-        """ Method to search for past tweets (since 2006) """
-
-        if (lang is not None) & (country_code is not None):
-            keyword = keyword + ' lang:' + lang + ' place_country:' + country_code
-        elif (lang is None) & (country_code is not None):
-            keyword = keyword  + ' place_country:' + country_code
-        elif (lang is not None) & (country_code is None):
-            keyword = keyword + ' lang:' + lang 
-        else:
-            keyword = keyword
-
-        # Stream past twitter data (since 2006)
-        pastTweetsObj = tw.Cursor(
-            self.api.search_full_archive,
-            environment_name = 'VolcanicDisaster',
-            query = keyword, 
-            maxResults = max_results,
-            fromDate = search_from,
-            toDate = search_to
-        ).pages(pg)
+    def iter_past_tweets(self,keyword,search_from,search_to,max_results = 100, pg = 1, lang = None ,country_code = None, batch_size = 100):
+        """ Generator version of stream_past_tweets, yields dataframes of batch_size tweets """
 
-        # create a dataframe with past tweets
-        properties = ['author','contributors','coordinates','created_at','destroy','display_text_range','entities','extended_entities','extended_tweet','favorite','favorite_count','favorited','filter_level','geo','id','id_str','in_reply_to_screen_name','in_reply_to_status_id','in_reply_to_status_id_str','in_reply_to_user_id','in_reply_to_user_id_str','is_quote_status','lang','matching_rules','parse','parse_list','place','possibly_sensitive','quote_count','quoted_status','quoted_status_id','quoted_status_id_str','quoted_status_permalink','reply_count','retweet','retweet_count','retweeted','retweeted_status','retweets','source','source_url','text','truncated','user']
+        return self._iter_premium('search_full_archive', 'VolcanicDisaster', keyword, search_from, search_to, max_results, pg, lang, country_code, batch_size)
 
-        page_list = [pg for pg in pastTweetsObj]
-        tweet_list = [{key : getattr(tweet,key,None) for key in properties} for tweet_collection in page_list for tweet in tweet_collection]
+    def stream_past_tweets(self,keyword,search_from,search_to,max_results = 100, pg = 1, lang = None ,country_code = None):
+        """ Method to search for past tweets (since 2006) """
 
-        self.df_past_tweets = pd.DataFrame(data = tweet_list)
-        self.df_past_tweets.set_index('id',inplace = True)
+        self.df_past_tweets = self._search_premium('search_full_archive', 'VolcanicDisaster', keyword, search_from, search_to, max_results, pg, lang, country_code)
 
         return self.df_past_tweets
 
     # Compiled dataframe --------------------------------------------------------------------------------
 
-    def stream_single_over_dateRange(self,keyword,search_from,search_to,max_results = 100, pg = 1, lang = None, country_code = None, pastSearch30 = True):
-        from datetime import date,timedelta
-        from dateutil.relativedelta import relativedelta
-
-        # Construct query based on keyword, lang, and country code
-        if (lang is not None) & (country_code is not None):
-            keyword = keyword + ' lang:' + lang + ' place_country:' + country_code
-        elif (lang is None) & (country_code is not None):
-            keyword = keyword  + ' place_country:' + country_code
-        elif (lang is not None) & (country_code is None):
-            keyword = keyword + ' lang:' + lang 
-        else:
-            keyword = keyword
-
-        # Create a range of dates to iterate over
+    def _day_windows(self,search_from,search_to):
+        """ Splits a date range ('YYYYMMDDHHMM') into consecutive one day windows """
         startDate = datetime.strptime(search_from,'%Y%m%d%H%M')
         endDate = datetime.strptime(search_to,'%Y%m%d%H%M')
-        dateRange = [startDate + timedelta(days = i) for i in range((endDate-startDate).days)]
-        dateRangeStr =[dt.strftime('%Y%m%d%H%M') for dt in dateRange]
 
-        # create a dataframe with past tweets
-        properties = ['author','contributors','coordinates','created_at','destroy','display_text_range','entities','extended_entities','extended_tweet','favorite','favorite_count','favorited','filter_level','geo','id','id_str','in_reply_to_screen_name','in_reply_to_status_id','in_reply_to_status_id_str','in_reply_to_user_id','in_reply_to_user_id_str','is_quote_status','lang','matching_rules','parse','parse_list','place','possibly_sensitive','quote_count','quoted_status','quoted_status_id','quoted_status_id_str','quoted_status_permalink','reply_count','retweet','retweet_count','retweeted','retweeted_status','retweets','source','source_url','text','truncated','user']
-        
-        if pastSearch30 == True:
-            
-            df_list = []
-
-            for dt_idx,dt in enumerate(dateRangeStr):
-                if dt_idx < len(dateRangeStr)-1:
-                    # Tweepy cursor object
-                    df_search30 = self.stream_past30_tweets(keyword = keyword, search_from = dt , search_to = dateRangeStr[dt_idx + 1], pg =pg, lang = lang, country_code = country_code)
-                    df_list.append(df_search30)
+        windows = []
+        while startDate < endDate:
+            stopDate = min(startDate + timedelta(days = 1), endDate)
+            windows.append((startDate.strftime('%Y%m%d%H%M'), stopDate.strftime('%Y%m%d%H%M')))
+            startDate = stopDate
 
-            self.df_past_compiled = pd.concat(df_list)
+        return windows
 
+    def stream_single_over_dateRange(self,keyword,search_from,search_to,max_results = 100, pg = 1, lang = None, country_code = None, pastSearch30 = True, max_workers = 1):
+        """
+        Streams each day in the date range, pg pages per day
+        max_workers > 1 fetches the days concurrently, requests are throttled by the endpoint's rate limit scheduler
+        """
+        if pastSearch30 == True:
+            method_name, environment_name = 'search_30_day', 'VolcanicDisaster30'
         else:
+            method_name, environment_name = 'search_full_archive', 'VolcanicDisaster'
 
-            df_list = []
+        def fetch(window):
+            return self._search_premium(method_name, environment_name, keyword, window[0], window[1], max_results, pg, lang, country_code)
 
-            for dt_idx,dt in enumerate(dateRangeStr):
-                if dt_idx < len(dateRangeStr)-1:
-                    # Tweepy cursor object
-                    df_search = self.stream_past_tweets(keyword = keyword, search_from = dt , search_to = dateRangeStr[dt_idx + 1], pg =pg, lang = lang, country_code = country_code)
-                    df_list.append(df_search)
+        windows = self._day_windows(search_from, search_to)
 
-            self.df_past_compiled = pd.concat(df_list)
+        # Executor.map returns the windows in order, irrespective of which finishes first
+        with ThreadPoolExecutor(max_workers = max(1, max_workers)) as executor:
+            df_list = list(executor.map(fetch, windows))
 
+        df = self._concat(df_list)
+        self.df_past_compiled = df[~df.index.duplicated(keep = 'first')]
+
+        return self.df_past_compiled
+
+    # Planned date range --------------------------------------------------------------------------------
+
+    def _premium_counts(self,method_name,environment_name,query,search_from,search_to,bucket = 'hour'):
+        """
+        Tweet counts per bucket from the premium counts endpoint (paid premium environments only)
+        Outputs : list of (bucket_from, bucket_to, count) in time order, number of requests used
+        """
+        counts_method = getattr(self.api, method_name + '_counts', None)
+        if counts_method is None:
+            path = COUNTS_PATHS[method_name].format(environment_name)
+            counts_method = lambda environment_name, **kwargs: bind_api(
+                api = self.api, path = path, payload_type = 'json',
+                allowed_param = ['query', 'fromDate', 'toDate', 'bucket', 'next'], require_auth = True
+            )(**kwargs)
+        scheduler = self.schedulers.get(method_name)
+
+        results, requests, next_token = [], 0, None
+        while True:
+            kwargs = {'next' : next_token} if next_token is not None else {}
+            if scheduler is not None:
+                scheduler.acquire()
+            response = counts_method(environment_name, query = query, fromDate = search_from, toDate = search_to, bucket = bucket, **kwargs)
+            requests += 1
+            results.extend(response['results'])
+            next_token = response.get('next')
+            if next_token is None:
+                break
+
+        step = timedelta(hours = 1) if bucket == 'hour' else timedelta(days = 1)
+        counts = []
+        for result in sorted(results, key = lambda r: r['timePeriod']):
+            bucket_to = min(datetime.strptime(result['timePeriod'], '%Y%m%d%H%M') + step, datetime.strptime(search_to, '%Y%m%d%H%M'))
+            counts.append((result['timePeriod'], bucket_to.strftime('%Y%m%d%H%M'), result['count']))
+
+        return counts, requests
+
+    def stream_planned_over_dateRange(self,keyword,search_from,search_to,budget,max_results = 100, lang = None, country_code = None, pastSearch30 = True, use_counts = False, max_workers = 1):
+        """
+        Streams the date range within a budget of requests, the windows are planned from the tweet density so that
+        quiet days are merged and busy days split, each request returning close to max_results tweets
+        Density comes from the premium counts endpoint with use_counts (not available in sandbox environments),
+        otherwise from a first page of each day (these pages are part of the results)
+        """
+        if pastSearch30 == True:
+            method_name, environment_name = 'search_30_day', 'VolcanicDisaster30'
+        else:
+            method_name, environment_name = 'search_full_archive', 'VolcanicDisaster'
+
+        query = self._build_query(keyword, lang, country_code)
+        planner = WindowPlanner(max_results, budget, max(1, max_workers))
+        method = self._api_method(method_name)
+
+        def probe(window):
+            result = method(environment_name, query = query, fromDate = window[0], toDate = window[1], maxResults = max_results, return_cursors = True)
+            tweets, next_token = result if isinstance(result, tuple) else (result, None)
+            stats = {
+                'search_from' : window[0], 'search_to' : window[1], 'n' : len(tweets), 'next_token' : next_token,
+                'oldest' : min([tweet.created_at for tweet in tweets], default = None)
+            }
+            return stats, self._concat(self._iter_batches(iter([(tweets, None)]), max_results))
+
+        def fetch(window):
+            return self._search_premium(method_name, environment_name, keyword, window.search_from, window.search_to, max_results, window.pages, lang, country_code, window.next_token)
+
+        with ThreadPoolExecutor(max_workers = max(1, max_workers)) as executor:
+            if use_counts:
+                counts, requests = self._premium_counts(method_name, environment_name, query, search_from, search_to)
+                df_list = []
+                plan = planner.plan_from_counts(counts, budget - requests)
+            else:
+                probes = list(executor.map(probe, planner.probe_windows(search_from, search_to)))
+                df_list = [df for _, df in probes]
+                plan = planner.plan_from_probes([stats for stats, _ in probes])
+
+            df_list.extend(executor.map(fetch, plan))
+
+        # Probes and planned windows overlap in time, tweet ids are time ordered
+        df = self._concat(df_list)
+        self.df_past_compiled = df[~df.index.duplicated(keep = 'first')].sort_index()
 
         return self.df_past_compiled
-        
 
     # write data ----------------------------------------------------------------------------------------
 
@@ -191,41 +504,72 @@ class GetTweets():
 
         self.file_name = f_name
         if self.file_name is not None:
-            path = 'D:/Python/Disaster Sentiment Analysis/Data/'
-            with open(path + self.file_name,'w'):
+            path = self.data_dir
+            with open(os.path.join(path, self.file_name),'w'):
                 pass
 
             if self.df_live_tweets is not None:
-                self.df_live_tweets.to_csv(path + self.file_name)
+                self.df_live_tweets.to_csv(os.path.join(path, self.file_name))
 
             if self.df_past_tweets is not None:
-                self.df_past_tweets.to_csv(path + self.file_name)
+                self.df_past_tweets.to_csv(os.path.join(path, self.file_name))
 
             if self.df_past30_tweets is not None:
-                self.df_past30_tweets.to_csv(path + self.file_name)
+                self.df_past30_tweets.to_csv(os.path.join(path, self.file_name))
 
             if self.df_past_compiled is not None:
-                self.df_past_compiled.to_csv(path + self.file_name)
+                self.df_past_compiled.to_csv(os.path.join(path, self.file_name))
 
         if (self.df_live_tweets is not None) & (self.file_name is None) & (self.df_past_compiled is None) :
-            self.df_live_tweets.to_csv('D:/Python/Disaster Sentiment Analysis/Data/live_tweets.csv')
+            self.df_live_tweets.to_csv(os.path.join(self.data_dir, 'live_tweets.csv'))
 
         if (self.df_past_tweets is not None) & (self.file_name is None) & (self.df_past_compiled is None):
-            self.df_past_tweets.to_csv('D:/Python/Disaster Sentiment Analysis/Data/past_tweets.csv')
+            self.df_past_tweets.to_csv(os.path.join(self.data_dir, 'past_tweets.csv'))
 
         if (self.df_past30_tweets is not None) & (self.file_name is None) & (self.df_past_compiled is None):
-            self.df_past30_tweets.to_csv('D:/Python/Disaster Sentiment Analysis/Data/past30_tweets.csv')
+            self.df_past30_tweets.to_csv(os.path.join(self.data_dir, 'past30_tweets.csv'))
 
         if (self.df_past_compiled is not None) & (self.file_name is None):
-            self.df_past_compiled.to_csv('D:/Python/Disaster Sentiment Analysis/Data/past_compiled_tweets.csv')
+            self.df_past_compiled.to_csv(os.path.join(self.data_dir, 'past_compiled_tweets.csv'))
 
     # read data ----------------------------------------------------------------------------------------
 
     def read_csv(self,f_name):
         """ Method to read saved tweets in csv file """
-        path = 'D:/Python/Disaster Sentiment Analysis/Data/'
-        df = pd.read_csv(path + f_name, index_col = 'id')
+        path = self.data_dir
+        df = pd.read_csv(os.path.join(path, f_name), index_col = 'id')
         return df
+
+    # Segments -----------------------------------------------------------------------------------------
+
+    def write_to_segments(self,writer):
+        """
+        Appends the streamed tweets to a segment_writer.SegmentWriter, unlike write_to_csv earlier saves are never
+        rewritten, so saving every few seconds costs only the new tweets
+        Only rows not appended by a previous call are written (a result replaced by a new stream is written in full)
+        """
+        for name in ['df_live_tweets', 'df_past_tweets', 'df_past30_tweets', 'df_past_compiled']:
+            df = getattr(self, name)
+            if df is None:
+                continue
+            last, n_rows = self._segment_marks.get(name, (None, 0))
+            start = n_rows if df is last else 0
+            if len(df) > start:
+                writer.append(df.iloc[start:])
+            self._segment_marks[name] = (df, len(df))
+        writer.flush()
+
+    # Parquet store ------------------------------------------------------------------------------------
+
+    def write_to_store(self,event):
+        """ Appends the streamed tweets to the partitioned parquet store under the event name """
+        for df in [self.df_live_tweets, self.df_past_tweets, self.df_past30_tweets, self.df_past_compiled]:
+            if df is not None:
+                self.store.write(df, event)
+
+    def read_store(self,columns = None,event = None,date = None,lang = None):
+        """ Reads tweets from the parquet store, only loading the requested columns and event / date / lang partitions """
+        return self.store.read(columns = columns, event = event, date = date, lang = lang)
         
 # --------------------------------------- Run Main File -----------------------------------------------
 
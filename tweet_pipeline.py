@@ -0,0 +1,131 @@
+import time
+import asyncio
+import pandas as pd
+from concurrent.futures import ProcessPoolExecutor
+
+from feature_extraction import extract_features
+
+# ---------------------------------------- Batch Sources --------------------------------
+
+def poll_live_tweets(inst, keyword, num_tweets = 100, poll_interval = 15, batch_size = 100, polls = None):
+    """
+    Polls the live search endpoint every poll_interval seconds and yields the new tweets of each poll in batches
+    Inputs : inst - GetTweets instance with a checkpoint (the since_id of each poll is read from / moved in the checkpoint)
+             num_tweets - maximum number of tweets per poll
+             polls - number of polls, None to poll until the pipeline is stopped
+    """
+    if inst.checkpoint is None:
+        raise ValueError('poll_live_tweets needs a GetTweets instance with a checkpoint to request only new tweets')
+
+    n = 0
+    while (polls is None) or (n < polls):
+        start = time.monotonic()
+        yield from inst.iter_live_tweets(keyword = keyword, num_tweets = num_tweets, batch_size = batch_size)
+        n += 1
+        if (polls is None) or (n < polls):
+            time.sleep(max(0.0, poll_interval - (time.monotonic() - start)))
+
+def featurize_batch(df):
+    """
+    Adds the extract_features columns to a batch of flattened tweets, the text of extended tweets is the full text
+    Runs in the worker processes of the pipeline
+    """
+    tweet = df['text']
+    if 'extended_tweet.full_text' in df.columns:
+        tweet = df['extended_tweet.full_text'].fillna(tweet)
+    df = df.assign(tweet = tweet.fillna('').astype(str))
+    return df.join(extract_features(df, text_col = 'tweet'))
+
+# ---------------------------------------- Tweet Pipeline -------------------------------
+
+class TweetPipeline():
+    """
+    A class to run harvesting, feature extraction and storage concurrently (asyncio) :
+    a producer pulls batches of tweets from a GetTweets generator, featurizers compute the features in a process pool
+    and a writer persists the batches. The stages are connected by bounded queues, so a slow stage blocks the
+    stages before it (backpressure) instead of buffering tweets in memory.
+    """
+    def __init__(self, batches, writer, featurize = featurize_batch, n_featurizers = 2, queue_size = 4, executor = None):
+        """
+        Inputs : batches - iterable of tweet DataFrames, e.g. GetTweets.iter_past30_tweets(...) or poll_live_tweets(...)
+                 writer - callable persisting a batch, e.g. lambda df: store.write(df, event)
+                 featurize - picklable function adding the features to a batch
+                 n_featurizers - number of batches featurized concurrently
+                 queue_size - maximum number of batches waiting in front of each stage
+                 executor - executor of the featurizers, defaults to a process pool of n_featurizers workers
+        """
+        self.batches = batches
+        self.writer = writer
+        self.featurize = featurize
+        self.n_featurizers = n_featurizers
+        self.queue_size = queue_size
+        self.executor = executor
+        # Tweets written and the seconds between the creation of the newest tweet of a batch and its write
+        self.n_batches = 0
+        self.n_tweets = 0
+        self.lags = []
+
+    async def _produce(self, loop, raw):
+        """ Pulls batches from the (blocking) generator in a thread so the event loop keeps running """
+        iterator = iter(self.batches)
+        while True:
+            df = await loop.run_in_executor(None, next, iterator, None)
+            if df is None:
+                break
+            if len(df) > 0:
+                # Waits while the featurizers are busy
+                await raw.put(df)
+
+        for _ in range(self.n_featurizers):
+            await raw.put(None)
+
+    async def _featurize(self, loop, executor, raw, featurized):
+        while True:
+            df = await raw.get()
+            if df is None:
+                await featurized.put(None)
+                break
+            await featurized.put(await loop.run_in_executor(executor, self.featurize, df))
+
+    async def _write(self, loop, featurized):
+        done = 0
+        while done < self.n_featurizers:
+            df = await featurized.get()
+            if df is None:
+                done += 1
+                continue
+            await loop.run_in_executor(None, self.writer, df)
+
+            self.n_batches += 1
+            self.n_tweets += len(df)
+            if 'created_at' in df.columns:
+                newest = df['created_at'].max()
+                if not pd.isnull(newest):
+                    self.lags.append((pd.Timestamp.now('UTC').tz_localize(None) - newest).total_seconds())
+
+    async def run(self):
+        """ Runs the pipeline until the batches are exhausted, the first exception of a stage stops every stage """
+        loop = asyncio.get_running_loop()
+        raw = asyncio.Queue(maxsize = self.queue_size)
+        featurized = asyncio.Queue(maxsize = self.queue_size)
+        executor = self.executor if self.executor is not None else ProcessPoolExecutor(self.n_featurizers)
+
+        tasks = [asyncio.ensure_future(self._produce(loop, raw))]
+        tasks.extend(asyncio.ensure_future(self._featurize(loop, executor, raw, featurized)) for _ in range(self.n_featurizers))
+        tasks.append(asyncio.ensure_future(self._write(loop, featurized)))
+
+        try:
+            done, pending = await asyncio.wait(tasks, return_when = asyncio.FIRST_EXCEPTION)
+            for task in pending:
+                task.cancel()
+            for task in done:
+                task.result()
+        finally:
+            if self.executor is None:
+                executor.shutdown()
+
+        return self.n_tweets
+
+    def start(self):
+        """ Runs the pipeline from synchronous code, returns the number of tweets written """
+        return asyncio.run(self.run())
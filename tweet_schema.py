@@ -0,0 +1,113 @@
+import pandas as pd
+
+# ------------------------------------- Tweet Schema ------------------------------------
+# Flat columns extracted from the raw tweet json : (column name, path in the json, dtype)
+# Columns hold typed scalars only, nested tweepy objects are never copied into the dataframe
+
+TWEET_SCHEMA = [
+    ('id', ('id',), 'int64'),
+    ('created_at', ('created_at',), 'datetime'),
+    ('text', ('text',), 'string'),
+    ('extended_tweet.full_text', ('extended_tweet', 'full_text'), 'string'),
+    ('lang', ('lang',), 'category'),
+    ('source', ('source',), 'string'),
+    ('truncated', ('truncated',), 'boolean'),
+    ('is_quote_status', ('is_quote_status',), 'boolean'),
+    ('possibly_sensitive', ('possibly_sensitive',), 'boolean'),
+    ('in_reply_to_status_id', ('in_reply_to_status_id',), 'Int64'),
+    ('in_reply_to_user_id', ('in_reply_to_user_id',), 'Int64'),
+    ('in_reply_to_screen_name', ('in_reply_to_screen_name',), 'string'),
+    ('quoted_status_id', ('quoted_status_id',), 'Int64'),
+    ('retweeted_status.id', ('retweeted_status', 'id'), 'Int64'),
+    ('retweet_count', ('retweet_count',), 'Int32'),
+    ('favorite_count', ('favorite_count',), 'Int32'),
+    ('reply_count', ('reply_count',), 'Int32'),
+    ('quote_count', ('quote_count',), 'Int32'),
+    ('user.id', ('user', 'id'), 'Int64'),
+    ('user.screen_name', ('user', 'screen_name'), 'string'),
+    ('user.name', ('user', 'name'), 'string'),
+    ('user.location', ('user', 'location'), 'string'),
+    ('user.verified', ('user', 'verified'), 'boolean'),
+    ('user.followers_count', ('user', 'followers_count'), 'Int32'),
+    ('user.friends_count', ('user', 'friends_count'), 'Int32'),
+    ('user.statuses_count', ('user', 'statuses_count'), 'Int32'),
+    ('place.id', ('place', 'id'), 'string'),
+    ('place.full_name', ('place', 'full_name'), 'string'),
+    ('place.place_type', ('place', 'place_type'), 'category'),
+    ('place.country_code', ('place', 'country_code'), 'category'),
+    ('lat', ('coordinates', 'coordinates', 1), 'float32'),
+    ('lon', ('coordinates', 'coordinates', 0), 'float32')
+]
+
+# Format of created_at in the raw tweet json, e.g. 'Wed Oct 10 20:19:24 +0000 2018'
+CREATED_AT_FORMAT = '%a %b %d %H:%M:%S %z %Y'
+
+def schema_fields(fields = None):
+    """
+    Selects the schema entries for the requested columns
+    Inputs : fields - list of column names, None for the full schema (id is always included)
+    Outputs : list of schema entries
+    """
+    if fields is None:
+        return TWEET_SCHEMA
+
+    fields = set(fields) | {'id'}
+    unknown = fields - {name for name, _, _ in TWEET_SCHEMA}
+    if len(unknown) > 0:
+        raise KeyError('Unknown tweet fields : ' + ', '.join(sorted(unknown)))
+
+    return [entry for entry in TWEET_SCHEMA if entry[0] in fields]
+
+def _get_path(obj, path):
+    """ Follows a path of keys / indices in the raw json, None if any step is missing """
+    for key in path:
+        if obj is None:
+            return None
+        try:
+            obj = obj[key]
+        except (KeyError, IndexError, TypeError):
+            return None
+    return obj
+
+def _to_column(values, dtype):
+    """ Converts a list of raw values into a typed column """
+    if dtype == 'datetime':
+        # Naive UTC timestamps, written as 'YYYY-MM-DD HH:MM:SS' like the tweepy created_at attribute
+        return pd.to_datetime(pd.Series(values, dtype = 'object'), format = CREATED_AT_FORMAT, utc = True).dt.tz_convert(None)
+    if dtype in ('float32', 'float64'):
+        return pd.Series(values, dtype = 'float64').astype(dtype)
+    return pd.Series(values, dtype = dtype)
+
+def flatten_tweets(tweets, fields = None):
+    """
+    Projects tweets onto the flat tweet schema in a single pass
+    Inputs : tweets - iterable of tweepy Status objects or raw tweet json dicts
+             fields - list of columns to extract, None for the full schema
+    Outputs : DataFrame with one typed column per schema entry, indexed on the tweet id
+    """
+    schema = schema_fields(fields)
+    columns = [[] for _ in schema]
+    paths = [path for _, path, _ in schema]
+
+    for tweet in tweets:
+        raw = getattr(tweet, '_json', tweet)
+        for column, path in zip(columns, paths):
+            column.append(_get_path(raw, path))
+
+    df = pd.DataFrame({name : _to_column(values, dtype) for (name, _, dtype), values in zip(schema, columns)})
+    df.set_index('id', inplace = True)
+
+    return df
+
+def concat_tweets(frames, fields = None):
+    """
+    Concatenates flat tweet dataframes, keeping the schema dtypes
+    (categorical columns with different categories would otherwise fall back to object)
+    """
+    frames = list(frames)
+    if len(frames) == 0:
+        return flatten_tweets([], fields)
+
+    df = pd.concat(frames)
+    categories = [name for name, _, dtype in schema_fields(fields) if (dtype == 'category') & (name in df.columns)]
+    return df.astype({name : 'category' for name in categories})
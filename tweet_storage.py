@@ -0,0 +1,146 @@
+import os
+import uuid
+import pandas as pd
+import pyarrow as pa
+import pyarrow.dataset as ds
+import pyarrow.fs as pafs
+
+from tweet_schema import TWEET_SCHEMA
+
+# Hive style partitions : <root>/event=<event>/date=<YYYY-MM-DD>/lang=<lang>/part-*.parquet
+PARTITION_SCHEMA = pa.schema([
+    ('event', pa.string()),
+    ('date', pa.string()),
+    ('lang', pa.string())
+])
+
+# Arrow types of the tweet schema dtypes, categories are stored as plain strings (each file would otherwise carry
+# its own dictionary, and an all null column would be typed null)
+ARROW_TYPES = {
+    'int64' : pa.int64(),
+    'Int64' : pa.int64(),
+    'Int32' : pa.int32(),
+    'float32' : pa.float32(),
+    'boolean' : pa.bool_(),
+    'string' : pa.string(),
+    'category' : pa.string(),
+    'datetime' : pa.timestamp('us')
+}
+
+# One schema for every file of the store, so batches where a column is all null (e.g. place.* without geotagged
+# tweets) are written with the same types as the others
+STORE_SCHEMA = pa.schema(
+    [(name, ARROW_TYPES[dtype]) for name, _, dtype in TWEET_SCHEMA] + [('event', pa.string()), ('date', pa.string())]
+)
+
+def _store_table(df):
+    """ Arrow table of a DataFrame, tweet schema columns cast to the store types (other columns keep their inferred types) """
+    table = pa.Table.from_pandas(df, preserve_index = False)
+    schema = pa.schema([
+        STORE_SCHEMA.field(field.name) if field.name in STORE_SCHEMA.names else field
+        for field in table.schema
+    ])
+    return table.cast(schema)
+
+# ---------------------------------------- Tweet Store ----------------------------------
+
+class TweetStore():
+    """ A class to write and read tweets as compressed parquet files partitioned by event, date and language """
+    def __init__(self, root, compression = 'zstd'):
+        self.root = os.path.abspath(root)
+        self.compression = compression
+        self.partitioning = ds.partitioning(PARTITION_SCHEMA, flavor = 'hive')
+
+    # write data ----------------------------------------------------------------------------------------
+
+    def write(self, df, event):
+        """
+        Appends tweets to the store, every call adds new files to the partitions it touches
+        Inputs : df - DataFrame of tweets (flat tweet schema, indexed on id)
+                 event - name of the event the tweets were harvested for e.g. 'Taal2020'
+        """
+        if len(df) == 0:
+            return
+
+        if df.index.name is not None:
+            df = df.reset_index()
+
+        df = df.assign(
+            event = event,
+            date = pd.to_datetime(df['created_at']).dt.strftime('%Y-%m-%d').fillna('unknown'),
+            lang = df['lang'].astype('string').fillna('und')
+        )
+
+        ds.write_dataset(
+            _store_table(df),
+            self.root,
+            format = 'parquet',
+            partitioning = self.partitioning,
+            basename_template = 'part-' + uuid.uuid4().hex + '-{i}.parquet',
+            existing_data_behavior = 'overwrite_or_ignore',
+            file_options = ds.ParquetFileFormat().make_write_options(compression = self.compression)
+        )
+
+    # read data ----------------------------------------------------------------------------------------
+
+    def dataset(self, memory_map = True):
+        """
+        Returns the pyarrow dataset of the store, files are memory mapped if memory_map is True
+        The dataset has the store schema (plus the columns outside the tweet schema found in the files)
+        """
+        filesystem = pafs.LocalFileSystem(use_mmap = memory_map)
+        discovered = ds.dataset(self.root, format = 'parquet', partitioning = self.partitioning, filesystem = filesystem).schema
+        schema = pa.schema(
+            list(STORE_SCHEMA) + [field for field in discovered if field.name not in STORE_SCHEMA.names]
+        )
+        return ds.dataset(
+            self.root,
+            schema = schema,
+            format = 'parquet',
+            partitioning = self.partitioning,
+            filesystem = filesystem
+        )
+
+    def _filter(self, event = None, date = None, lang = None, filter = None):
+        """ Combines the partition values and an optional pyarrow expression into a single filter """
+        expression = filter
+        for name, value in [('event', event), ('date', date), ('lang', lang)]:
+            if value is None:
+                continue
+            if isinstance(value, (list, tuple, set)):
+                condition = ds.field(name).isin(list(value))
+            else:
+                condition = ds.field(name) == value
+            expression = condition if expression is None else expression & condition
+        return expression
+
+    def read(self, columns = None, event = None, date = None, lang = None, filter = None, memory_map = True):
+        """
+        Reads tweets from the store, only the requested columns and partitions are loaded
+        Inputs : columns - list of columns to read, None for all columns
+                 event, date ('YYYY-MM-DD'), lang - partition value or list of values to read
+                 filter - additional pyarrow expression e.g. ds.field('user.followers_count') > 1000
+                 memory_map - memory map the parquet files instead of reading them into buffers
+        Outputs : DataFrame indexed on the tweet id, one row per id (harvesting delivers at least once : a batch
+                  replayed after an interrupted run is written again, its copies are dropped here)
+        """
+        if not os.path.exists(self.root):
+            raise FileNotFoundError('No tweets stored under ' + self.root)
+
+        if (columns is not None) and ('id' not in columns):
+            columns = ['id'] + list(columns)
+
+        table = self.dataset(memory_map).to_table(
+            columns = columns,
+            filter = self._filter(event, date, lang, filter)
+        )
+
+        df = table.to_pandas()
+        for name, _, dtype in TWEET_SCHEMA:
+            if (dtype == 'category') and (name in df.columns):
+                df[name] = df[name].astype('category')
+        if 'id' in df.columns:
+            df.set_index('id', inplace = True)
+            df = df[~df.index.duplicated()]
+
+        return df
@@ -0,0 +1,310 @@
+import gzip
+import json
+import time
+import threading
+import numpy as np
+import tweepy as tw
+from collections import Counter, deque
+from datetime import datetime, timedelta
+
+# Format of the dates of the premium search parameters and of created_at in the raw tweet json
+SEARCH_DATE_FORMAT = '%Y%m%d%H%M'
+CREATED_AT_FORMAT = '%a %b %d %H:%M:%S +0000 %Y'
+
+# ------------------------------------- Replay Response ---------------------------------
+class ReplayResponse():
+    """ Mimics the requests response tweepy stores in api.last_response (status code + rate limit headers) """
+    def __init__(self, status_code, headers):
+        self.status_code = status_code
+        self.headers = headers
+
+# ------------------------------------- Replay Method -----------------------------------
+class ReplayMethod():
+    """ Mimics the tweepy APIMethod an API method returns with create = True (what the parsers read from it) """
+    def __init__(self, api, payload_type, payload_list = False):
+        self.api = api
+        self.payload_type = payload_type
+        self.payload_list = payload_list
+
+# ----------------------------------------- Replay API ----------------------------------
+
+class ReplayAPI():
+    """
+    A local stand-in for tw.API : serves recorded or synthetic tweets through the search, search_30_day
+    and search_full_archive methods, with configurable latency per request and rate limits per endpoint
+    """
+    def __init__(self, tweets, latency = 0.0, rate_limits = None):
+        # Raw tweet json, newest first like the search endpoints
+        self.tweets = sorted(tweets, key = lambda tweet: tweet['id'], reverse = True)
+        self._created = np.array([self._timestamp(tweet) for tweet in self.tweets], dtype = 'int64')
+        self.latency = latency
+        self.rate_limits = rate_limits or {}
+        self.parser = tw.parsers.ModelParser()
+        self.calls = Counter()
+        self.last_response = None
+        self._lock = threading.Lock()
+        self._requests = {}
+        self._search_results = {}
+        self._premium_results = {}
+
+    @classmethod
+    def from_recording(cls, path, **kwargs):
+        """ Creates a replay API from the tweets saved by RecordingAPI (gzipped json lines) """
+        tweets = {}
+        with gzip.open(path, 'rt', encoding = 'utf-8') as f:
+            for line in f:
+                tweet = json.loads(line)
+                tweets[tweet['id']] = tweet
+        return cls(list(tweets.values()), **kwargs)
+
+    @classmethod
+    def synthetic(cls, n_tweets, search_from, search_to, seed = 0, **kwargs):
+        """ Creates a replay API serving n_tweets synthetic tweets between search_from and search_to ('YYYYMMDDHHMM') """
+        return cls(synthetic_tweets(n_tweets, search_from, search_to, seed = seed), **kwargs)
+
+    # Requests ----------------------------------------------------------------------------------------
+
+    def _timestamp(self, tweet):
+        return int(datetime.strptime(tweet['created_at'], CREATED_AT_FORMAT).timestamp())
+
+    def _request(self, endpoint):
+        """ Counts a request, waits for the configured latency and raises a RateLimitError (429) when over the limit """
+        with self._lock:
+            self.calls[endpoint] += 1
+            headers = {}
+            if endpoint in self.rate_limits:
+                max_requests, window = self.rate_limits[endpoint]
+                now = time.time()
+                requests = self._requests.setdefault(endpoint, deque())
+                while requests and now - requests[0] >= window:
+                    requests.popleft()
+                reset = int((requests[0] if requests else now) + window)
+                if len(requests) >= max_requests:
+                    self.last_response = ReplayResponse(429, {'x-rate-limit-remaining' : '0', 'x-rate-limit-reset' : str(reset)})
+                    self.calls['429'] += 1
+                    raise tw.RateLimitError('Rate limit exceeded', self.last_response)
+                requests.append(now)
+                headers = {'x-rate-limit-remaining' : str(max_requests - len(requests)), 'x-rate-limit-reset' : str(reset)}
+
+        if self.latency > 0:
+            time.sleep(self.latency)
+        self.last_response = ReplayResponse(200, headers)
+
+    def _matches(self, tweet, query):
+        """ Evaluates the keyword, lang: and place_country: operators of a query (other operators are ignored) """
+        for term in query.lower().split():
+            if term.startswith('-'):
+                continue
+            elif term.startswith('lang:'):
+                if (tweet.get('lang') or '').lower() != term[5:]:
+                    return False
+            elif term.startswith('place_country:'):
+                place = tweet.get('place') or {}
+                if (place.get('country_code') or '').lower() != term[14:]:
+                    return False
+            elif term not in tweet['text'].lower():
+                return False
+        return True
+
+    def _parse(self, tweets):
+        """ Parses raw tweet json into tweepy Status objects """
+        results = tw.models.ResultSet()
+        results.extend(tw.models.Status.parse(self, tweet) for tweet in tweets)
+        return results
+
+    # Search endpoints --------------------------------------------------------------------------------
+
+    def search(self, q = None, since_id = None, max_id = None, count = 15, parser = None, create = False, **kwargs):
+        """
+        Standard search (past 7 days), paginated with max_id like tw.API.search : pages of count tweets newest first,
+        ids above since_id and up to max_id. tw.Cursor pages it with an IdIterator (raw json payload, create = True)
+        """
+        method = ReplayMethod(self, 'search_results')
+        if create:
+            return method
+
+        self._request('search')
+        key = (q, since_id)
+        if key not in self._search_results:
+            tweets = [tweet for tweet in self.tweets if ((since_id is None) or (tweet['id'] > since_id)) and self._matches(tweet, q)]
+            # Negated ids are ascending (tweets are newest first), the page of a max_id starts at its searchsorted position
+            self._search_results = {key : (tweets, -np.array([tweet['id'] for tweet in tweets], dtype = 'int64'))}
+        tweets, negated_ids = self._search_results[key]
+        start = 0 if max_id is None else int(np.searchsorted(negated_ids, -max_id, side = 'left'))
+
+        payload = json.dumps({'statuses' : tweets[start : start + count], 'search_metadata' : {'query' : q, 'count' : count}})
+        return (parser if parser is not None else self.parser).parse(method, payload)
+
+    search.pagination_mode = 'id'
+
+    def _premium_matches(self, endpoint, query, fromDate, toDate):
+        """ Positions of the tweets of a premium search window matching query, computed once per window """
+        key = (endpoint, query, fromDate, toDate)
+        matches = self._premium_results.get(key)
+        if matches is None:
+            lo, hi = 0, len(self.tweets)
+            # Tweets are sorted newest first, created timestamps are therefore non increasing
+            if toDate is not None:
+                lo = int(np.searchsorted(-self._created, -datetime.strptime(toDate, SEARCH_DATE_FORMAT).timestamp(), side = 'right'))
+            if fromDate is not None:
+                hi = int(np.searchsorted(-self._created, -datetime.strptime(fromDate, SEARCH_DATE_FORMAT).timestamp(), side = 'right'))
+            matches = [i for i in range(lo, hi) if self._matches(self.tweets[i], query)]
+            self._premium_results[key] = matches
+        return matches
+
+    def _search_premium(self, endpoint, query, fromDate = None, toDate = None, maxResults = 100, next = None, return_cursors = False):
+        """ Premium search, paginated with next tokens (the offset of the next page in the matching tweets) """
+        self._request(endpoint)
+        matches = self._premium_matches(endpoint, query, fromDate, toDate)
+        offset = int(next) if next is not None else 0
+
+        results = self._parse([self.tweets[i] for i in matches[offset : offset + maxResults]])
+        if return_cursors and (offset + maxResults < len(matches)):
+            return results, str(offset + maxResults)
+        return results
+
+    def search_30_day(self, environment_name, query, **kwargs):
+        """ Premium 30 day search """
+        return self._search_premium('search_30_day', query, **kwargs)
+
+    search_30_day.pagination_mode = 'next'
+
+    def search_full_archive(self, environment_name, query, **kwargs):
+        """ Premium full archive search """
+        return self._search_premium('search_full_archive', query, **kwargs)
+
+    search_full_archive.pagination_mode = 'next'
+
+    # Counts endpoints --------------------------------------------------------------------------------
+
+    def _counts(self, endpoint, query, fromDate = None, toDate = None, bucket = 'day', next = None):
+        """ Premium counts, number of matching tweets per day / hour / minute bucket """
+        self._request(endpoint)
+        step = {'day' : timedelta(days = 1), 'hour' : timedelta(hours = 1), 'minute' : timedelta(minutes = 1)}[bucket]
+        start = datetime.strptime(fromDate, SEARCH_DATE_FORMAT)
+        stop = datetime.strptime(toDate, SEARCH_DATE_FORMAT)
+
+        counts = Counter()
+        for tweet, created in zip(self.tweets, self._created):
+            if (start.timestamp() <= created < stop.timestamp()) and self._matches(tweet, query):
+                counts[int((created - start.timestamp()) // step.total_seconds())] += 1
+
+        results = []
+        period = start
+        i = 0
+        while period < stop:
+            results.append({'timePeriod' : period.strftime(SEARCH_DATE_FORMAT), 'count' : counts[i]})
+            period += step
+            i += 1
+
+        return {'results' : results, 'totalCount' : sum(counts.values()), 'requestParameters' : {'bucket' : bucket, 'fromDate' : fromDate, 'toDate' : toDate}}
+
+    def search_30_day_counts(self, environment_name, query, **kwargs):
+        """ Premium 30 day counts """
+        return self._counts('search_30_day_counts', query, **kwargs)
+
+    def search_full_archive_counts(self, environment_name, query, **kwargs):
+        """ Premium full archive counts """
+        return self._counts('search_full_archive_counts', query, **kwargs)
+
+# ---------------------------------------- Recording API --------------------------------
+
+class RecordingAPI():
+    """ Wraps a tw.API and saves the raw json of every tweet returned by the search endpoints (gzipped json lines) """
+    ENDPOINTS = ('search', 'search_30_day', 'search_full_archive')
+
+    def __init__(self, api, path):
+        self.api = api
+        self.path = path
+        self._lock = threading.Lock()
+        self._file = gzip.open(path, 'at', encoding = 'utf-8')
+
+    def __getattr__(self, name):
+        attr = getattr(self.api, name)
+        if name not in self.ENDPOINTS:
+            return attr
+
+        def call(*args, **kwargs):
+            result = attr(*args, **kwargs)
+            if not kwargs.get('create'):
+                self._record(result)
+            return result
+
+        call.pagination_mode = attr.pagination_mode
+        return call
+
+    def _record(self, result):
+        if isinstance(result, tuple):
+            result = result[0]
+        # The tweepy IdIterator requests raw json strings
+        if isinstance(result, (str, bytes)):
+            result = json.loads(result).get('statuses', [])
+        with self._lock:
+            for tweet in result:
+                self._file.write(json.dumps(getattr(tweet, '_json', tweet)) + '\n')
+
+    def close(self):
+        self._file.close()
+
+# ---------------------------------------- Synthetic Tweets -----------------------------
+
+def synthetic_tweets(n_tweets, search_from, search_to, keyword = 'Taal', langs = {'en' : 0.7, 'tl' : 0.2, 'und' : 0.1}, geo_rate = 0.1, burst = 0.5, seed = 0):
+    """
+    Generates raw tweet json between search_from and search_to ('YYYYMMDDHHMM')
+    Inputs : n_tweets - number of tweets
+             keyword - included in every tweet text
+             langs - share of tweets per language
+             geo_rate - share of geotagged tweets (coordinates + place)
+             burst - share of the tweets concentrated around an eruption in the first third of the range
+    Outputs : list of raw tweet json dicts
+    """
+    rng = np.random.default_rng(seed)
+    start = datetime.strptime(search_from, SEARCH_DATE_FORMAT)
+    span = (datetime.strptime(search_to, SEARCH_DATE_FORMAT) - start).total_seconds()
+
+    n_burst = int(n_tweets * burst)
+    offsets = np.concatenate([
+        rng.uniform(0, span, n_tweets - n_burst),
+        np.clip(rng.exponential(span / 20, n_burst) + span / 3, 0, span - 1)
+    ])
+    offsets.sort()
+
+    lang_codes = rng.choice(list(langs.keys()), size = n_tweets, p = np.array(list(langs.values())) / sum(langs.values()))
+    geotagged = rng.random(n_tweets) < geo_rate
+    words = ['ash', 'eruption', 'volcano', 'pray', 'evacuate', 'help', 'safe', 'Batangas', 'Manila', 'lava', 'smoke', 'alert']
+
+    tweets = []
+    for i in range(n_tweets):
+        created = start + timedelta(seconds = float(offsets[i]))
+        user_id = int(rng.integers(1, n_tweets // 5 + 2))
+        text = keyword + ' ' + ' '.join(rng.choice(words, size = 8)) + ' #' + keyword + 'Volcano @user' + str(user_id % 100)
+        tweet = {
+            'id' : int(created.timestamp() * 1000) * 4096 + i % 4096,
+            'created_at' : created.strftime(CREATED_AT_FORMAT),
+            'text' : text,
+            'lang' : str(lang_codes[i]),
+            'source' : '<a href="http://twitter.com/download/android" rel="nofollow">Twitter for Android</a>',
+            'truncated' : False,
+            'is_quote_status' : False,
+            'retweet_count' : int(rng.poisson(2)),
+            'favorite_count' : int(rng.poisson(5)),
+            'user' : {
+                'id' : user_id,
+                'screen_name' : 'user' + str(user_id),
+                'name' : 'User ' + str(user_id),
+                'location' : str(rng.choice(['Manila', 'Philippines', 'Batangas', ''])),
+                'verified' : False,
+                'followers_count' : int(rng.integers(0, 5000)),
+                'friends_count' : int(rng.integers(0, 1000)),
+                'statuses_count' : int(rng.integers(1, 20000))
+            },
+            'coordinates' : None,
+            'place' : None
+        }
+        if geotagged[i]:
+            lat, lon = 14.13 + rng.normal(0, 0.5), 120.99 + rng.normal(0, 0.5)
+            tweet['coordinates'] = {'type' : 'Point', 'coordinates' : [lon, lat]}
+            tweet['place'] = {'id' : 'synthetic', 'full_name' : 'Batangas, Calabarzon', 'place_type' : 'city', 'country_code' : 'PH'}
+        tweets.append(tweet)
+
+    return tweets
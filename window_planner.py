@@ -0,0 +1,152 @@
+import math
+from collections import namedtuple
+from datetime import datetime, timedelta
+
+# Format of the premium search dates
+SEARCH_DATE_FORMAT = '%Y%m%d%H%M'
+
+# A premium search window : pages to request and the next token to start from (None for the first page)
+PlannedWindow = namedtuple('PlannedWindow', ['search_from', 'search_to', 'pages', 'next_token'])
+
+def _parse(date):
+    return datetime.strptime(date, SEARCH_DATE_FORMAT)
+
+def _format(dt):
+    return dt.strftime(SEARCH_DATE_FORMAT)
+
+def _split(search_from, search_to, n):
+    """ Splits a window into n windows of equal duration (minute resolution), empty windows are dropped """
+    start, stop = _parse(search_from), _parse(search_to)
+    minutes = (stop - start).total_seconds() / 60
+    bounds = [_format(start + timedelta(minutes = round(minutes * i / n))) for i in range(n + 1)]
+    return [(a, b) for a, b in zip(bounds[:-1], bounds[1:]) if a < b]
+
+def _allocate(weights, total):
+    """ Splits total into integers proportional to the weights (largest remainder method) """
+    weight_sum = sum(weights)
+    if (weight_sum <= 0) or (total <= 0):
+        return [0] * len(weights)
+    shares = [w * total / weight_sum for w in weights]
+    alloc = [int(s) for s in shares]
+    order = sorted(range(len(weights)), key = lambda i: shares[i] - alloc[i], reverse = True)
+    for i in order[:total - sum(alloc)]:
+        alloc[i] += 1
+    return alloc
+
+# ---------------------------------------- Window Planner -------------------------------
+
+class WindowPlanner():
+    """
+    A class to plan premium search windows so each request returns close to max_results tweets within a request budget :
+    quiet periods are merged into a single window, busy periods are split so a truncated budget still covers the whole range
+    """
+    def __init__(self, max_results = 100, budget = 50, windows = 1):
+        self.max_results = max_results
+        self.budget = budget
+        # Number of windows fetched concurrently, a complete harvest is split into at least as many windows
+        self.windows = windows
+
+    # Density from counts -----------------------------------------------------------------------------
+
+    def plan_from_counts(self, counts, budget = None):
+        """
+        Plans windows from tweet counts per time bucket (e.g. the hourly buckets of the premium counts endpoint)
+        Inputs : counts - list of (bucket_from, bucket_to, count) in time order
+                 budget - number of requests available (defaults to the planner's budget)
+        Outputs : list of PlannedWindow
+        """
+        budget = self.budget if budget is None else budget
+        total = sum(c for _, _, c in counts)
+        if (total == 0) or (budget <= 0):
+            return []
+
+        # Complete harvest within budget : windows of whole pages, as few as the number of concurrent windows allows
+        # Over budget : every request samples total / budget tweets, so the pages are spread over the whole range
+        complete = math.ceil(total / self.max_results) + self.windows <= budget
+        cap = max(self.max_results, total / self.windows) if complete else max(self.max_results, total / budget)
+
+        # Merge consecutive buckets until the window holds cap tweets, empty buckets never start a window
+        windows = []
+        for bucket_from, bucket_to, count in counts:
+            if (len(windows) > 0) and (windows[-1][2] + count <= cap) and (windows[-1][1] == bucket_from):
+                windows[-1] = [windows[-1][0], bucket_to, windows[-1][2] + count]
+            elif count > 0:
+                windows.append([bucket_from, bucket_to, count])
+
+        pages = [math.ceil(c / self.max_results) if complete else max(1, round(c / cap)) for _, _, c in windows]
+
+        # Over budget : merge the quietest neighbours while every window has a single page, else drop a page from the busiest
+        while sum(pages) > budget:
+            if max(pages) > 1:
+                i = max(range(len(pages)), key = lambda i: (pages[i], windows[i][2]))
+                pages[i] -= 1
+            else:
+                i = min(range(len(windows) - 1), key = lambda i: windows[i][2] + windows[i + 1][2])
+                windows[i] = [windows[i][0], windows[i + 1][1], windows[i][2] + windows[i + 1][2]]
+                del windows[i + 1], pages[i + 1]
+
+        # Spare budget goes to the windows with the most tweets per requested page
+        spare = budget - sum(pages)
+        while spare > 0:
+            i = max(range(len(windows)), key = lambda i: windows[i][2] / pages[i])
+            if windows[i][2] <= pages[i] * self.max_results:
+                break
+            pages[i] += 1
+            spare -= 1
+
+        return [PlannedWindow(w[0], w[1], p, None) for w, p in zip(windows, pages)]
+
+    # Density from first page probes ------------------------------------------------------------------
+
+    def probe_windows(self, search_from, search_to, budget = None):
+        """
+        Splits the range into the windows to probe with a first page : one per day,
+        fewer (multi day) windows when that would take more than half of the budget
+        """
+        budget = self.budget if budget is None else budget
+        days = math.ceil((_parse(search_to) - _parse(search_from)).total_seconds() / 86400)
+        return _split(search_from, search_to, max(1, min(days, budget // 2)))
+
+    def plan_from_probes(self, probes, budget = None):
+        """
+        Plans the requests that follow the probes
+        Inputs : probes - list of dicts (search_from, search_to, n : tweets returned, next_token : None when the window
+                          is complete, oldest : datetime of the oldest tweet returned)
+                 budget - number of requests left after the probes
+        Outputs : list of PlannedWindow
+        """
+        budget = self.budget - len(probes) if budget is None else budget
+        busy = [p for p in probes if (p['next_token'] is not None) and (p['n'] > 0)]
+        if (len(busy) == 0) or (budget <= 0):
+            return []
+
+        # Results are newest first : the probe covers [oldest, search_to), extrapolate its density to the rest of the window
+        remaining = []
+        for p in busy:
+            start, stop = _parse(p['search_from']), _parse(p['search_to'])
+            oldest = min(max(p['oldest'], start), stop)
+            covered = max((stop - oldest).total_seconds(), 60)
+            remaining.append(p['n'] * (oldest - start).total_seconds() / covered)
+
+        needed = [max(1, math.ceil(r / self.max_results)) for r in remaining]
+        if sum(needed) <= budget:
+            # Estimates are extrapolated, the spare budget is shared out as well : a window stops requesting
+            # pages once it has no next token, so unused pages cost nothing
+            alloc = [n + a for n, a in zip(needed, _allocate(remaining, budget - sum(needed)))]
+        else:
+            alloc = _allocate(remaining, budget)
+
+        plan = []
+        for p, a, n in zip(busy, alloc, needed):
+            if a == 0:
+                continue
+            if a >= n:
+                # Enough budget for the whole window : continue from the probe's next token
+                plan.append(PlannedWindow(p['search_from'], p['search_to'], a, p['next_token']))
+            else:
+                # Truncated : split the part the probe did not reach so the pages sample all of it
+                oldest = p['oldest'].replace(second = 0, microsecond = 0) + timedelta(minutes = 1)
+                stop = min(_format(oldest), p['search_to'])
+                plan.extend(PlannedWindow(f, t, 1, None) for f, t in _split(p['search_from'], stop, a))
+
+        return plan